@@ -1,8 +1,37 @@
+import time
+_import_start = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes import upload, pipeline, export, groq, users, graph
+from app.utils.groq_assistant import groq_client
+from app.utils.warmup import startup_timings, start_background_warmup
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print(f"App imported in {startup_timings['app_import_ms']} ms")
+    start_background_warmup()
+    await groq_client.start()
+    yield
+    await groq_client.close()
+    # sessions only live in memory, so their working files go with them
+    for session_id in list(upload.session_store):
+        upload.drop_session(session_id)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# response headers the frontend may read; "*" is not honoured by browsers on
+# credentialed requests, so every custom header has to be listed here
+EXPOSE_HEADERS = [
+    "Content-Disposition",
+    # /graph
+    "X-Plot-Mode", "X-Render-Time-Ms", "X-Encoded-Bytes",
+    # /export
+    "X-Export-Cache", "X-Export-Ms", "X-Report-Stats",
+    # /pipeline/data
+    "X-Total-Rows", "X-Offset", "X-Rows", "X-Next-Offset", "X-Data-Version",
+]
 
 app.add_middleware(
     CORSMiddleware,
@@ -10,11 +39,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=EXPOSE_HEADERS,
 )
 
 @app.get("/")
 async def root():
-    return {"status": "ok", "message": "AutoML-AI Backend is running"}
+    return {"status": "ok", "message": "AutoML-AI Backend is running", "startup": startup_timings}
 
 @app.get("/ping")
 def ping():
@@ -26,3 +56,5 @@ app.include_router(pipeline.router, prefix="/pipeline")
 app.include_router(export.router, prefix="/export")
 app.include_router(groq.router, prefix="/groq")
 app.include_router(graph.router, prefix="/graph")
+
+startup_timings["app_import_ms"] = round((time.perf_counter() - _import_start) * 1000, 1)
@@ -1,28 +1,97 @@
-import os
+import json, multiprocessing, os, time
+from concurrent.futures import ProcessPoolExecutor
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
 from pydantic import BaseModel
-from app.utils.export_utils import generate_pdf, generate_ipynb
+from app.utils.export_utils import export_version, generate_pdf, generate_ipynb
 from .upload import session_store
-from fastapi import BackgroundTasks
+from .pipeline import materialize_plan
 
 
 router = APIRouter()
 
+# Rich-report charts render in their own small process pool. A chart still
+# running at RICH_CHART_TIMEOUT cannot be cancelled, and in this pool it only
+# delays later reports, never /graph/batch.
+REPORT_WORKERS = min(2, os.cpu_count() or 1)
+_report_pool = None
+
+def _get_report_pool() -> ProcessPoolExecutor:
+    global _report_pool
+    # a pool whose worker died is replaced, like the /graph/batch pool
+    if _report_pool is None or getattr(_report_pool, "_broken", False):
+        _report_pool = ProcessPoolExecutor(
+            max_workers=REPORT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _report_pool
+
+# builders take (session_id, session entry, stats dict to fill) and return bytes
+def _pdf(session_id: str, entry: dict, stats: dict) -> bytes:
+    return generate_pdf(session_id, entry, stats=stats)
+
+def _rich_pdf(session_id: str, entry: dict, stats: dict) -> bytes:
+    return generate_pdf(session_id, entry, rich=True, executor=_get_report_pool(), stats=stats)
+
+def _ipynb(session_id: str, entry: dict, stats: dict) -> bytes:
+    return generate_ipynb(session_id, entry)
+
+
+EXPORTS = {
+    "pdf": (_pdf, "application/pdf", "report.pdf"),
+    "pdf_rich": (_rich_pdf, "application/pdf", "report.pdf"),
+    "ipynb": (_ipynb, "application/json", "pipeline.ipynb"),
+}
+
 
 class ExportRequest(BaseModel):
     session_id: str
+    rich: bool = False   # pdf only: embed histogram/heatmap/ROC/comparison charts
+
+
+def _build_export(session_id: str, kind: str):
+    # runs in the threadpool; returns (bytes, build stats, cache hit, ms). The
+    # last build of each kind is kept on the session and reused while
+    # export_version matches.
+    start = time.perf_counter()
+    materialize_plan(session_id)
+    entry = session_store[session_id]
+    version = export_version(entry)
+    cache = entry.setdefault("exports", {})
+    cached = cache.get(kind)
+    if cached and cached[0] == version:
+        return cached[1], cached[2], True, round((time.perf_counter() - start) * 1000, 2)
+    stats = {}
+    content = EXPORTS[kind][0](session_id, entry, stats)
+    cache[kind] = (version, content, stats)
+    ms = round((time.perf_counter() - start) * 1000, 2)
+    print(f"Built {kind} export for {session_id}: {len(content)} bytes in {ms} ms")
+    return content, stats, False, ms
+
+
+async def _export(session_id: str, kind: str) -> Response:
+    if session_id not in session_store:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    content, stats, hit, ms = await run_in_threadpool(_build_export, session_id, kind)
+    _, media_type, suffix = EXPORTS[kind]
+    headers = {
+        "Content-Disposition": f'attachment; filename="{session_id}_{suffix}"',
+        "X-Export-Cache": "hit" if hit else "miss",
+        "X-Export-Ms": str(ms),
+    }
+    if stats:
+        # stats of the build that produced these bytes, e.g. which charts failed
+        headers["X-Report-Stats"] = json.dumps(stats, separators=(",", ":"))
+    return Response(content, media_type=media_type, headers=headers)
 
 
 @router.post("/pdf")
-async def export_pdf(payload: ExportRequest, background_tasks: BackgroundTasks):
+async def export_pdf(payload: ExportRequest):
     try:
-        if payload.session_id not in session_store:
-            raise HTTPException(status_code=404, detail="Session not found.")
-        session_data = session_store[payload.session_id]
-        path = generate_pdf(payload.session_id, session_data)
-        background_tasks.add_task(os.remove, path)
-        return FileResponse(path, filename=os.path.basename(path), media_type="application/pdf", background=background_tasks)
+        return await _export(payload.session_id, "pdf_rich" if payload.rich else "pdf")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {e}")
 
@@ -30,11 +99,8 @@ async def export_pdf(payload: ExportRequest, background_tasks: BackgroundTasks):
 @router.post("/ipynb")
 async def export_ipynb(payload: ExportRequest):
     try:
-        if payload.session_id not in session_store:
-            raise HTTPException(status_code=404, detail="Session not found.")
-        session_data = session_store[payload.session_id]
-        path = generate_ipynb(payload.session_id, session_data)
-        BackgroundTasks.add_task(os.remove, path)
-        return FileResponse(path, filename=os.path.basename(path), media_type="application/json")
+        return await _export(payload.session_id, "ipynb")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Notebook generation failed: {e}")
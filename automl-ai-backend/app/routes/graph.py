@@ -1,109 +1,261 @@
 # automl-ai-backend/app/routes/graph.py
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
-from typing import Optional
-from ..utils.graph_utils import *
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio, io, json, multiprocessing, os, time, zipfile
+import numpy as np
+import pandas as pd
 from .upload import session_store
+from .pipeline import materialize_plan
 
 router = APIRouter()
 
-def _get_df(session_id: str):
+# pyplot keeps global state, so batch renders run in separate processes
+RENDER_WORKERS = min(4, os.cpu_count() or 1)
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(
+            max_workers=RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _render_pool
+
+async def _get_df(session_id: str, *columns):
+    # charts show the data the steps describe, so deferred ops run first
     if session_id not in session_store:
         raise HTTPException(404, "Invalid session_id")
-    return session_store[session_id]["data"]
+    await run_in_threadpool(materialize_plan, session_id)
+    df = session_store[session_id]["data"]
+    missing = [c for c in columns if c and c not in df.columns]
+    if missing:
+        raise HTTPException(400, f"Unknown column(s): {missing}")
+    return df
+
+class ChartOutput:
+    # Shared encoding options accepted by every chart endpoint
+    def __init__(
+        self,
+        format: str = Query("png", pattern="^(png|webp|jpeg|svg)$"),
+        dpi: Optional[int] = Query(None, ge=20, le=400),
+        width: Optional[int] = Query(None, ge=32, le=4096),
+        height: Optional[int] = Query(None, ge=32, le=4096),
+    ):
+        self.format = format
+        self.dpi = dpi
+        self.width = width
+        self.height = height
+
+    def options(self) -> dict:
+        return {"format": self.format, "dpi": self.dpi, "width": self.width, "height": self.height}
+
+def _chart_response(render, out: ChartOutput):
+    from ..utils.graph_utils import MEDIA_TYPES
+    start = time.perf_counter()
+    result = render(out.options())
+    buf, mode = result if isinstance(result, tuple) else (result, None)
+    headers = {
+        "X-Render-Time-Ms": f"{(time.perf_counter() - start) * 1000:.2f}",
+        "X-Encoded-Bytes": str(buf.getbuffer().nbytes),
+    }
+    if mode:
+        headers["X-Plot-Mode"] = mode
+    return StreamingResponse(buf, media_type=MEDIA_TYPES[out.format], headers=headers)
 
 @router.get("/histogram")
 async def histogram(
     session_id: str,
     column: Optional[str] = Query(None),
     bins: int = Query(30, ge=1),
+    out: ChartOutput = Depends(),
 ):
-    df = _get_df(session_id)
-    buf = plot_histogram(df, column=column, bins=bins)
-    return StreamingResponse(buf, media_type="image/png")
+    from ..utils.graph_utils import plot_histogram
+    df = await _get_df(session_id, column)
+    return _chart_response(lambda o: plot_histogram(df, column=column, bins=bins, out=o), out)
 
 @router.get("/bar")
-async def bar_chart(session_id: str, column: str = Query(...)):
-    df = _get_df(session_id)
-    buf = plot_bar(df, column)
-    return StreamingResponse(buf, media_type="image/png")
+async def bar_chart(session_id: str, column: str = Query(...), out: ChartOutput = Depends()):
+    from ..utils.graph_utils import plot_bar
+    df = await _get_df(session_id, column)
+    return _chart_response(lambda o: plot_bar(df, column, out=o), out)
 
 @router.get("/pie")
-async def pie_chart(session_id: str, column: str = Query(...)):
-    df = _get_df(session_id)
-    buf = plot_pie(df, column)
-    return StreamingResponse(buf, media_type="image/png")
+async def pie_chart(session_id: str, column: str = Query(...), out: ChartOutput = Depends()):
+    from ..utils.graph_utils import plot_pie
+    df = await _get_df(session_id, column)
+    return _chart_response(lambda o: plot_pie(df, column, out=o), out)
 
 @router.get("/boxplot")
-async def boxplot(session_id: str, column: Optional[str] = Query(None)):
-    df = _get_df(session_id)
-    buf = plot_boxplot(df, column)
-    return StreamingResponse(buf, media_type="image/png")
+async def boxplot(session_id: str, column: Optional[str] = Query(None), out: ChartOutput = Depends()):
+    from ..utils.graph_utils import plot_boxplot
+    df = await _get_df(session_id, column)
+    return _chart_response(lambda o: plot_boxplot(df, column, out=o), out)
 
 @router.get("/qq")
-async def qqplot(session_id: str, column: str = Query(...)):
-    df = _get_df(session_id)
-    buf = plot_qq(df, column)
-    return StreamingResponse(buf, media_type="image/png")
+async def qqplot(session_id: str, column: str = Query(...), out: ChartOutput = Depends()):
+    from ..utils.graph_utils import plot_qq
+    df = await _get_df(session_id, column)
+    return _chart_response(lambda o: plot_qq(df, column, out=o), out)
 
 @router.get("/scatter")
 async def scatter(
     session_id: str,
     x: str = Query(...),
     y: str = Query(...),
+    out: ChartOutput = Depends(),
 ):
-    df = _get_df(session_id)
-    buf = plot_scatter(df, x, y)
-    return StreamingResponse(buf, media_type="image/png")
+    from ..utils.graph_utils import plot_scatter
+    df = await _get_df(session_id, x, y)
+    return _chart_response(lambda o: plot_scatter(df, x, y, out=o), out)
 
 @router.get("/line")
 async def line_plot(
     session_id: str,
     x: str = Query(...),
     y: str = Query(...),
+    out: ChartOutput = Depends(),
 ):
-    df = _get_df(session_id)
-    buf = plot_line(df, x, y)
-    return StreamingResponse(buf, media_type="image/png")
+    from ..utils.graph_utils import plot_line
+    df = await _get_df(session_id, x, y)
+    return _chart_response(lambda o: plot_line(df, x, y, out=o), out)
 
 @router.get("/heatmap")
-async def heatmap(session_id: str):
-    df = _get_df(session_id)
-    buf = plot_heatmap(df)
-    return StreamingResponse(buf, media_type="image/png")
+async def heatmap(session_id: str, out: ChartOutput = Depends()):
+    from ..utils.graph_utils import plot_heatmap
+    df = await _get_df(session_id)
+    return _chart_response(lambda o: plot_heatmap(df, out=o), out)
 
 @router.get("/roc_plot")
-async def roc_plot(session_id: str):
+async def roc_plot(session_id: str, out: ChartOutput = Depends()):
+    from ..utils.graph_utils import plot_roc_curve
     if session_id not in session_store or "train" not in session_store[session_id]["meta"]["steps"]:
         raise HTTPException(404, "No recent training results for ROC")
-    df_test = session_store[session_id]["meta"]["steps"]["train"][-1]["test"]
-    if df_test is None or "__y_true" not in df_test or "__y_score" not in df_test:
+    evaluation = session_store[session_id]["meta"]["steps"]["train"][-1].get("evaluation")
+    if evaluation is None:
         raise HTTPException(404, "No test data available for ROC")
-    if df_test["__y_true"].nunique() != 2:
-        raise HTTPException(400, "ROC plot is only available for binary classification")
-    if df_test["__y_true"].isnull().any() or df_test["__y_score"].isnull().any():
-        raise HTTPException(400, "ROC plot requires non-null values in __y_true and __y_score")
-    buf = plot_roc_curve(df_test["__y_true"], df_test["__y_score"], roc_auc=session_store[session_id]["meta"]["steps"]["train"][-1]["metrics"]["roc_auc"])
-    return StreamingResponse(buf, media_type="image/png")
+    if evaluation["roc"] is None:
+        raise HTTPException(400, "ROC plot requires probability or decision scores without nulls")
+    roc = evaluation["roc"]
+    return _chart_response(lambda o: plot_roc_curve(roc["fpr"], roc["tpr"], roc_auc=roc["auc"], out=o), out)
 
 @router.get("/compare-models")
-async def compare_models(session_id: str):
+async def compare_models(session_id: str, out: ChartOutput = Depends()):
+    from ..utils.graph_utils import plot_model_comparison
+    if session_id not in session_store:
+        raise HTTPException(404, "Invalid session_id")
     train_steps = session_store[session_id]["meta"]["steps"].get("train", [])
-    metrics = { step["model"]: step["metrics"] for step in train_steps }
-    print("metrics")
-    print(metrics)
-    buf = plot_model_comparison(metrics)
-    return StreamingResponse(buf, media_type="image/png")
+    metrics = {
+        step["model"]: {"roc_auc": step["metrics"]["roc_auc"]}
+        for step in train_steps if step["metrics"].get("roc_auc") is not None
+    }
+    if not metrics:
+        raise HTTPException(404, "No classification runs to compare")
+    return _chart_response(lambda o: plot_model_comparison(metrics, out=o), out)
 
 @router.get("/shap-summary")
-async def shap_summary(session_id: str, model: str):
-    
-    shap_values = session_store[session_id]["meta"]["steps"]["explain"][model]["shap_values"]
-    X_test = session_store[session_id]["meta"]["steps"]["explain"][model]["X"]
-
-    if model is None:
-        raise HTTPException(404, "Model not found")
-    
-    buf = plot_shap_summary(shap_values, X_test)
-    return StreamingResponse(buf, media_type="image/png")
+async def shap_summary(session_id: str, model: Optional[str] = None, run_id: Optional[int] = None, out: ChartOutput = Depends()):
+    from ..utils.graph_utils import plot_shap_summary
+    from ..utils.explainability import find_run_id
+    if session_id not in session_store:
+        raise HTTPException(404, "Invalid session_id")
+    train_steps = session_store[session_id]["meta"]["steps"].get("train", [])
+    run_id = find_run_id(train_steps, model, run_id)
+    job = session_store[session_id].get("explain", {}).get(run_id)
+    if job is None:
+        raise HTTPException(404, "No SHAP explanation for this model; call /pipeline/explain first")
+    if job["status"] == "pending":
+        raise HTTPException(409, "SHAP explanation is still being computed")
+    if job["status"] == "error":
+        raise HTTPException(500, f"SHAP explanation failed: {job.get('error')}")
+
+    return _chart_response(lambda o: plot_shap_summary(job["shap_values"], job["X"], out=o), out)
+
+
+class ChartSpec(BaseModel):
+    chart: str
+    column: Optional[str] = None
+    x: Optional[str] = None
+    y: Optional[str] = None
+    bins: Optional[int] = 30
+    format: str = Field("png", pattern="^(png|webp|jpeg|svg)$")
+    dpi: Optional[int] = Field(None, ge=20, le=400)
+    width: Optional[int] = Field(None, ge=32, le=4096)
+    height: Optional[int] = Field(None, ge=32, le=4096)
+
+class BatchChartRequest(BaseModel):
+    session_id: str
+    charts: List[ChartSpec]
+
+def _spec_columns(df, spec: dict):
+    # only ship the columns a chart needs to the worker process
+    cols = [c for c in (spec.get("column"), spec.get("x"), spec.get("y")) if c]
+    if not cols:
+        # same columns graph_utils.numeric_frame keeps: no sparse one-hot indicators
+        return df[[c for c, t in df.select_dtypes(include=np.number).dtypes.items()
+                   if not isinstance(t, pd.SparseDtype)]]
+    missing = [c for c in cols if c not in df.columns]
+    if missing:
+        raise KeyError(f"Unknown column(s): {missing}")
+    return df[list(dict.fromkeys(cols))]
+
+@router.post("/batch")
+async def batch_charts(payload: BatchChartRequest):
+    from ..utils.graph_utils import CHART_RENDERERS, render_chart
+    df = await _get_df(payload.session_id)
+    unknown = [c.chart for c in payload.charts if c.chart not in CHART_RENDERERS]
+    if unknown:
+        raise HTTPException(400, f"Unsupported chart type(s): {unknown}")
+
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    pool = _get_render_pool()
+    specs = [c.model_dump() for c in payload.charts]
+
+    async def _render(spec):
+        try:
+            return await loop.run_in_executor(pool, render_chart, _spec_columns(df, spec), spec)
+        except Exception as e:
+            return e
+
+    results = await asyncio.gather(*(_render(spec) for spec in specs))
+    if any(isinstance(r, BrokenProcessPool) for r in results):
+        # a worker died; start a fresh pool for the next request
+        global _render_pool
+        _render_pool = None
+
+    manifest = []
+    zbuf = io.BytesIO()
+    with zipfile.ZipFile(zbuf, "w", zipfile.ZIP_STORED) as zf:
+        for i, (spec, result) in enumerate(zip(specs, results)):
+            label = "_".join(str(v) for v in (spec["chart"], spec["column"], spec["x"], spec["y"]) if v)
+            entry = {"index": i, **spec}
+            if isinstance(result, Exception):
+                entry["error"] = str(result)
+            else:
+                image, mode, render_ms = result
+                entry["file"] = f"{i:02d}_{label}.{spec['format']}"
+                entry["render_ms"] = render_ms
+                entry["bytes"] = len(image)
+                if mode:
+                    entry["mode"] = mode
+                zf.writestr(entry["file"], image)
+            manifest.append(entry)
+        total_ms = round((time.perf_counter() - start) * 1000, 2)
+        zf.writestr("manifest.json", json.dumps({"total_ms": total_ms, "charts": manifest}, indent=2))
+    zbuf.seek(0)
+
+    return StreamingResponse(
+        zbuf,
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{payload.session_id}_charts.zip"',
+            "X-Render-Time-Ms": str(total_ms),
+        },
+    )
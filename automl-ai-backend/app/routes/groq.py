@@ -1,10 +1,12 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, Any, List
-from ..utils.groq_assistant import build_prompt, stream_groq_response
+from ..utils.groq_assistant import answer_cache, build_prompt, stream_groq_response
 from .upload import session_store
-import os, json
+from .pipeline import materialize_plan
+import os, json, time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,6 +16,32 @@ class GroqRequest(BaseModel):
     session_id: str
     question: str
     page: str
+    bypass_cache: bool = False   # ask Groq even if an identical question was answered
+
+def _cache_key(req: GroqRequest):
+    entry = session_store[req.session_id]
+    meta = entry["meta"]
+    return answer_cache.key(req.session_id, req.page, entry.get("version"), meta['steps'],
+                            meta['target_column'], req.question)
+
+def _save_tip(req: GroqRequest, answer: str):
+    session_store[req.session_id]["meta"].setdefault("tips", {}).setdefault(req.page, []).append(answer)
+
+def _prompt(req: GroqRequest):
+    # dataset context is cached on the session entry per data version
+    entry = session_store[req.session_id]
+    meta = entry["meta"]
+    messages, info = build_prompt(
+        req.page,
+        entry["data"],
+        meta['steps'],
+        meta['target_column'],
+        req.question,
+        cache=entry.setdefault("prompt_context", {}),
+        version=entry.get("version"),
+    )
+    print(f"Prompt for {req.session_id}: {info}")
+    return messages, info
 
 @router.post("/suggest")
 async def suggest(req: GroqRequest):
@@ -25,27 +53,101 @@ async def suggest(req: GroqRequest):
     if not api_key:
         raise HTTPException(500, "GROQ_API_KEY not set")
 
-    # merge in full session metadata
     try:
-        data = session_store[req.session_id]["data"]
-        meta = session_store[req.session_id]["meta"]
+        start = time.perf_counter()
+        # deferred steps run first: the prompt has to describe the data the
+        # steps say it is, and the version the answer is cached under moves
+        await run_in_threadpool(materialize_plan, req.session_id)
+        key = _cache_key(req)
+        cached = None if req.bypass_cache else answer_cache.get(key)
+        if cached is not None:
+            _save_tip(req, cached)
+            return {"answer": cached, "cached": True, "ms": round((time.perf_counter() - start) * 1000, 2)}
 
-        messages = build_prompt(
-                    req.page, 
-                    data,
-                    meta['steps'],
-                    meta['target_column'],
-                    req.question,
-                )
+        messages, prompt_info = await run_in_threadpool(_prompt, req)
 
         buffer: List[str] = []
         async for piece in stream_groq_response(api_key, messages):
             buffer.append(piece)
 
         full_answer = "".join(buffer).strip()
-        
-        session_store[req.session_id]["meta"].setdefault("tips", {}).setdefault(req.page, []).append(full_answer)
-        return {"answer": full_answer}
+        # a bypass still refreshes the entry
+        answer_cache.put(key, full_answer)
+        _save_tip(req, full_answer)
+        return {"answer": full_answer, "cached": False, "ms": round((time.perf_counter() - start) * 1000, 2),
+                "prompt": prompt_info}
     except Exception as e:
         print(f"Error in suggest: {e}")
-        raise HTTPException(500, "Error in suggest" + str(e))
\ No newline at end of file
+        raise HTTPException(500, "Error in suggest" + str(e))
+
+@router.get("/cache")
+async def cache_stats():
+    return answer_cache.stats()
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/suggest/stream")
+async def suggest_stream(req: GroqRequest, request: Request):
+    # Same answer as /suggest, relayed as Server-Sent Events while Groq
+    # generates it: "token" events with each delta, then "done" with the
+    # full answer and timing, or "error". The answer is only saved to
+    # meta["tips"] when the stream completes. A cached answer is sent as a
+    # single token event.
+    if req.session_id not in session_store:
+        raise HTTPException(404, "Invalid session_id")
+    api_key = os.getenv("GROQ_API_KEY") or ""
+    if not api_key:
+        raise HTTPException(500, "GROQ_API_KEY not set")
+
+    try:
+        await run_in_threadpool(materialize_plan, req.session_id)
+        key = _cache_key(req)
+        cached = None if req.bypass_cache else answer_cache.get(key)
+        if cached is None:
+            messages, prompt_info = await run_in_threadpool(_prompt, req)
+    except Exception as e:
+        print(f"Error in suggest_stream: {e}")
+        raise HTTPException(500, "Error in suggest" + str(e))
+
+    async def replay():
+        _save_tip(req, cached)
+        yield _sse("token", {"content": cached})
+        yield _sse("done", {"answer": cached, "cached": True})
+
+    async def events():
+        start = time.perf_counter()
+        first_token_ms = None
+        buffer: List[str] = []
+        try:
+            async for piece in stream_groq_response(api_key, messages):
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - start) * 1000
+                buffer.append(piece)
+                yield _sse("token", {"content": piece})
+                if await request.is_disconnected():
+                    print(f"Client left suggest stream for {req.session_id} after {len(buffer)} tokens")
+                    return
+        except Exception as e:
+            print(f"Error in suggest_stream: {e}")
+            yield _sse("error", {"error": str(e)})
+            return
+
+        total_ms = (time.perf_counter() - start) * 1000
+        full_answer = "".join(buffer).strip()
+        # Groq sends about one token per delta, so deltas stand in for tokens
+        generating_s = (total_ms - (first_token_ms or 0)) / 1000
+        stats = {
+            "time_to_first_token_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+            "total_ms": round(total_ms, 1),
+            "tokens": len(buffer),
+            "tokens_per_sec": round(len(buffer) / generating_s, 1) if generating_s > 0 else None,
+        }
+        answer_cache.put(key, full_answer)
+        if req.session_id in session_store:
+            _save_tip(req, full_answer)
+        print(f"Suggest stream for {req.session_id}: {stats}")
+        yield _sse("done", {"answer": full_answer, "cached": False, **stats, "prompt": prompt_info})
+
+    return StreamingResponse(replay() if cached is not None else events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -1,24 +1,79 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Any, Dict, List, Optional
-from app.routes.upload import session_store
+import asyncio, json, threading
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from app.routes.upload import session_store, update_session_data
 import pandas as pd
 import numpy as np
-from app.utils.preprocessing import apply_encoding, apply_scaling, apply_balancing, apply_skewness_fix
+from app.utils.balancing import balance
+from app.utils.preprocessing import apply_encoding, fit_scaling, fit_skewness, impute
 from app.utils.models import MODEL_MAP, train_and_evaluate
+from app.utils.automl import AUTOML_METRICS, run_automl
+from app.utils.evaluation import split_evaluation
+from app.utils.out_of_core import DEFAULT_CHUNKSIZE, session_data_path, train_out_of_core
 from app.utils.supabase_client import save_job_record
-from app.utils.explainability import get_shap_values
+from app.utils.explainability import BACKGROUND_ROWS, EXPLAIN_ROWS, sample_rows, submit_explanation, find_run_id
+from app.utils.progress import ProgressReporter, progress_bus
+from app.utils.plan import MAX_PREVIEW_ROWS, PREVIEW_ROWS, clean_ops, describe, dry_run, execute, optimize, transform_ops
 from app.utils.sanitize_np import sanitize_numpy
+from app.utils.frame_stream import FORMATS, iter_frame
 from fastapi.encoders import jsonable_encoder
 
 
 router = APIRouter()
 
+FILL_STRATEGIES = {"mean", "median", "mode", "drop"}
+
+_plan_lock = threading.Lock()
+
+def materialize_plan(session_id: str):
+    # runs any deferred clean/transform ops on the full frame; called by
+    # everything that needs the real data (eager steps, train, export, charts,
+    # the assistant). Concurrent callers wait instead of running the plan twice.
+    entry = session_store[session_id]
+    if not entry.get("plan"):
+        return None
+    with _plan_lock:
+        ops = list(entry.get("plan") or [])
+        if not ops:
+            return None
+        stages = optimize(ops)
+        df, report = execute(entry["data"], stages, entry["meta"].get("target_column"))
+        update_session_data(session_id, df)
+        # ops deferred while this ran stay queued
+        del entry["plan"][:len(ops)]
+    entry["plan_report"] = {"ops": len(ops), "stages": describe(stages), "report": report}
+    print(f"Materialized plan for {session_id}: {len(ops)} ops in {len(stages)} stages, "
+          f"{sum(r['ms'] for r in report):.0f} ms")
+    return report
+
+def _defer(session_id: str, ops: list):
+    # appends ops to the session plan and runs the whole plan on the first
+    # PREVIEW_ROWS rows; statistics (means, scaler ranges) come from that sample
+    entry = session_store[session_id]
+    plan = entry.setdefault("plan", [])
+    plan.extend(ops)
+    sample = entry["data"].head(PREVIEW_ROWS)
+    try:
+        stages = optimize(plan)
+        out, report = execute(sample, stages, entry["meta"].get("target_column"))
+    except Exception:
+        del plan[len(plan) - len(ops):]
+        raise
+    # row count the full run is expected to produce (dropna/balancing change it)
+    projected_rows = int(round(len(entry["data"]) * len(out) / max(len(sample), 1)))
+    return out, projected_rows, {"deferred": True, "plan": describe(stages), "preview_rows": int(len(sample)),
+                                 "preview_report": report}
+
 # Request schema for cleaning
 class CleaningRequest(BaseModel):
     session_id: str
     target_column: str
     fill_strategies: Dict[str, str]
+    # record the ops in the session plan instead of rewriting the data now
+    deferred: Optional[bool] = False
 
 @router.post("/clean")
 async def clean_data(payload: CleaningRequest):
@@ -26,35 +81,32 @@ async def clean_data(payload: CleaningRequest):
     if sid not in session_store:
         raise HTTPException(404, "Invalid session ID")
 
+    if payload.deferred:
+        unknown = {c: s for c, s in payload.fill_strategies.items() if s not in FILL_STRATEGIES}
+        if unknown:
+            raise HTTPException(400, f"Unknown strategies {unknown}")
+        return _deferred_clean(payload)
+
     try:
+        materialize_plan(sid)
         df: pd.DataFrame = session_store[sid]["data"]
-        orig_nulls = df.isnull().sum().to_dict()
-        to_clean = {c: n for c,n in orig_nulls.items() if n > 0}
 
         # update target
         if payload.target_column in df.columns:
             session_store[sid]["meta"]["target_column"] = payload.target_column
 
         # apply strategies
-        df_clean = df.copy()
-        for col, strat in payload.fill_strategies.items():
-            if strat == "mean":
-                df_clean[col] = df_clean[col].fillna(df_clean[col].mean())
-            elif strat == "median":
-                df_clean[col] = df_clean[col].fillna(df_clean[col].median())
-            elif strat == "mode":
-                df_clean[col] = df_clean[col].fillna(df_clean[col].mode()[0])
-            elif strat == "drop":
-                df_clean = df_clean.dropna(subset=[col])
-            else:
-                raise HTTPException(400, f"Unknown strategy '{strat}'")
+        try:
+            df_clean, report = impute(df, payload.fill_strategies)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
 
         # persist cleaned df
-        session_store[sid]["data"] = df_clean
+        update_session_data(sid, df_clean)
         session_store[sid]["meta"]["steps"].setdefault("clean", []).append(payload.fill_strategies)
 
-        # after null summary
-        after_nulls = df_clean.isnull().sum().to_dict()
+        to_clean = {c: n for c, n in report["before_nulls"].items() if n > 0}
+        after_nulls = report["after_nulls"]
 
         # identify column types
         num_cols = df_clean.select_dtypes(include="number").columns.tolist()
@@ -78,13 +130,75 @@ async def clean_data(payload: CleaningRequest):
         "graph_types": graph_types,
         "rows": df_clean.shape[0],
         "columns": df_clean.shape[1],
-        "target_column": session_store[sid]["meta"]["target_column"]
+        "target_column": session_store[sid]["meta"]["target_column"],
+        "dropped_rows": report["dropped_rows"],
+        "timings": report["timings"],
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("Cleaning Error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _deferred_clean(payload: CleaningRequest):
+    sid = payload.session_id
+    try:
+        df: pd.DataFrame = session_store[sid]["data"]
+        orig_nulls = df.isnull().sum().to_dict()
+        if payload.target_column in df.columns:
+            session_store[sid]["meta"]["target_column"] = payload.target_column
+        preview_df, rows, plan_info = _defer(sid, clean_ops(payload.fill_strategies))
+        session_store[sid]["meta"]["steps"].setdefault("clean", []).append(payload.fill_strategies)
+
+        return {
+        "session_id": sid,
+        "preview": preview_df.head(5).replace({np.nan: None}).to_dict(orient="records"),
+        "before_nulls": {c: n for c, n in orig_nulls.items() if n > 0},
+        "after_nulls": preview_df.isnull().sum().to_dict(),
+        "numeric_cols": preview_df.select_dtypes(include="number").columns.tolist(),
+        "categorical_cols": preview_df.select_dtypes(include=["object","category","bool"]).columns.tolist(),
+        "graph_types": {
+            "numeric": ["histogram","boxplot","qq","line","scatter"],
+            "categorical": ["bar","pie"]
+        },
+        "rows": rows,
+        "columns": preview_df.shape[1],
+        "target_column": session_store[sid]["meta"].get("target_column"),
+        **plan_info,
         }
 
     except Exception as e:
         print("Cleaning Error:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+class CleanPreviewRequest(CleaningRequest):
+    sample_size: Optional[int] = PREVIEW_ROWS
+
+def _preview(session_id: str, ops: list, target: str, sample_size: int) -> dict:
+    entry = session_store[session_id]
+    sample_size = max(1, min(sample_size or PREVIEW_ROWS, MAX_PREVIEW_ROWS))
+    result = dry_run(entry["data"], entry.get("plan") or [], ops, target, sample_size)
+    result["preview"] = result["preview"].replace({np.nan: None}).to_dict(orient="records")
+    return {"session_id": session_id, **result}
+
+@router.post("/clean/preview")
+async def preview_clean(payload: CleanPreviewRequest):
+    # dry run of /clean on a sample; the session data is left as it is
+    sid = payload.session_id
+    if sid not in session_store:
+        raise HTTPException(404, "Invalid session ID")
+    unknown = {c: s for c, s in payload.fill_strategies.items() if s not in FILL_STRATEGIES}
+    if unknown:
+        raise HTTPException(400, f"Unknown strategies {unknown}")
+    try:
+        result = await run_in_threadpool(_preview, sid, clean_ops(payload.fill_strategies),
+                                         payload.target_column, payload.sample_size)
+        return sanitize_numpy(result)
+    except Exception as e:
+        print("Clean Preview Error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
 class EDARequest(BaseModel):
     session_id: str
     target_column: Optional[str] = None  # For classification imbalance
@@ -104,7 +218,9 @@ async def perform_eda(payload: EDARequest):
     df = session_store[session_id]["data"]
 
     try:
-        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+        # sparse one-hot indicators are left out like the bool dummies are
+        numeric_cols = [c for c, t in df.select_dtypes(include=[np.number]).dtypes.items()
+                        if not isinstance(t, pd.SparseDtype)]
         cat_cols = df.select_dtypes(include=["object", "category", "bool"]).columns.tolist()
 
         # Correlation
@@ -149,6 +265,7 @@ class TransformRequest(BaseModel):
     drop_columns: Optional[List[str]] = []
     skewness: Optional[str] = None
     skewness_columns: Optional[List[str]] = []
+    deferred: Optional[bool] = False
 
 @router.post("/transform")
 async def transform_data(payload: TransformRequest):
@@ -156,6 +273,14 @@ async def transform_data(payload: TransformRequest):
     if session_id not in session_store:
         raise HTTPException(status_code=404, detail="Invalid session ID.")
 
+    if payload.deferred:
+        return _deferred_transform(payload)
+    try:
+        materialize_plan(session_id)
+    except Exception as e:
+        print("Transform Error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
     df = session_store[session_id]["data"].copy()
     target = session_store[session_id]["meta"].get("target_column", None)
     try:
@@ -169,40 +294,93 @@ async def transform_data(payload: TransformRequest):
         if payload.encoding and payload.encoding != "none":
             X = apply_encoding(X, payload.encoding, payload.encoding_columns)
 
-        # Apply skewness fix
+        # Apply skewness fix; per-column lambdas are kept so it can be replayed
+        fitted = {}
         if payload.skewness and payload.skewness != "none":
-            X = apply_skewness_fix(X, payload.skewness, payload.skewness_columns)
+            X, fitted["skew_fix"] = fit_skewness(X, payload.skewness, payload.skewness_columns)
 
         # Apply scaling only on user-selected numeric columns
         if payload.scaling and payload.scaling != "none":
-            X = apply_scaling(X, payload.scaling, payload.scaling_columns)
+            X, fitted["scaling"] = fit_scaling(X, payload.scaling, payload.scaling_columns)
 
         # Apply balancing
+        balancing = None
         if payload.balancing and payload.balancing != "none":
-            X, y = apply_balancing(X, y, payload.balancing)
+            X, y, balancing = balance(X, y, payload.balancing)
 
         df_transformed = pd.concat([X, y], axis=1)
-        session_store[session_id]["data"] = df_transformed
+        update_session_data(session_id, df_transformed)
         if session_store[session_id]["meta"]["steps"].get("transform") is None:
             session_store[session_id]["meta"]["steps"]["transform"] = []
-        session_store[session_id]["meta"]["steps"]["transform"].append({
-            "encoding": {payload.encoding: payload.encoding_columns} if payload.encoding else {},
-            "scaling": {payload.scaling: payload.scaling_columns} if payload.scaling else {},
-            "balancing": {payload.balancing: payload.balancing_columns} if payload.balancing else {},
-            "skew_fix": {payload.skewness: payload.skewness_columns} if payload.skewness else {},
-            "dropped_columns": payload.drop_columns
-        })
+        session_store[session_id]["meta"]["steps"]["transform"].append({**_transform_step(payload), "fitted": fitted})
 
         return {
             "session_id": session_id,
             "transformed_preview": df_transformed.head(5).replace({np.nan: None}).to_dict(orient="records"),
-            "shape": df_transformed.shape
+            "shape": df_transformed.shape,
+            "balancing": balancing,
+        }
+
+    except Exception as e:
+        print("Transform Error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _transform_step(payload: TransformRequest) -> dict:
+    return {
+        "encoding": {payload.encoding: payload.encoding_columns} if payload.encoding else {},
+        "scaling": {payload.scaling: payload.scaling_columns} if payload.scaling else {},
+        "balancing": {payload.balancing: payload.balancing_columns} if payload.balancing else {},
+        "skew_fix": {payload.skewness: payload.skewness_columns} if payload.skewness else {},
+        "dropped_columns": payload.drop_columns
+    }
+
+def _deferred_transform(payload: TransformRequest):
+    session_id = payload.session_id
+    target = session_store[session_id]["meta"].get("target_column", None)
+    try:
+        preview_df, rows, plan_info = _defer(session_id, transform_ops(payload, target))
+        session_store[session_id]["meta"]["steps"].setdefault("transform", []).append(_transform_step(payload))
+        return {
+            "session_id": session_id,
+            "transformed_preview": preview_df.head(5).replace({np.nan: None}).to_dict(orient="records"),
+            "shape": (rows, preview_df.shape[1]),
+            **plan_info,
         }
 
     except Exception as e:
         print("Transform Error:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+class TransformPreviewRequest(TransformRequest):
+    sample_size: Optional[int] = PREVIEW_ROWS
+
+@router.post("/transform/preview")
+async def preview_transform(payload: TransformPreviewRequest):
+    # dry run of /transform on a sample; the session data is left as it is
+    session_id = payload.session_id
+    if session_id not in session_store:
+        raise HTTPException(status_code=404, detail="Invalid session ID.")
+    target = session_store[session_id]["meta"].get("target_column", None)
+    try:
+        result = await run_in_threadpool(_preview, session_id, transform_ops(payload, target), target,
+                                         payload.sample_size)
+        return sanitize_numpy(result)
+    except Exception as e:
+        print("Transform Preview Error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/plan/{session_id}")
+async def get_plan(session_id: str):
+    if session_id not in session_store:
+        raise HTTPException(status_code=404, detail="Invalid session ID.")
+    entry = session_store[session_id]
+    ops = entry.get("plan") or []
+    return {
+        "session_id": session_id,
+        "pending_ops": ops,
+        "optimized": describe(optimize(ops)) if ops else [],
+        "last_run": entry.get("plan_report"),
+    }
 
 class TrainRequest(BaseModel):
     session_id: str
@@ -211,95 +389,337 @@ class TrainRequest(BaseModel):
     test_size: Optional[float] = 0.2
     random_state: Optional[int] = 42
     stratify: Optional[bool] = True
+    # stream the session's on-disk data in chunks instead of training in memory
+    out_of_core: Optional[bool] = False
+    chunksize: Optional[int] = DEFAULT_CHUNKSIZE
+
+def _native_datasets(session_id: str, split_key: tuple) -> dict:
+    # native xgboost/lightgbm datasets are built once per data version and split
+    native = session_store[session_id].get("native")
+    if not native or native["key"] != split_key:
+        native = session_store[session_id]["native"] = {"key": split_key, "datasets": {}}
+    return native["datasets"]
+
+# fitted models kept per session for SHAP jobs: the latest KEPT_RUNS runs and
+# the best one. Run summaries in meta are never dropped.
+KEPT_RUNS = 5
+# metric a run is ranked by, first one present wins
+RANK_METRICS = ("roc_auc", "accuracy", "r2")
+
+def _run_score(run: dict) -> float:
+    metrics = run.get("metrics") or {}
+    for key in RANK_METRICS:
+        if metrics.get(key) is not None:
+            return float(metrics[key])
+    return float("-inf")
+
+def _prune_runs(session_id: str):
+    # older runs lose their model and SHAP results; finished explanations of
+    # kept runs stay cached
+    entry = session_store[session_id]
+    runs = entry["meta"]["steps"].get("train", [])
+    keep = {run["run_id"] for run in runs[-KEPT_RUNS:]}
+    if runs:
+        keep.add(max(runs, key=_run_score)["run_id"])
+    for store in (entry.get("models", {}), entry.get("explain", {})):
+        for run_id in [r for r in store if r not in keep]:
+            del store[run_id]
+
+def _record_run(session_id, model_key, model_name, params_used, scores, cm, evaluation, artifacts,
+                out_of_core=False, extra=None) -> int:
+    meta = session_store[session_id]["meta"]
+    user_id = meta.get("user_id", "00000000-0000-0000-0000-000000000000")
+
+    try:
+        save_job_record(
+            user_id=user_id,
+            session_id=session_id,
+            filename=meta["filename"],
+            df_shape=session_store[session_id]["data"].shape,
+            pipeline_steps=meta["steps"],
+            model_config={"model": model_name, "params": params_used},
+            metrics=scores
+        )
+    except Exception as e:
+        print("Error saving job record:", e)
+
+    if meta["steps"].get("train") is None:
+        meta["steps"]["train"] = []
+
+    run_id = len(meta["steps"]["train"])
+    eval_summary, eval_arrays = split_evaluation(evaluation) if evaluation else (None, None)
+    meta["steps"]["train"].append({
+        "run_id": run_id,
+        "model_key": model_key,
+        "model": model_name,
+        "params": params_used,
+        "out_of_core": out_of_core,
+        "fit": artifacts.get("fit"),
+        "metrics": scores,
+        "confusion_matrix": cm.tolist() if cm is not None else None,
+        "evaluation": eval_summary,
+        **(extra or {}),
+    })
+
+    # fitted model, capped feature samples for SHAP jobs and the compact
+    # y_true/y_score arrays, all kept outside meta
+    session_store[session_id].setdefault("models", {})[run_id] = {
+        "model_key": model_key,
+        "model": artifacts["model"],
+        "X_background": sample_rows(artifacts["X_train"], BACKGROUND_ROWS),
+        "X_explain": sample_rows(artifacts["X_test"], EXPLAIN_ROWS),
+        "scores": eval_arrays,
+    }
+    _prune_runs(session_id)
+    return run_id
 
 @router.post("/train")
 async def train_model(payload: TrainRequest):
     session_id = payload.session_id
     if session_id not in session_store:
         raise HTTPException(status_code=404, detail="Invalid session ID.")
+    try:
+        await run_in_threadpool(materialize_plan, session_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Deferred plan failed: {e}")
     df = session_store[session_id]["data"]
     meta = session_store[session_id]["meta"]
     target_column = meta.get("target_column", None)
-    y = df[target_column]
-    X = df.drop(columns=[target_column])
+    # fits run in the threadpool so /progress can stream while they train
+    progress = ProgressReporter(session_id, payload.model_key)
 
     try:
-        model_name, params_used, scores, cm, df_test = train_and_evaluate(
-            model_key=payload.model_key,
-            X=X,
-            y=y,
-            user_params=payload.hyperparameters,
-            test_size=payload.test_size if hasattr(payload, 'test_size') else 0.2,
-            random_state=payload.random_state if hasattr(payload, 'random_state') else 42,
-            stratify=payload.stratify if hasattr(payload, 'stratify') else True
-        )
-        user_id = meta.get("user_id", "00000000-0000-0000-0000-000000000000")
-
-        try:
-            save_job_record(
-                user_id=user_id,
+        if payload.out_of_core:
+            # spilling the frame writes a CSV, so keep it off the event loop
+            path = await run_in_threadpool(session_data_path, session_store[session_id], session_id, payload.chunksize)
+            model_name, params_used, scores, cm, evaluation, artifacts = await run_in_threadpool(
+                train_out_of_core,
                 session_id=session_id,
-                filename=meta["filename"],
-                df_shape=df.shape,
-                pipeline_steps=meta["steps"],
-                model_config={"model": model_name, "params": params_used},
-                metrics=scores
+                path=path,
+                target=target_column,
+                model_key=payload.model_key,
+                user_params=payload.hyperparameters,
+                test_size=payload.test_size,
+                random_state=payload.random_state,
+                chunksize=payload.chunksize,
+                progress=progress,
             )
-        except Exception as e:
-            print("Error saving job record:", e)
-
-        if session_store[session_id]["meta"]["steps"].get("train") is None:
-            session_store[session_id]["meta"]["steps"]["train"] = []
+            n_features = int(df.shape[1] - 1)
+        else:
+            y = df[target_column]
+            X = df.drop(columns=[target_column])
+            n_features = int(X.shape[1])
+            # the last fit of this model is only reusable on the same data and split
+            warm_key = (session_store[session_id].get("version", 0), payload.test_size, payload.random_state, payload.stratify)
+            previous = session_store[session_id].get("warm", {}).get(payload.model_key)
+            model_name, params_used, scores, cm, evaluation, artifacts = await run_in_threadpool(
+                train_and_evaluate,
+                model_key=payload.model_key,
+                X=X,
+                y=y,
+                user_params=payload.hyperparameters,
+                test_size=payload.test_size if hasattr(payload, 'test_size') else 0.2,
+                random_state=payload.random_state if hasattr(payload, 'random_state') else 42,
+                stratify=payload.stratify if hasattr(payload, 'stratify') else True,
+                warm_from=previous if previous and previous["key"] == warm_key else None,
+                dataset_cache=_native_datasets(session_id, warm_key),
+                progress=progress,
+            )
+            if artifacts["warm_state"]:
+                session_store[session_id].setdefault("warm", {})[payload.model_key] = {**artifacts["warm_state"], "key": warm_key}
+        run_id = _record_run(session_id, payload.model_key, model_name, params_used, scores, cm, evaluation,
+                             artifacts, out_of_core=bool(payload.out_of_core))
+        explain_status = (await run_in_threadpool(_start_explanation, session_id, run_id))["status"]
+        progress.done(run_id=run_id, metrics=sanitize_numpy(scores), fit=artifacts.get("fit"))
 
-        session_store[session_id]["meta"]["steps"]["train"].append({
+        return jsonable_encoder({
+            "session_id": session_id,
             "model": model_name,
-            "params": params_used,
-            "metrics": scores,
-            "confusion_matrix": cm.tolist() if cm is not None else None,
-            "test": df_test
+            "params_used": params_used,
+            "evaluation": sanitize_numpy(scores),
+            "rows": int(len(df)),
+            "features": n_features,
+            "out_of_core": artifacts.get("timings") if payload.out_of_core else None,
+            "fit": artifacts.get("fit"),
+            "run_id": run_id,
+            "progress_job": progress.job,
+            "explain_status": explain_status,
+            "confusion_matrix": sanitize_numpy(cm) if cm is not None else None
         })
 
-        # if session_store[session_id]["meta"]["steps"].get("explain") is None:
-        #     session_store[session_id]["meta"]["steps"]["explain"] = {}
-        # session_store[session_id]["meta"]["steps"]["explain"] ={
-        #     "model": model_name,
-        #     "params": params_used,
-        #     "shap_values": shap_values,
-        #     "X_test": X_test
-        # } 
+    except Exception as e:
+        print("Train Error:", e)
+        progress.error(str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+class AutoMLRequest(BaseModel):
+    session_id: str
+    budget_seconds: Optional[float] = 60
+    metric: Optional[str] = "roc_auc"
+    # restrict the search to these MODEL_MAP keys; default is every classifier
+    models: Optional[List[str]] = None
+    n_parallel: Optional[int] = None
+    max_trials: Optional[int] = 100
+    test_size: Optional[float] = 0.2
+    random_state: Optional[int] = 42
+    stratify: Optional[bool] = True
+
+@router.post("/automl")
+async def automl(payload: AutoMLRequest):
+    session_id = payload.session_id
+    if session_id not in session_store:
+        raise HTTPException(status_code=404, detail="Invalid session ID.")
+    if payload.metric not in AUTOML_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {sorted(AUTOML_METRICS)}")
+    unknown = [m for m in payload.models or [] if m not in MODEL_MAP]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown models: {unknown}")
+    if not payload.budget_seconds or payload.budget_seconds <= 0:
+        raise HTTPException(status_code=400, detail="budget_seconds must be positive")
+    try:
+        await run_in_threadpool(materialize_plan, session_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Deferred plan failed: {e}")
+
+    df = session_store[session_id]["data"]
+    target_column = session_store[session_id]["meta"].get("target_column", None)
+    if target_column not in df.columns:
+        raise HTTPException(status_code=400, detail="Set a target column with /pipeline/clean first.")
+    progress = ProgressReporter(session_id, "automl")
+    split_key = (session_store[session_id].get("version", 0), payload.test_size, payload.random_state, payload.stratify)
+
+    try:
+        best, trials, summary = await run_in_threadpool(
+            run_automl,
+            X=df.drop(columns=[target_column]),
+            y=df[target_column],
+            budget_s=payload.budget_seconds,
+            metric=payload.metric,
+            models=payload.models,
+            n_parallel=payload.n_parallel,
+            max_trials=payload.max_trials,
+            test_size=payload.test_size,
+            random_state=payload.random_state,
+            stratify=payload.stratify,
+            dataset_cache=_native_datasets(session_id, split_key),
+            progress=progress,
+        )
+        if best is None:
+            raise ValueError("No AutoML trial finished within the budget")
+
+        # the winner is recorded like any other train run, with the search history attached
+        model_name, params_used, scores, cm, evaluation, artifacts = best["outputs"]
+        run_id = _record_run(session_id, best["model_key"], model_name, params_used, scores, cm, evaluation,
+                             artifacts, extra={"automl": {**summary, "trials": trials}})
+        explain_status = (await run_in_threadpool(_start_explanation, session_id, run_id))["status"]
+        progress.done(run_id=run_id, model=best["model_key"], score=best["score"], trials=len(trials))
 
         return jsonable_encoder({
             "session_id": session_id,
+            "run_id": run_id,
+            "model_key": best["model_key"],
             "model": model_name,
             "params_used": params_used,
             "evaluation": sanitize_numpy(scores),
-            "rows": int(len(df)),
-            "features": int(X.shape[1]),
+            "automl": summary,
+            "trials": sanitize_numpy(trials),
+            "progress_job": progress.job,
+            "explain_status": explain_status,
             "confusion_matrix": sanitize_numpy(cm) if cm is not None else None
         })
 
     except Exception as e:
-        print("Train Error:", e)
+        print("AutoML Error:", e)
+        progress.error(str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+PROGRESS_KEEPALIVE = 15  # seconds between SSE comments on an idle stream
+
+@router.get("/progress/{session_id}")
+async def training_progress(session_id: str, request: Request, once: bool = False):
+    # Server-Sent Events for every training job in the session: stage changes,
+    # throttled per-iteration/fold/trial progress with ETA, then done/error.
+    # once=true closes the stream after the first job finishes.
+    if session_id not in session_store:
+        raise HTTPException(status_code=404, detail="Invalid session ID.")
+    queue = progress_bus.subscribe(session_id)
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=PROGRESS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(jsonable_encoder(event))}\n\n"
+                if once and event["type"] in ("done", "error"):
+                    break
+        finally:
+            progress_bus.unsubscribe(session_id, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _start_explanation(session_id: str, run_id: int) -> dict:
+    # may import shap, so async handlers run it in the threadpool
+    entry = session_store[session_id]
+    meta = entry["meta"]
+
+    cache = entry.setdefault("explain", {})
+    run = entry.get("models", {}).get(run_id)
+    if run is None:
+        # the model was dropped once its explanation finished
+        return cache[run_id]
+
+    def _record_summary(result):
+        meta["steps"].setdefault("explain", {})[run_id] = {
+            "model_key": result["model_key"],
+            "explainer": result["explainer"],
+            "importance": result["importance"],
+            "rows": result["rows"],
+            "elapsed_ms": result["elapsed_ms"],
+        }
+        # the cached SHAP values are all later requests need
+        entry.get("models", {}).pop(run_id, None)
+
+    return submit_explanation(cache, run_id, run, on_done=_record_summary)
+
 class ExplainRequest(BaseModel):
     session_id: str
-    model_key: str
+    model_key: Optional[str] = None
+    run_id: Optional[int] = None
 
 @router.post("/explain")
 async def explain_model(payload: ExplainRequest):
     session_id = payload.session_id
     if session_id not in session_store:
         raise HTTPException(status_code=404, detail="Invalid session ID.")
+    train_steps = session_store[session_id]["meta"]["steps"].get("train", [])
+    run_id = find_run_id(train_steps, payload.model_key, payload.run_id)
+    entry = session_store[session_id]
+    if run_id is None or (run_id not in entry.get("models", {}) and run_id not in entry.get("explain", {})):
+        raise HTTPException(status_code=404, detail="No trained model found to explain.")
+
     try:
-        model_key = payload.model_key
-        shap_values = session_store[session_id]["meta"]["steps"]["explain"].get("shap_values", None)
-        if shap_values is None:
-            raise HTTPException(status_code=400, detail="SHAP values not available.")
-        return {
+        # served from the per-run cache; starts the job only if it never ran or failed
+        job = await run_in_threadpool(_start_explanation, session_id, run_id)
+        response = {
             "session_id": session_id,
-            "shap_importance": shap_values.tolist() if isinstance(shap_values, np.ndarray) else shap_values
+            "run_id": run_id,
+            "model_key": job["model_key"],
+            "status": job["status"],
         }
+        if job["status"] == "done":
+            response.update({
+                "explainer": job["explainer"],
+                "rows": job["rows"],
+                "elapsed_ms": job["elapsed_ms"],
+                "shap_importance": job["importance"],
+            })
+        elif job["status"] == "error":
+            response["error"] = job.get("error")
+        return response
 
     except Exception as e:
         print("Explain Error:", e)
@@ -309,27 +729,60 @@ class SessionRequest(BaseModel):
     session_id: str
 
 
+class DataRequest(SessionRequest):
+    offset: int = Field(0, ge=0)
+    limit: Optional[int] = Field(None, ge=1)        # rows from offset; None = to the end
+    columns: Optional[List[str]] = None             # projection; None = every column
+    format: str = Field("json", pattern="^(json|ndjson|csv|arrow)$")
+    include_meta: bool = True                       # json only
+
+
 @router.post("/data")
-def get_data(payload: SessionRequest):
+def get_data(payload: DataRequest):
+    # One page of the session frame, encoded and streamed chunk by chunk.
+    # "json" keeps the original {"session_id", "session_data": {"data", "meta"}}
+    # shape; ndjson/csv/arrow stream rows only. Page bounds go in X-* headers.
     session_id = payload.session_id
     if session_id not in session_store:
         raise HTTPException(status_code=404, detail="Invalid session ID.")
 
+    materialize_plan(session_id)
     entry = session_store[session_id]
     df: pd.DataFrame = entry["data"]
-    meta: Dict[str, Any] = entry["meta"]
-
-    # turn the DataFrame into a list of plain dicts
-    data_records = df.to_dict(orient="records")
-
-    return {
-        "session_id": session_id,
-        "session_data": {
-            "data": data_records,
-            "meta": meta
-        }
+    if payload.columns is not None:
+        missing = [c for c in payload.columns if c not in df.columns]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Unknown column(s): {missing}")
+        df = df[list(dict.fromkeys(payload.columns))]
+    if payload.format == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Arrow output needs pyarrow installed.")
+
+    total = len(df)
+    start = min(payload.offset, total)
+    stop = total if payload.limit is None else min(start + payload.limit, total)
+    envelope = None
+    if payload.format == "json":
+        envelope = {"session_id": session_id, "total_rows": total, "offset": start, "rows": stop - start}
+        if payload.include_meta:
+            envelope["meta"] = sanitize_numpy(entry["meta"])
+
+    headers = {
+        "X-Total-Rows": str(total),
+        "X-Offset": str(start),
+        "X-Rows": str(stop - start),
+        "X-Data-Version": str(entry.get("version")),
     }
-    
+    if stop < total:
+        headers["X-Next-Offset"] = str(stop)
+    if payload.format == "csv":
+        headers["Content-Disposition"] = f'attachment; filename="{session_id}_data.csv"'
+    # a sync generator, so Starlette encodes the chunks in its threadpool
+    return StreamingResponse(iter_frame(df, payload.format, start, stop, envelope),
+                             media_type=FORMATS[payload.format], headers=headers)
+
 @router.get("/metrics")
 async def get_metrics(session_id: str):
     if session_id not in session_store:
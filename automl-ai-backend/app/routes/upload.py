@@ -6,12 +6,27 @@ from io import BytesIO
 from typing import List, Dict
 import traceback
 import numpy as np
+from app.utils.out_of_core import discard_spill, remove_session_dir
 
 router = APIRouter()
 
 # In-memory store for session data (for MVP only)
 session_store: Dict[str, pd.DataFrame] = {}
 
+def update_session_data(session_id: str, df: pd.DataFrame):
+    # every replacement of the frame bumps the version, so caches keyed on
+    # (session, version) know when they are stale
+    entry = session_store[session_id]
+    entry["data"] = df
+    entry["version"] = entry.get("version", 0) + 1
+    discard_spill(entry)
+
+def drop_session(session_id: str) -> bool:
+    # forgets the session and deletes its working files
+    entry = session_store.pop(session_id, None)
+    remove_session_dir(session_id)
+    return entry is not None
+
 @router.post("/file")
 async def upload_dataset(file: UploadFile = File(...)):
     # Check file type
@@ -33,6 +48,7 @@ async def upload_dataset(file: UploadFile = File(...)):
         session_id = str(uuid.uuid4())
         session_store[session_id] = {
             "data": df,
+            "version": 0,
             "meta": {
                 "filename": file.filename,
                 "target_column": None,
@@ -40,7 +56,6 @@ async def upload_dataset(file: UploadFile = File(...)):
             }
         }
 
-
         # Generate schema preview
         schema = []
         for col in df.columns:
@@ -69,3 +84,9 @@ async def upload_dataset(file: UploadFile = File(...)):
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/session/{session_id}")
+async def delete_session(session_id: str):
+    if not drop_session(session_id):
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return {"session_id": session_id, "deleted": True}
@@ -0,0 +1,190 @@
+import math, os, threading, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+from app.utils.boosting import NATIVE_MODELS
+from app.utils.models import CLASSIFICATION_MODELS, train_and_evaluate
+
+AUTOML_METRICS = {"roc_auc", "pr_auc", "accuracy", "f1", "precision", "recall"}
+
+# Relative cost of one default fit; cheap families are tried first and the
+# ratios turn one observed trial time into estimates for the families not run yet
+FAMILY_COST = {
+    "naive_bayes": 1,
+    "logistic": 2,
+    "decision_tree": 2,
+    "knn": 4,
+    "lightgbm": 5,
+    "xgboost": 6,
+    "random_forest": 10,
+    "svm": 50,
+}
+SVM_MAX_ROWS = 20_000       # SVC fit time grows quadratically; skip it above this
+TOP_FAMILIES = 3            # after every family has run once, only the best few get more trials
+DEFAULT_UNIT_MS = 200       # cost-unit estimate before any trial has finished
+MAX_TRIALS = 100            # keeps the history stored in meta small on tiny datasets
+N_THREADS_PARAM = {"random_forest", "knn", "xgboost", "lightgbm"}
+
+# ("log"|"float"|"int", low, high) or ("choice", [options]); sampled per trial
+SEARCH_SPACES = {
+    "naive_bayes": {"var_smoothing": ("log", 1e-11, 1e-7)},
+    "logistic": {"C": ("log", 1e-3, 1e2)},
+    "decision_tree": {"max_depth": ("int", 2, 20), "min_samples_leaf": ("int", 1, 50)},
+    "knn": {"n_neighbors": ("int", 3, 50), "weights": ("choice", ["uniform", "distance"])},
+    "lightgbm": {
+        "n_estimators": ("int", 50, 500), "num_leaves": ("int", 8, 128), "max_depth": ("int", 3, 12),
+        "learning_rate": ("log", 0.01, 0.3), "feature_fraction": ("float", 0.5, 1.0),
+        "min_child_samples": ("int", 5, 100),
+    },
+    "xgboost": {
+        "n_estimators": ("int", 50, 500), "max_depth": ("int", 2, 10), "learning_rate": ("log", 0.01, 0.3),
+        "subsample": ("float", 0.5, 1.0), "colsample_bytree": ("float", 0.5, 1.0),
+    },
+    "random_forest": {
+        "n_estimators": ("int", 50, 400), "max_depth": ("int", 3, 20), "min_samples_leaf": ("int", 1, 20),
+        "max_features": ("choice", ["sqrt", "log2"]),
+    },
+    "svm": {"C": ("log", 1e-2, 1e2)},
+}
+
+def sample_params(space: dict, rng: np.random.Generator) -> dict:
+    params = {}
+    for name, (kind, *args) in space.items():
+        if kind == "log":
+            params[name] = float(math.exp(rng.uniform(math.log(args[0]), math.log(args[1]))))
+        elif kind == "float":
+            params[name] = float(rng.uniform(args[0], args[1]))
+        elif kind == "int":
+            params[name] = int(rng.integers(args[0], args[1] + 1))
+        else:
+            params[name] = args[0][int(rng.integers(len(args[0])))]
+    return params
+
+class _Scheduler:
+    # Picks the next (family, params): every family's defaults in cost order
+    # first, then random configs for the current top families, weighted 1/rank
+    def __init__(self, families, rng):
+        self.rng = rng
+        self.pending = sorted(families, key=FAMILY_COST.get)
+        self.best = {}          # family -> best score so far
+        self.durations = {}     # family -> [trial ms]
+
+    def record(self, family, score, duration_ms):
+        self.durations.setdefault(family, []).append(duration_ms)
+        if score is not None and score > self.best.get(family, -math.inf):
+            self.best[family] = score
+
+    def estimate_ms(self, family):
+        if family in self.durations:
+            return float(np.mean(self.durations[family]))
+        units = [np.mean(d) / FAMILY_COST[f] for f, d in self.durations.items()]
+        return (min(units) if units else DEFAULT_UNIT_MS) * FAMILY_COST[family]
+
+    def next(self, remaining_ms, started):
+        while self.pending:
+            family = self.pending.pop(0)
+            if self.estimate_ms(family) <= remaining_ms:
+                return family, {}
+        # only once every default trial has been started (or skipped)
+        if any(f not in self.durations for f in started):
+            return None
+        ranked = sorted(self.best, key=self.best.get, reverse=True)[:TOP_FAMILIES]
+        ranked = [f for f in ranked if self.estimate_ms(f) <= remaining_ms]
+        if not ranked:
+            return None
+        weights = np.array([1.0 / (i + 1) for i in range(len(ranked))])
+        family = ranked[int(self.rng.choice(len(ranked), p=weights / weights.sum()))]
+        return family, sample_params(SEARCH_SPACES[family], self.rng)
+
+def run_automl(X, y, budget_s=60, metric="roc_auc", models=None, n_parallel=None, max_trials=MAX_TRIALS,
+               test_size=0.2, random_state=42, stratify=True, dataset_cache=None, progress=None):
+    # Returns (best trial with its train_and_evaluate outputs, trial history, summary).
+    # Trials are only started when their estimated time fits the remaining
+    # budget; trials already running are allowed to finish.
+    families = [m for m in (models or FAMILY_COST) if m in CLASSIFICATION_MODELS and m in FAMILY_COST]
+    if len(X) > SVM_MAX_ROWS and "svm" in families and not models:
+        families.remove("svm")
+    if not families:
+        raise ValueError("No AutoML-capable models selected")
+
+    n_parallel = n_parallel or min(4, os.cpu_count() or 1)
+    threads_per_trial = max(1, (os.cpu_count() or 1) // n_parallel)
+    # trials of one native booster share its cached dataset, so they take turns
+    native_locks = {m: threading.Lock() for m in NATIVE_MODELS}
+    scheduler = _Scheduler(families, np.random.default_rng(random_state))
+    start = time.perf_counter()
+    deadline = start + budget_s
+    trials, best = [], None
+
+    def _trial(family, params):
+        if family in N_THREADS_PARAM:
+            params = {**params, "n_jobs": threads_per_trial}
+        lock = native_locks.get(family)
+        if lock:
+            lock.acquire()
+        t0 = time.perf_counter()
+        try:
+            outputs, error = train_and_evaluate(family, X, y, params, test_size=test_size, random_state=random_state,
+                                                stratify=stratify, dataset_cache=dataset_cache), None
+        except Exception as e:
+            outputs, error = None, str(e)
+        finally:
+            if lock:
+                lock.release()
+        return outputs, (time.perf_counter() - t0) * 1000, error
+
+    if progress:
+        progress.begin("search", unit="trial")
+    with ThreadPoolExecutor(max_workers=n_parallel, thread_name_prefix="automl") as pool:
+        running = {}
+        started = set()
+        while True:
+            while len(running) < n_parallel and len(trials) + len(running) < max_trials:
+                remaining_ms = (deadline - time.perf_counter()) * 1000
+                picked = scheduler.next(remaining_ms, started) if remaining_ms > 0 else None
+                if picked is None:
+                    break
+                family, params = picked
+                started.add(family)
+                number = len(trials) + len(running)
+                running[pool.submit(_trial, family, params)] = (number, family, params)
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                number, family, params = running.pop(future)
+                outputs, duration_ms, error = future.result()
+                trial = {"trial": number, "model_key": family, "params": params, "duration_ms": round(duration_ms, 1)}
+                if error:
+                    print(f"AutoML trial {number} ({family}) failed: {error}")
+                    trial.update(status="error", error=error, score=None)
+                    scheduler.record(family, None, duration_ms)
+                else:
+                    scores = outputs[2]
+                    trial.update(status="ok", score=scores.get(metric), metrics=scores)
+                    scheduler.record(family, trial["score"], duration_ms)
+                    if trial["score"] is not None and (best is None or trial["score"] > best["score"]):
+                        # only the best trial's model and artifacts are kept around
+                        best = {**trial, "outputs": outputs}
+                trials.append(trial)
+                if progress:
+                    progress.update(len(trials), force=True, trial=trial["trial"], model_key=family,
+                                    score=trial["score"], best_score=best["score"] if best else None,
+                                    remaining_ms=round(max(deadline - time.perf_counter(), 0) * 1000, 1))
+
+    trials.sort(key=lambda t: t["trial"])
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    leaderboard = {f: round(s, 4) for f, s in sorted(scheduler.best.items(), key=lambda kv: -kv[1])}
+    summary = {
+        "budget_s": budget_s,
+        "metric": metric,
+        "elapsed_ms": round(elapsed_ms, 1),
+        "n_trials": len(trials),
+        "n_parallel": n_parallel,
+        "families": families,
+        "leaderboard": leaderboard,
+        "best_trial": best["trial"] if best else None,
+    }
+    print(f"AutoML: {len(trials)} trials in {elapsed_ms / 1000:.1f}s, best {metric}: "
+          f"{best['score'] if best else None} ({best['model_key'] if best else '-'})")
+    return best, trials, summary
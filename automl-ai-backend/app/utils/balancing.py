@@ -0,0 +1,158 @@
+import math, time
+import numpy as np
+import pandas as pd
+
+# Resampling for the transform step. Every class is brought to the majority
+# count (smote) or the minority count (undersample) in one pass; SMOTE rows
+# are interpolated in vectorized batches instead of one estimator call.
+# Sparse (onehot) columns stay sparse: SMOTE then runs on one CSR matrix and
+# undersampling only selects rows.
+
+SMOTE_K = 5
+SMOTE_BATCH_ROWS = 65_536     # synthetic rows generated per vectorized batch
+EXACT_NN_MAX_ROWS = 20_000    # larger minority classes use the approximate index
+ANN_CLUSTER_ROWS = 2_000      # average bucket size of the approximate index
+
+def _exact_neighbors(Xc, queries: np.ndarray, k: int) -> np.ndarray:
+    from sklearn.neighbors import NearestNeighbors
+    # chunked BLAS distances beat the kd-tree once there are more than a handful of features
+    nn = NearestNeighbors(n_neighbors=k + 1, algorithm="brute").fit(Xc)
+    return nn.kneighbors(Xc[queries], return_distance=False)
+
+def _approx_neighbors(Xc, queries: np.ndarray, k: int, random_state: int) -> np.ndarray:
+    # IVF-style index: k-means buckets, exact search inside the query's bucket.
+    # Neighbours across a bucket edge are missed, which SMOTE tolerates.
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.neighbors import NearestNeighbors
+    n_clusters = max(2, math.ceil(Xc.shape[0] / ANN_CLUSTER_ROWS))
+    labels = MiniBatchKMeans(n_clusters=n_clusters, n_init=1, batch_size=4096,
+                             random_state=random_state).fit_predict(Xc)
+    out = np.empty((len(queries), k + 1), dtype=np.int64)
+    query_labels = labels[queries]
+    small = []
+    for cluster in np.unique(query_labels):
+        members = np.flatnonzero(labels == cluster)
+        rows = np.flatnonzero(query_labels == cluster)
+        if len(members) <= k:
+            small.append(rows)
+            continue
+        nn = NearestNeighbors(n_neighbors=k + 1, algorithm="brute").fit(Xc[members])
+        out[rows] = members[nn.kneighbors(Xc[queries[rows]], return_distance=False)]
+    if small:
+        # buckets too small to hold k neighbours fall back to the whole class
+        rows = np.concatenate(small)
+        out[rows] = _exact_neighbors(Xc, queries[rows], k)
+    return out
+
+def _smote_class(Xc, n_new: int, rng: np.random.Generator, random_state: int):
+    # (synthetic rows, neighbour search used, k)
+    k = max(1, min(Xc.shape[0] - 1, SMOTE_K))
+    base = rng.integers(Xc.shape[0], size=n_new)
+    # neighbours are only needed for rows that actually get sampled
+    queries, inverse = np.unique(base, return_inverse=True)
+    if Xc.shape[0] > EXACT_NN_MAX_ROWS:
+        search = "approximate"
+        neighbors = _approx_neighbors(Xc, queries, k, random_state)
+    else:
+        search = "exact"
+        neighbors = _exact_neighbors(Xc, queries, k)
+
+    from scipy import sparse
+    is_sparse = sparse.issparse(Xc)
+    out = [] if is_sparse else np.empty((n_new, Xc.shape[1]), dtype=np.float64)
+    for start in range(0, n_new, SMOTE_BATCH_ROWS):
+        stop = min(start + SMOTE_BATCH_ROWS, n_new)
+        b = base[start:stop]
+        # column 0 is the row itself
+        nb = neighbors[inverse[start:stop], rng.integers(1, k + 1, size=stop - start)]
+        gap = rng.random((stop - start, 1))
+        if is_sparse:
+            out.append(Xc[b] + sparse.diags(gap.ravel()) @ (Xc[nb] - Xc[b]))
+            continue
+        np.subtract(Xc[nb], Xc[b], out=out[start:stop])
+        out[start:stop] *= gap
+        out[start:stop] += Xc[b]
+    return (sparse.vstack(out, format="csr") if is_sparse else out), search, k
+
+def _new_rows(rows, X: pd.DataFrame, names: list) -> pd.DataFrame:
+    # synthetic rows take the original column dtypes back, like imblearn does;
+    # sparse columns are rebuilt straight from the CSR block
+    from scipy import sparse
+    if not sparse.issparse(rows):
+        return pd.DataFrame(rows, columns=X.columns).astype(X.dtypes.to_dict())
+    n_dense = sum(not isinstance(t, pd.SparseDtype) for t in X.dtypes)
+    frame = pd.DataFrame(rows[:, :n_dense].toarray(), columns=names[:n_dense])
+    block = rows[:, n_dense:].tocsc()
+    sparse_cols = {
+        name: pd.arrays.SparseArray.from_spmatrix(block[:, j]).astype(X[name].dtype)
+        for j, name in enumerate(names[n_dense:])
+    }
+    frame = pd.concat([frame, pd.DataFrame(sparse_cols)], axis=1)
+    return frame[X.columns].astype({c: X[c].dtype for c in names[:n_dense]})
+
+def balance(X: pd.DataFrame, y: pd.Series, method: str, random_state: int = 42):
+    # returns (X, y, report); the inputs are never modified
+    start = time.perf_counter()
+    counts = y.value_counts()
+    if len(counts) < 2:
+        raise ValueError("Balancing needs at least two classes.")
+    rng = np.random.default_rng(random_state)
+    y_values = y.to_numpy()
+    report = {"method": method, "before": {str(c): int(n) for c, n in counts.items()}, "rows_in": int(len(X))}
+
+    if method == "smote":
+        if counts.min() < 2:
+            raise ValueError("Not enough samples in minority class to apply SMOTE.")
+        from app.utils.models import has_sparse_columns, to_model_matrix
+        if has_sparse_columns(X):
+            values, names = to_model_matrix(X)
+            missing = np.isnan(values.data).any()
+        else:
+            values, names = X.to_numpy(dtype=np.float64, na_value=np.nan), list(X.columns)
+            missing = np.isnan(values).any()
+        if missing:
+            raise ValueError("SMOTE needs data without missing values; clean the dataset first.")
+        target = counts.max()
+        blocks, labels, searches = [], [], {}
+        for cls, n in counts.items():
+            if n == target:
+                continue
+            synthetic, search, k = _smote_class(values[y_values == cls], target - n, rng, random_state)
+            blocks.append(synthetic)
+            labels.append(np.full(synthetic.shape[0], cls, dtype=y_values.dtype))
+            searches[str(cls)] = {"neighbors": search, "k": k}
+        if blocks:
+            from scipy import sparse
+            stacked = sparse.vstack(blocks, format="csr") if sparse.issparse(values) else np.vstack(blocks)
+            new_rows = _new_rows(stacked, X, names)
+            X_out = pd.concat([X.reset_index(drop=True), new_rows], ignore_index=True)
+            y_out = pd.Series(np.concatenate([y_values, *labels]), name=y.name).astype(y.dtype)
+        else:
+            X_out, y_out = X.reset_index(drop=True), y.reset_index(drop=True)
+        report.update(synthetic_rows=int(len(X_out) - len(X)), neighbor_search=searches)
+
+    elif method == "undersample":
+        target = counts.min()
+        keep = []
+        for cls, n in counts.items():
+            rows = np.flatnonzero(y_values == cls)
+            keep.append(rows if n == target else rng.choice(rows, target, replace=False))
+        # original row order is kept
+        keep = np.sort(np.concatenate(keep))
+        X_out = X.iloc[keep].reset_index(drop=True)
+        # row selection upcasts Sparse[uint8] indicators to Sparse[int64]
+        X_out = X_out.astype({c: t for c, t in X.dtypes.items() if isinstance(t, pd.SparseDtype)})
+        y_out = y.iloc[keep].reset_index(drop=True)
+        report["removed_rows"] = int(len(X) - len(X_out))
+
+    else:
+        raise ValueError(f"Unknown balancing method: {method}")
+
+    report.update(
+        after={str(c): int(n) for c, n in y_out.value_counts().items()},
+        rows_out=int(len(X_out)),
+        output_bytes=int(X_out.memory_usage(index=False).sum() + y_out.memory_usage(index=False)),
+        ms=round((time.perf_counter() - start) * 1000, 2),
+    )
+    print(f"Balanced with {method}: {report['before']} -> {report['after']} in {report['ms']} ms")
+    return X_out, y_out, report
@@ -0,0 +1,148 @@
+import time
+import numpy as np
+import pandas as pd
+from app.utils.out_of_core import booster_params
+from app.utils.progress import lightgbm_callback, xgboost_callback
+
+# xgboost/lightgbm are trained through their native APIs so the binned
+# training set (QuantileDMatrix / constructed Dataset) can be built once per
+# data version and split and reused by every run after it
+NATIVE_MODELS = {"xgboost", "lightgbm"}
+
+# params that change how the training set is binned; a new value needs a new dataset
+DATASET_PARAMS = {
+    "xgboost": ("max_bin", "tree_method"),
+    "lightgbm": ("max_bin", "min_data_in_bin", "bin_construct_sample_cnt", "use_missing",
+                 "zero_as_missing", "seed", "random_state", "data_random_seed"),
+}
+# binned datasets kept per session (most recently used); each one is about the
+# size of the training matrix
+MAX_CACHED_DATASETS = 2
+
+def to_float32(X):
+    # contiguous float32 features; CSR input stays sparse
+    from scipy import sparse
+    if sparse.issparse(X):
+        return X.astype(np.float32).tocsr()
+    if isinstance(X, pd.DataFrame):
+        return np.ascontiguousarray(X.to_numpy(dtype=np.float32))
+    return np.ascontiguousarray(X, dtype=np.float32)
+
+def can_fit_native(model_key, X) -> bool:
+    if not isinstance(X, pd.DataFrame):
+        return model_key in NATIVE_MODELS
+    return model_key in NATIVE_MODELS and all(
+        pd.api.types.is_numeric_dtype(t) or pd.api.types.is_bool_dtype(t) for t in X.dtypes
+    )
+
+class NativeBoosterModel:
+    # sklearn-style face over a native booster; covers what evaluation, SHAP,
+    # warm starts and the run records use
+    def __init__(self, model_key, booster, classes, params, feature_names):
+        self.model_key = model_key
+        self.native_booster = booster
+        self.classes_ = classes
+        self.params = params
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.n_features_in_ = len(feature_names)
+
+    @property
+    def booster_(self):
+        return self.native_booster
+
+    def get_booster(self):
+        return self.native_booster
+
+    def get_params(self, deep=True):
+        return dict(self.params)
+
+    def set_params(self, **params):
+        self.params.update(params)
+        return self
+
+    def predict_proba(self, X):
+        X = to_float32(X)
+        if self.model_key == "xgboost":
+            scores = self.native_booster.inplace_predict(X)
+        else:
+            scores = self.native_booster.predict(X)
+        scores = np.asarray(scores)
+        return np.c_[1 - scores, scores] if scores.ndim == 1 else scores
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+def _native_params(model_key, params, n_classes):
+    # sklearn-style names -> native ones, then the shared booster setup
+    params = dict(params)
+    params.pop("use_label_encoder", None)
+    if model_key == "xgboost":
+        if "random_state" in params:
+            params["seed"] = params.pop("random_state")
+        if "n_jobs" in params:
+            params["nthread"] = params.pop("n_jobs")
+    return booster_params(model_key, params, n_classes)
+
+def _build_dataset(model_key, X_train, y_train, dataset_params, names):
+    X = to_float32(X_train)
+    classes, y = np.unique(np.asarray(y_train), return_inverse=True)
+    if model_key == "xgboost":
+        import xgboost as xgb
+        if dataset_params.get("tree_method", "hist") == "hist":
+            data = xgb.QuantileDMatrix(X, label=y, feature_names=names, max_bin=dataset_params.get("max_bin", 256))
+        else:
+            data = xgb.DMatrix(X, label=y, feature_names=names)
+        # the DMatrix holds everything training needs
+        return {"data": data, "classes": classes, "names": names}
+    import lightgbm as lgb
+    data = lgb.Dataset(
+        X, label=y, feature_name=names,
+        params={**dataset_params, "feature_pre_filter": False, "verbose": -1},
+    ).construct()
+    # warm starts build a fresh Dataset on these bins, so lightgbm keeps the matrix
+    return {"data": data, "X": X, "y": y, "classes": classes, "names": names}
+
+def get_dataset(model_key, X_train, y_train, params, cache: dict, feature_names=None):
+    # cache lives on the session and is reset when the data version or split changes
+    dataset_params = {k: params[k] for k in DATASET_PARAMS[model_key] if k in params}
+    key = (model_key, tuple(sorted(dataset_params.items())))
+    entry = cache.pop(key, None)
+    if entry is not None:
+        cache[key] = entry   # most recently used last
+        return entry, {"cached": True, "build_ms": 0.0}
+    start = time.perf_counter()
+    names = feature_names or [str(c) for c in X_train.columns]
+    entry = _build_dataset(model_key, X_train, y_train, dataset_params, names)
+    cache[key] = entry
+    while len(cache) > MAX_CACHED_DATASETS:
+        cache.pop(next(iter(cache)))
+    return entry, {"cached": False, "build_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+def fit_native(model_key, params, X_train, y_train, cache: dict, init_model=None, progress=None,
+               feature_names=None):
+    # returns (NativeBoosterModel, dataset info); init_model continues boosting from an earlier run
+    if progress:
+        progress.begin("dataset")
+    entry, info = get_dataset(model_key, X_train, y_train, params, cache, feature_names)
+    native, rounds = _native_params(model_key, params, len(entry["classes"]))
+    extra = rounds - int(init_model.get_params()["n_estimators"]) if init_model is not None else rounds
+    if progress:
+        progress.begin("fit", total=extra, unit="iteration")
+    if model_key == "xgboost":
+        import xgboost as xgb
+        booster = xgb.train(native, entry["data"], num_boost_round=extra,
+                            xgb_model=init_model.get_booster() if init_model is not None else None,
+                            callbacks=[xgboost_callback(progress)] if progress else None)
+    else:
+        import lightgbm as lgb
+        data = entry["data"]
+        if init_model is not None:
+            # continued training sets init scores on its Dataset, so give it a
+            # fresh one that shares the cached bin boundaries
+            data = lgb.Dataset(entry["X"], label=entry["y"], feature_name=entry["names"], reference=data,
+                               params={**data.params})
+        booster = lgb.train(native, data, num_boost_round=extra,
+                            init_model=init_model.booster_ if init_model is not None else None,
+                            callbacks=[lightgbm_callback(progress)] if progress else None)
+    model = NativeBoosterModel(model_key, booster, entry["classes"], {**params, "n_estimators": rounds}, entry["names"])
+    return model, info
@@ -0,0 +1,190 @@
+import numpy as np
+
+# Curve points kept per run; enough for a smooth plot at any size we render
+MAX_CURVE_POINTS = 512
+MAX_SWEEP_POINTS = 200
+CALIBRATION_BINS = 10
+
+def _thin(*arrays, max_points=MAX_CURVE_POINTS):
+    n = len(arrays[0])
+    if n <= max_points:
+        return arrays
+    keep = np.unique(np.linspace(0, n - 1, max_points).astype(np.int64))
+    return tuple(a[keep] for a in arrays)
+
+def _round_list(a, digits=4):
+    return np.round(np.asarray(a, dtype=np.float64), digits).tolist()
+
+def _round_or_none(v, digits=4):
+    return None if v is None else round(float(v), digits)
+
+def _safe_div(num, den):
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    return np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+
+def _cumulative_counts(pos: np.ndarray, score: np.ndarray):
+    # One sort: true/false positive counts at every distinct score threshold,
+    # highest threshold first. Every curve and sweep is derived from these.
+    order = np.argsort(-score, kind="stable")
+    score = score[order]
+    pos = pos[order]
+    last = np.r_[np.flatnonzero(np.diff(score)), len(score) - 1]
+    tps = np.cumsum(pos, dtype=np.int64)[last]
+    fps = last + 1 - tps
+    return score[last], tps, fps
+
+def _curves(tps, fps):
+    n_pos, n_neg = tps[-1], fps[-1]
+    tpr = np.r_[0.0, _safe_div(tps, n_pos)]
+    fpr = np.r_[0.0, _safe_div(fps, n_neg)]
+    precision = np.r_[1.0, _safe_div(tps, tps + fps)]
+    recall = tpr
+    roc_auc = float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1])) / 2) if n_pos and n_neg else None
+    # average precision: precision weighted by each recall step
+    pr_auc = float(np.sum(np.diff(recall) * precision[1:])) if n_pos else None
+    return fpr, tpr, precision, recall, roc_auc, pr_auc
+
+def _calibration(pos, score):
+    bins = np.minimum((score * CALIBRATION_BINS).astype(np.int64), CALIBRATION_BINS - 1)
+    count = np.bincount(bins, minlength=CALIBRATION_BINS)
+    score_sum = np.bincount(bins, weights=score, minlength=CALIBRATION_BINS)
+    pos_sum = np.bincount(bins, weights=pos, minlength=CALIBRATION_BINS)
+    nonzero = count > 0
+    return {
+        "bin_edges": _round_list(np.linspace(0, 1, CALIBRATION_BINS + 1), 2),
+        "count": count.tolist(),
+        # empty bins are None so the record stays valid JSON
+        "mean_predicted": [v if c else None for v, c in zip(_round_list(score_sum / np.maximum(count, 1)), nonzero)],
+        "fraction_positive": [v if c else None for v, c in zip(_round_list(pos_sum / np.maximum(count, 1)), nonzero)],
+    }
+
+def _sweep(thresholds, tps, fps):
+    n_pos, n_neg = tps[-1], fps[-1]
+    precision = _safe_div(tps, tps + fps)
+    recall = _safe_div(tps, n_pos)
+    f1 = _safe_div(2 * precision * recall, precision + recall)
+    accuracy = (tps + (n_neg - fps)) / max(n_pos + n_neg, 1)
+    best = int(np.argmax(f1))
+    sweep = {
+        "best_f1_threshold": round(float(thresholds[best]), 4),
+        "best_f1": round(float(f1[best]), 4),
+    }
+    thresholds, precision, recall, f1, accuracy = _thin(
+        thresholds, precision, recall, f1, accuracy, max_points=MAX_SWEEP_POINTS
+    )
+    sweep.update({
+        "threshold": _round_list(thresholds),
+        "precision": _round_list(precision),
+        "recall": _round_list(recall),
+        "f1": _round_list(f1),
+        "accuracy": _round_list(accuracy),
+    })
+    return sweep
+
+# Every classification metric for one run, from a single confusion matrix and
+# one sorted pass over the scores per class. y_score is the predict_proba /
+# decision_function output with columns ordered like `classes` (the estimator's
+# classes_). Returns (scores, confusion matrix, evaluation record).
+def evaluate_classifier(y_test, preds, y_score=None, classes=None):
+    y_test = np.asarray(y_test)
+    preds = np.asarray(preds)
+    known = [y_test, preds] + ([np.asarray(classes)] if classes is not None else [])
+    labels = np.unique(np.concatenate(known))
+    k = len(labels)
+    t = np.searchsorted(labels, y_test)
+    p = np.searchsorted(labels, preds)
+    n = len(t)
+
+    cm = np.bincount(t * k + p, minlength=k * k).reshape(k, k)
+    tp = np.diag(cm)
+    support = cm.sum(axis=1)
+    predicted = cm.sum(axis=0)
+    precision = _safe_div(tp, predicted)
+    recall = _safe_div(tp, support)
+    f1 = _safe_div(2 * precision * recall, precision + recall)
+    accuracy = tp.sum() / n if n else 0.0
+
+    binary = k == 2
+    if binary:
+        # positive class is the second sorted label, matching predict_proba[:, 1]
+        scores = {"accuracy": accuracy, "precision": precision[1], "recall": recall[1], "f1": f1[1]}
+    else:
+        present = support > 0
+        scores = {
+            "accuracy": accuracy,
+            "precision": precision[present].mean(),
+            "recall": recall[present].mean(),
+            "f1": f1[present].mean(),
+            # single-label micro averages all equal accuracy
+            "precision_micro": accuracy,
+            "recall_micro": accuracy,
+            "f1_micro": accuracy,
+        }
+
+    evaluation = {
+        "labels": labels.tolist(),
+        "y_true": t.astype(np.int8 if k <= 127 else np.int32),
+        "y_score": None,
+        "roc": None,
+        "pr": None,
+        "calibration": None,
+        "threshold_sweep": None,
+    }
+    scores["roc_auc"] = None
+    scores["pr_auc"] = None
+
+    score = None if y_score is None else np.asarray(y_score, dtype=np.float32)
+    if score is not None and not np.isnan(score).any():
+        if binary:
+            if score.ndim == 2:
+                score = score[:, -1]
+            pos = t == 1
+            thresholds, tps, fps = _cumulative_counts(pos, score)
+            fpr, tpr, prec, rec, roc_auc, pr_auc = _curves(tps, fps)
+            sweep = _sweep(thresholds, tps, fps)
+            curve_auc = roc_auc
+            if score.min() >= 0 and score.max() <= 1:
+                evaluation["calibration"] = _calibration(pos, score)
+            average = "binary"
+        elif score.ndim == 2 and classes is not None and score.shape[1] == len(classes):
+            # one-vs-rest per class for the macro AUC, plus one flattened
+            # curve for the micro average
+            cols = np.searchsorted(labels, np.asarray(classes))
+            onehot = np.zeros((n, k), dtype=bool)
+            onehot[np.arange(n), t] = True
+            onehot = onehot[:, cols]
+            per_class = [_curves(*_cumulative_counts(onehot[:, j], score[:, j])[1:]) for j in range(score.shape[1])]
+            roc_aucs = [c[4] for c in per_class if c[4] is not None]
+            pr_aucs = [c[5] for c in per_class if c[5] is not None]
+            thresholds, tps, fps = _cumulative_counts(onehot.ravel(), score.ravel())
+            fpr, tpr, prec, rec, roc_auc, pr_auc = _curves(tps, fps)
+            sweep = _sweep(thresholds, tps, fps)
+            curve_auc = roc_auc
+            scores["roc_auc_micro"] = roc_auc
+            scores["pr_auc_micro"] = pr_auc
+            roc_auc = float(np.mean(roc_aucs)) if roc_aucs else None
+            pr_auc = float(np.mean(pr_aucs)) if pr_aucs else None
+            average = "micro"
+        else:
+            score = None
+
+        if score is not None:
+            evaluation["y_score"] = score
+            scores["roc_auc"] = roc_auc
+            scores["pr_auc"] = pr_auc
+            curve_pr_auc = scores.get("pr_auc_micro", pr_auc)
+            fpr, tpr = _thin(fpr, tpr)
+            prec, rec = _thin(prec, rec)
+            evaluation["roc"] = {"fpr": _round_list(fpr), "tpr": _round_list(tpr), "auc": _round_or_none(curve_auc), "average": average}
+            evaluation["pr"] = {"precision": _round_list(prec), "recall": _round_list(rec), "auc": _round_or_none(curve_pr_auc), "average": average}
+            evaluation["threshold_sweep"] = sweep
+
+    scores = {m: _round_or_none(v) for m, v in scores.items()}
+    return scores, cm, evaluation
+
+def split_evaluation(evaluation: dict):
+    # (JSON-safe summary for meta, raw arrays kept alongside the fitted model)
+    arrays = {"y_true": evaluation["y_true"], "y_score": evaluation["y_score"]}
+    summary = {k: v for k, v in evaluation.items() if k not in arrays}
+    return summary, arrays
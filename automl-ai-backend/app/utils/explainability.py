@@ -1,8 +1,96 @@
-import shap
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 
-def get_shap_values(model, X_sample: pd.DataFrame, model_type: str = "tree"):
-    explainer = shap.Explainer(model, X_sample) if model_type != "tree" else shap.TreeExplainer(model)
-    shap_values = explainer(X_sample)
-    shap_summary = pd.DataFrame(shap_values.values, columns=X_sample.columns).abs().mean().sort_values(ascending=False)
-    return shap_summary.to_dict()
+TREE_MODELS = {"random_forest", "decision_tree", "xgboost", "lightgbm"}
+
+# Row caps keep one explanation to a few seconds
+BACKGROUND_ROWS = 1000      # training rows kept per run for the k-means summary
+EXPLAIN_ROWS = 500          # test rows explained with TreeExplainer
+KERNEL_EXPLAIN_ROWS = 100   # KernelExplainer is much slower per row
+KERNEL_BACKGROUND_K = 20    # k-means centroids standing in for the training data
+
+# SHAP jobs run off the request path; two workers so one slow KernelExplainer
+# does not queue every other explanation behind it
+_explain_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="shap")
+
+def sample_rows(X: pd.DataFrame, n: int, random_state: int = 42) -> pd.DataFrame:
+    return X if len(X) <= n else X.sample(n, random_state=random_state)
+
+def _positive_class(values):
+    # binary classifiers return either one array per class or (rows, features, classes)
+    if isinstance(values, list):
+        return values[-1]
+    values = np.asarray(values)
+    return values[:, :, -1] if values.ndim == 3 else values
+
+def get_shap_values(model, model_key: str, X_background: pd.DataFrame, X_explain: pd.DataFrame):
+    import shap
+    start = time.perf_counter()
+    # sparse one-hot samples are densified here, after capping the rows
+    if any(isinstance(t, pd.SparseDtype) for t in X_explain.dtypes):
+        X_explain = X_explain.iloc[:EXPLAIN_ROWS].sparse.to_dense()
+        X_background = X_background.sparse.to_dense()
+    if model_key in TREE_MODELS:
+        X = X_explain.iloc[:EXPLAIN_ROWS]
+        explainer_type = "tree"
+        # natively trained boosters are explained through the booster itself
+        values = shap.TreeExplainer(getattr(model, "native_booster", model)).shap_values(X)
+    else:
+        X = X_explain.iloc[:KERNEL_EXPLAIN_ROWS]
+        explainer_type = "kernel"
+        background = shap.kmeans(X_background, min(KERNEL_BACKGROUND_K, len(X_background)))
+        predict = model.predict_proba if hasattr(model, "predict_proba") else model.predict
+        explainer = shap.KernelExplainer(predict, background)
+        values = explainer.shap_values(X, nsamples=2 * X.shape[1] + 200, silent=True)
+
+    values = _positive_class(values).astype(np.float32)
+    importance = pd.Series(np.abs(values).mean(axis=0), index=X.columns).sort_values(ascending=False)
+    return {
+        "explainer": explainer_type,
+        "shap_values": values,
+        "X": X,
+        "importance": importance.round(6).to_dict(),
+        "rows": int(len(X)),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+def submit_explanation(cache: dict, run_id: int, run: dict, on_done=None) -> dict:
+    # cache maps run_id -> job entry; a run is only ever explained once
+    entry = cache.get(run_id)
+    if entry and entry["status"] in ("pending", "done"):
+        return entry
+    entry = {"status": "pending", "run_id": run_id, "model_key": run["model_key"]}
+    cache[run_id] = entry
+
+    # import shap (and the IPython it pulls in) before queueing the job: matplotlib
+    # crashes if it creates a figure while another thread is mid-way through that
+    # import. Slow on first use, so never call this from the event loop.
+    import shap
+
+    def _job():
+        try:
+            result = get_shap_values(run["model"], run["model_key"], run["X_background"], run["X_explain"])
+            entry.update(result)
+            entry["status"] = "done"
+            print(f"SHAP ({result['explainer']}) for run {run_id} done in {result['elapsed_ms']} ms")
+            if on_done:
+                on_done(entry)
+        except Exception as e:
+            print(f"SHAP job for run {run_id} failed: {e}")
+            entry["error"] = str(e)
+            entry["status"] = "error"
+
+    _explain_pool.submit(_job)
+    return entry
+
+def find_run_id(train_steps: list, model: str = None, run_id: int = None):
+    # latest run matching a model key or estimator class name
+    for step in reversed(train_steps):
+        if run_id is not None:
+            if step.get("run_id") == run_id:
+                return run_id
+        elif model is None or model in (step.get("model_key"), step.get("model")):
+            return step.get("run_id")
+    return None
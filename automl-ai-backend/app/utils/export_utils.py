@@ -1,19 +1,123 @@
 from datetime import datetime
+import hashlib, io, json, time
 import pandas as pd
-import nbformat
-from nbformat.v4 import new_notebook, new_markdown_cell, new_code_cell
-from reportlab.lib.pagesizes import inch
-from .pdf_report import PDFReport
 
+# Exports are built in memory and returned as bytes; nothing is written to
+# the working directory.
 
-def generate_pdf(session_id: str, session_data: dict) -> str:
+def export_version(session_data: dict) -> str:
+    # changes whenever the data or anything the exports print does
+    meta = session_data.get("meta", {})
+    state = [session_data.get("version"), meta.get("filename"), meta.get("target_column"), meta.get("steps", {})]
+    return hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# Rich PDF mode: charts from graph_utils rendered in a process pool.
+# Chart count, heatmap width and shipped rows are capped and the whole
+# render waits at most RICH_CHART_TIMEOUT, so wide or huge frames stay bounded.
+RICH_HISTOGRAMS = 4             # most skewed numeric columns
+RICH_HEATMAP_COLUMNS = 12       # target + columns of the strongest correlations
+RICH_HEATMAP_ROWS = 50_000      # row sample shipped for the heatmap
+RICH_ROC_RUNS = 4               # latest runs with a ROC curve
+RICH_CHART_TIMEOUT = 30.0       # seconds; charts not done by then are left out
+CHART_OUTPUT = {"format": "png", "dpi": 110}
+
+
+def _chart_jobs(session_data: dict, ctx: dict, df: pd.DataFrame, train_steps: list) -> dict:
+    # name -> (cache key, kind, data); data versions key the frame-based charts
+    version = session_data.get("version")
+    target = ctx["target"]
+    jobs = {}
+    skewed = [c for c in ctx["numeric_stats"] if c != target][:RICH_HISTOGRAMS]
+    for col in skewed:
+        jobs[f"hist:{col}"] = (("histogram", version, col), "histogram", df[[col]])
+    heat = [target] if target in ctx["numeric_cols"] else []
+    for a, b, _ in ctx["top_correlations"]:
+        heat += [c for c in (a, b) if c not in heat]
+    heat = heat[:RICH_HEATMAP_COLUMNS]
+    if len(heat) > 1:
+        sample = df[heat] if len(df) <= RICH_HEATMAP_ROWS else df[heat].sample(RICH_HEATMAP_ROWS, random_state=0)
+        jobs["heatmap"] = (("heatmap", version, tuple(heat)), "heatmap", sample)
+    with_roc = [tr for tr in train_steps if ((tr.get("evaluation") or {}).get("roc"))]
+    for tr in with_roc[-RICH_ROC_RUNS:]:
+        roc = tr["evaluation"]["roc"]
+        jobs[f"roc:{tr.get('run_id')}"] = (("roc", tr.get("run_id"), roc["auc"]), "roc", roc)
+    aucs = {f"#{tr.get('run_id')} {tr.get('model')}": {"roc_auc": tr["metrics"]["roc_auc"]}
+            for tr in train_steps if (tr.get("metrics") or {}).get("roc_auc") is not None}
+    if aucs:
+        jobs["compare"] = (("compare", json.dumps(aucs, sort_keys=True)), "compare", aucs)
+    return jobs
+
+
+def render_charts(session_data: dict, jobs: dict, executor=None) -> tuple:
+    # (name -> png bytes, stats). Images are cached on the session per data
+    # version; missing ones render in parallel on `executor`, or inline.
+    # stats["failed"] maps each chart that did not render to the reason.
+    from concurrent.futures import wait
+    from .graph_utils import render_report_chart
+    start = time.perf_counter()
+    cache = session_data.setdefault("report_charts", {})
+    if cache.get("version") != session_data.get("version"):
+        cache.clear()
+        cache["version"] = session_data.get("version")
+    images = {name: cache[key] for name, (key, _, _) in jobs.items() if key in cache}
+    todo = {name: job for name, job in jobs.items() if name not in images}
+    failed = {}
+    if executor is not None and todo:
+        futures = {executor.submit(render_report_chart, kind, data, CHART_OUTPUT): name
+                   for name, (_, kind, data) in todo.items()}
+        done, not_done = wait(futures, timeout=RICH_CHART_TIMEOUT)
+        for future in not_done:
+            future.cancel()
+            failed[futures[future]] = "timed out"
+        for future in done:
+            name = futures[future]
+            try:
+                images[name] = cache[todo[name][0]] = future.result()
+            except Exception as e:
+                failed[name] = str(e)
+    else:
+        for name, (key, kind, data) in todo.items():
+            try:
+                images[name] = cache[key] = render_report_chart(kind, data, CHART_OUTPUT)
+            except Exception as e:
+                failed[name] = str(e)
+    stats = {
+        "charts": len(images),
+        "cached": len(jobs) - len(todo),
+        "failed": dict(sorted(failed.items())),
+        "ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+    return images, stats
+
+
+# stats: optional dict filled with the build time and, for rich reports, the
+# render_charts stats, so the caller can pass them on
+def generate_pdf(session_id: str, session_data: dict, rich: bool = False, executor=None,
+                 stats: dict = None) -> bytes:
+    from reportlab.lib.pagesizes import inch
+    from .groq_assistant import get_dataset_context
+    from .pdf_report import PDFReport
     try:
-        df = pd.DataFrame(session_data.get("data", []))
+        start = time.perf_counter()
+        df = session_data["data"]
         meta = session_data.get("meta", {})
         steps = meta.get("steps", {})
+        train_steps = steps.get("train", [])
+
+        # the same per-version statistics the assistant prompt uses
+        target = meta.get("target_column")
+        if not target or target not in df.columns:
+            target = df.columns[-1] if len(df.columns) else None
+        ctx, _ = get_dataset_context(session_data.setdefault("prompt_context", {}),
+                                     session_data.get("version"), df, target)
 
-        out_path = f"{session_id}_report.pdf"
-        report = PDFReport(out_path)
+        images, chart_stats = {}, None
+        if rich:
+            images, chart_stats = render_charts(session_data, _chart_jobs(session_data, ctx, df, train_steps), executor)
+
+        buffer = io.BytesIO()
+        report = PDFReport(buffer)
 
         # Session Info
         info = (
@@ -25,24 +129,24 @@ def generate_pdf(session_id: str, session_data: dict) -> str:
         )
         report.add_section("Session Information", info)
 
-        # EDA: Correlation & Skewness
-        num = df.select_dtypes(include=["number"])
-        corr = num.corr().round(2)
-        skew = num.skew().round(2)
-
-        # Correlation table (first 3 cols)
-        corr_cols = corr.columns[:3]
-        corr_data = [[""] + list(corr_cols)]
-        for c in corr_cols:
-            corr_data.append([c] + [f"{corr.loc[c, c2]:.2f}" for c2 in corr_cols])
-        report.add_section("Correlation (first 3 numeric columns)")
-        report.add_table(corr_data)
-
-        # Skewness table (first 5)
-        skew_items = list(skew.iloc[:5].items())
-        skew_data = [["Column", "Skewness"]] + [[c, f"{v:.2f}"] for c, v in skew_items]
-        report.add_section("Skewness (first 5 numeric columns)")
-        report.add_table(skew_data, col_widths=[2.5 * inch, 2.5 * inch])
+        # EDA: strongest correlations & most skewed columns
+        pairs = ctx["top_correlations"][:8]
+        if pairs:
+            report.add_section("Strongest correlations")
+            report.add_table([["Column", "Column", "Correlation"]] + [[a, b, f"{r:.2f}"] for a, b, r in pairs])
+        skew_items = [(c, st["skew"]) for c, st in ctx["numeric_stats"].items() if st["skew"] is not None][:5]
+        if skew_items:
+            report.add_section("Most skewed columns")
+            report.add_table([["Column", "Skewness"]] + [[c, f"{v:.2f}"] for c, v in skew_items],
+                             col_widths=[2.5 * inch, 2.5 * inch])
+        if "heatmap" in images:
+            report.add_section("Correlation heatmap")
+            report.add_image(images["heatmap"])
+        hists = [name for name in images if name.startswith("hist:")]
+        if hists:
+            report.add_section("Distributions (most skewed columns)")
+            for name in hists:
+                report.add_image(images[name], width=4.5 * inch)
 
         # Transformation steps
         transform_steps = steps.get("transform", [])
@@ -68,7 +172,6 @@ def generate_pdf(session_id: str, session_data: dict) -> str:
                 report.add_section(f"Step {i}", "\n".join(sub))
 
         # Model Training runs
-        train_steps = steps.get("train", [])
         if train_steps:
             report.add_section("Model Training & Evaluation")
             for i, tr in enumerate(train_steps, start=1):
@@ -79,11 +182,9 @@ def generate_pdf(session_id: str, session_data: dict) -> str:
                 # Confusion matrix
                 cm = tr.get("confusion_matrix")
                 if cm:
-                    cm_table = [
-                        ["", "Pred 0", "Pred 1"],
-                        ["Actual 0", cm[0][0], cm[0][1]],
-                        ["Actual 1", cm[1][0], cm[1][1]],
-                    ]
+                    labels = (tr.get("evaluation") or {}).get("labels") or list(range(len(cm)))
+                    cm_table = [[""] + [f"Pred {l}" for l in labels]]
+                    cm_table += [[f"Actual {l}"] + list(row) for l, row in zip(labels, cm)]
                     report.add_table(cm_table)
 
                 # Metrics
@@ -91,16 +192,41 @@ def generate_pdf(session_id: str, session_data: dict) -> str:
                 metrics_data = [["Metric", "Value"]] + [[k, v] for k, v in metrics.items()]
                 report.add_table(metrics_data, col_widths=[2.5 * inch, 2.5 * inch])
 
-        # build and return path
+                # Calibration bins
+                evaluation = tr.get("evaluation") or {}
+                calibration = evaluation.get("calibration")
+                if calibration:
+                    edges = calibration["bin_edges"]
+                    cal_data = [["Score bin", "Count", "Mean predicted", "Fraction positive"]]
+                    for b, n in enumerate(calibration["count"]):
+                        if n:
+                            cal_data.append([
+                                f"{edges[b]:.1f}-{edges[b + 1]:.1f}", n,
+                                f"{calibration['mean_predicted'][b]:.3f}",
+                                f"{calibration['fraction_positive'][b]:.3f}",
+                            ])
+                    report.add_table(cal_data)
+
+                if f"roc:{tr.get('run_id')}" in images:
+                    report.add_image(images[f"roc:{tr.get('run_id')}"], width=4 * inch)
+
+            if "compare" in images:
+                report.add_section("Model comparison")
+                report.add_image(images["compare"])
+
         report.build()
-        return out_path
+        if stats is not None:
+            stats.update(rich=rich, charts=chart_stats, ms=round((time.perf_counter() - start) * 1000, 2))
+        return buffer.getvalue()
     
     except Exception as e:
         print(f"Error generating PDF: {e}")
         raise e
 
 
-def generate_ipynb(session_id: str, session_data: dict) -> str:
+def generate_ipynb(session_id: str, session_data: dict) -> bytes:
+    import nbformat
+    from nbformat.v4 import new_notebook, new_markdown_cell, new_code_cell
     try:
     
         data = session_data.get("data", [])
@@ -306,9 +432,7 @@ def generate_ipynb(session_id: str, session_data: dict) -> str:
 
         # Wrap up
         nb["cells"] = cells
-        notebook_path = f"{session_id}_pipeline.ipynb"
-        nbformat.write(nb, notebook_path)
-        return notebook_path
+        return nbformat.writes(nb).encode("utf-8")
     except Exception as e:
         print(f"Error generating IPYNB: {e}")
         raise e
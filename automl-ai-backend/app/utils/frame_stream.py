@@ -0,0 +1,71 @@
+import io, json
+import pandas as pd
+
+# Chunked serialization of a session frame for /pipeline/data. Rows are
+# sliced, encoded and yielded CHUNK_ROWS at a time, so memory stays bounded
+# by one chunk whatever the page size.
+
+CHUNK_ROWS = 10_000
+FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+def _dense(chunk: pd.DataFrame) -> pd.DataFrame:
+    # onehot output stays sparse in the session; the encoders want dense columns
+    sparse = {c: t.subtype for c, t in chunk.dtypes.items() if isinstance(t, pd.SparseDtype)}
+    return chunk.astype(sparse) if sparse else chunk
+
+def _chunks(df: pd.DataFrame, start: int, stop: int):
+    for a in range(start, stop, CHUNK_ROWS):
+        yield _dense(df.iloc[a:min(a + CHUNK_ROWS, stop)])
+
+def iter_frame(df: pd.DataFrame, fmt: str, start: int, stop: int, envelope: dict = None):
+    # yields encoded pieces of rows [start, stop). "json" wraps the records in
+    # `envelope` as {..., "session_data": {"meta": ..., "data": [...]}}
+    if fmt == "json":
+        envelope = dict(envelope or {})
+        meta = envelope.pop("meta", None)
+        head = json.dumps(envelope)[:-1] + (", " if envelope else "")
+        yield f'{head}"session_data": {{"meta": {json.dumps(meta)}, "data": ['.encode()
+        first = True
+        for chunk in _chunks(df, start, stop):
+            body = chunk.to_json(orient="records", date_format="iso")[1:-1]
+            if body:
+                yield (body if first else "," + body).encode()
+                first = False
+        yield b"]}}"
+    elif fmt == "ndjson":
+        for chunk in _chunks(df, start, stop):
+            if len(chunk):
+                yield chunk.to_json(orient="records", lines=True, date_format="iso").rstrip("\n").encode() + b"\n"
+    elif fmt == "csv":
+        header = True
+        for chunk in _chunks(df, start, stop):
+            yield chunk.to_csv(index=False, header=header).encode()
+            header = False
+        if header:
+            # empty page: still send the column names
+            yield df.head(0).to_csv(index=False).encode()
+    elif fmt == "arrow":
+        import pyarrow as pa
+        schema = None
+        sink = io.BytesIO()
+        writer = None
+        for chunk in _chunks(df, start, stop):
+            batch = pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+            if writer is None:
+                schema = batch.schema
+                writer = pa.ipc.new_stream(sink, schema)
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, pa.Schema.from_pandas(_dense(df.head(0)), preserve_index=False))
+        writer.close()
+        yield sink.getvalue()
+    else:
+        raise ValueError(f"Unknown format '{fmt}'")
@@ -1,15 +1,17 @@
-import io, random
+import io, random, time
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from scipy import stats
-import seaborn as sns
 
-# Optional: for SHAP summary plots
-try:
-    import shap
-except ImportError:
-    shap = None
+# Above these row counts scatter/line plots switch to reduced rendering
+SCATTER_DENSITY_THRESHOLD = 100_000
+LINE_DOWNSAMPLE_THRESHOLD = 5_000
+LINE_DOWNSAMPLE_POINTS = 2_000
+
+def numeric_frame(df: pd.DataFrame) -> pd.DataFrame:
+    # numeric columns without the sparse one-hot indicators, as /eda does
+    return df[[c for c, t in df.select_dtypes(include=np.number).dtypes.items()
+               if not isinstance(t, pd.SparseDtype)]]
 
 # Get a random style and colormap
 def _apply_random_style():
@@ -18,14 +20,42 @@ def _apply_random_style():
     colormaps = [m for m in plt.colormaps() if not m.endswith("_r")]
     return random.choice(colormaps)
 
-def _save_fig_to_buf(fig):
+MEDIA_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+    "svg": "image/svg+xml",
+}
+
+def _save_fig_to_buf(fig, out: dict = None):
+    # out: {"format", "dpi", "width", "height"}; width/height are in pixels
+    out = out or {}
+    fmt = out.get("format") or "png"
+    dpi = out.get("dpi")
+    width, height = out.get("width"), out.get("height")
+    save_kwargs = {"format": fmt}
+    if dpi:
+        save_kwargs["dpi"] = dpi
+    if fmt in ("webp", "jpeg"):
+        save_kwargs["pil_kwargs"] = {"quality": 80}
+
+    if width or height:
+        # an explicit pixel size needs an exact canvas, so lay out once instead
+        # of the extra measuring pass bbox_inches="tight" does
+        d = dpi or fig.dpi
+        w_in, h_in = fig.get_size_inches()
+        fig.set_size_inches((width or w_in * d) / d, (height or h_in * d) / d)
+        fig.tight_layout()
+    else:
+        save_kwargs["bbox_inches"] = "tight"
+
     buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches="tight")
+    fig.savefig(buf, **save_kwargs)
     buf.seek(0)
     plt.close(fig)
     return buf
 
-def plot_histogram(df: pd.DataFrame, column: str = None, bins: int = 30):
+def plot_histogram(df: pd.DataFrame, column: str = None, bins: int = 30, out: dict = None):
     cmap = _apply_random_style()
     fig, ax = plt.subplots(figsize=(6, 4))
 
@@ -43,12 +73,12 @@ def plot_histogram(df: pd.DataFrame, column: str = None, bins: int = 30):
         ax.set_ylabel("Frequency")
         ax.legend()
     else:
-        df.select_dtypes(include=np.number).hist(bins=bins, figsize=(8, 6), layout=(2, 3), color='skyblue', edgecolor="black")
+        numeric_frame(df).hist(bins=bins, figsize=(8, 6), layout=(2, 3), color='skyblue', edgecolor="black")
         plt.suptitle("Histograms")
 
-    return _save_fig_to_buf(fig)
+    return _save_fig_to_buf(fig, out)
 
-def plot_bar(df: pd.DataFrame, column: str):
+def plot_bar(df: pd.DataFrame, column: str, out: dict = None):
     cmap = _apply_random_style()
     counts = df[column].value_counts()
     fig, ax = plt.subplots(figsize=(6, 4))
@@ -56,9 +86,9 @@ def plot_bar(df: pd.DataFrame, column: str):
     ax.set_title(f"Bar chart of {column}")
     ax.set_ylabel("Count")
     ax.set_xlabel(column)
-    return _save_fig_to_buf(fig)
+    return _save_fig_to_buf(fig, out)
 
-def plot_pie(df: pd.DataFrame, column: str):
+def plot_pie(df: pd.DataFrame, column: str, out: dict = None):
     cmap = _apply_random_style()
     counts = df[column].value_counts()
     fig, ax = plt.subplots(figsize=(5, 5))
@@ -67,9 +97,10 @@ def plot_pie(df: pd.DataFrame, column: str):
     )
     ax.set_ylabel("")
     ax.set_title(f"Pie chart of {column}")
-    return _save_fig_to_buf(fig)
+    return _save_fig_to_buf(fig, out)
 
-def plot_boxplot(df: pd.DataFrame, column: str = None):
+def plot_boxplot(df: pd.DataFrame, column: str = None, out: dict = None):
+    import seaborn as sns
     cmap = _apply_random_style()
     fig, ax = plt.subplots(figsize=(6, 4))
     if column:
@@ -82,49 +113,101 @@ def plot_boxplot(df: pd.DataFrame, column: str = None):
         ax.legend()
         ax.set_title(f"Boxplot of {column}")
     else:
-        sns.boxplot(data=df.select_dtypes(include=np.number), orient="h", palette='Set2', ax=ax)
+        sns.boxplot(data=numeric_frame(df), orient="h", palette='Set2', ax=ax)
         ax.set_title("Boxplots (numeric columns)")
-    return _save_fig_to_buf(fig)
+    return _save_fig_to_buf(fig, out)
 
-def plot_qq(df: pd.DataFrame, column: str):
+def plot_qq(df: pd.DataFrame, column: str, out: dict = None):
+    from scipy import stats
     fig = plt.figure(figsize=(5, 5))
     stats.probplot(df[column].dropna(), dist="norm", plot=plt)
     plt.title(f"QQ-plot of {column}")
-    return _save_fig_to_buf(fig)
+    return _save_fig_to_buf(fig, out)
 
-def plot_scatter(df: pd.DataFrame, x: str, y: str):
+def lttb_downsample(x: np.ndarray, y: np.ndarray, n_out: int):
+    # Largest-Triangle-Three-Buckets: keep the point of each bucket that forms
+    # the largest triangle with the previous pick and the next bucket's mean
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+
+    # mean of every bucket in one pass, used as the third triangle vertex
+    counts = np.diff(edges)
+    x_means = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    y_means = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    x_means = np.append(x_means[1:], x[-1])
+    y_means = np.append(y_means[1:], y[-1])
+
+    prev = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        ax_, ay_ = x[prev], y[prev]
+        area = np.abs(
+            (ax_ - x_means[b]) * (y[lo:hi] - ay_)
+            - (ax_ - x[lo:hi]) * (y_means[b] - ay_)
+        )
+        prev = lo + int(np.argmax(area))
+        idx[b + 1] = prev
+    return idx
+
+def plot_scatter(df: pd.DataFrame, x: str, y: str, out: dict = None):
     cmap = _apply_random_style()
     fig, ax = plt.subplots(figsize=(6, 4))
-    ax.scatter(df[x], df[y], c=df[y], cmap=cmap, alpha=0.7, edgecolor="k")
+    data = df[[x, y]].dropna()
+
+    if len(data) > SCATTER_DENSITY_THRESHOLD:
+        # per-point colormapped markers are unreadable (and slow) at this size,
+        # so bin into a 2D density instead
+        mode = "density"
+        hb = ax.hexbin(data[x], data[y], gridsize=80, bins="log", cmap=cmap, mincnt=1)
+        fig.colorbar(hb, ax=ax, label="log10(count)")
+    else:
+        mode = "points"
+        ax.scatter(data[x], data[y], c=data[y], cmap=cmap, alpha=0.7, edgecolor="k")
     ax.set_title(f"Scatter: {y} vs {x}")
     ax.set_xlabel(x)
     ax.set_ylabel(y)
 
-    corr = df[[x, y]].corr().iloc[0, 1]
+    # correlation always uses every row, not the rendered reduction
+    corr = data.corr().iloc[0, 1]
     ax.text(0.05, 0.95, f'Corr: {corr:.2f}', transform=ax.transAxes, fontsize=10, verticalalignment='top', bbox=dict(boxstyle="round", facecolor="white", alpha=0.5))
 
-    return _save_fig_to_buf(fig)
+    return _save_fig_to_buf(fig, out), mode
 
-def plot_line(df: pd.DataFrame, x: str, y: str):
+def plot_line(df: pd.DataFrame, x: str, y: str, out: dict = None):
     cmap = _apply_random_style()
     fig, ax = plt.subplots(figsize=(6, 4))
-    ax.plot(df[x], df[y], marker=random.choice(['o', 's', '^', '.']), color='teal')
+    data = df[[x, y]].dropna()
+
+    if len(data) > LINE_DOWNSAMPLE_THRESHOLD:
+        mode = "lttb"
+        # non-numeric x (dates, labels) is bucketed by position
+        xs = data[x].to_numpy(dtype=float) if pd.api.types.is_numeric_dtype(data[x]) else np.arange(len(data), dtype=float)
+        keep = lttb_downsample(xs, data[y].to_numpy(dtype=float), LINE_DOWNSAMPLE_POINTS)
+        data = data.iloc[keep]
+        ax.plot(data[x], data[y], color='teal', linewidth=1)
+    else:
+        mode = "full"
+        ax.plot(data[x], data[y], marker=random.choice(['o', 's', '^', '.']), color='teal')
     ax.set_title(f"Line plot: {y} over {x}")
     ax.set_xlabel(x)
     ax.set_ylabel(y)
-    return _save_fig_to_buf(fig)
+    return _save_fig_to_buf(fig, out), mode
 
-def plot_heatmap(df: pd.DataFrame):
+def plot_heatmap(df: pd.DataFrame, out: dict = None):
+    import seaborn as sns
     cmap = _apply_random_style()
-    corr = df.select_dtypes(include=np.number).corr()
+    corr = numeric_frame(df).corr()
     fig, ax = plt.subplots(figsize=(6, 6))
     sns.heatmap(corr, annot=True, fmt=".2f", cmap=cmap, ax=ax)
     ax.set_title("Correlation Heatmap")
-    return _save_fig_to_buf(fig)
+    return _save_fig_to_buf(fig, out)
 
-def plot_roc_curve(y_true, y_score, pos_label=1, roc_auc = 0.0):
-    from sklearn.metrics import roc_curve, auc
-    fpr, tpr, _ = roc_curve(y_true, y_score, pos_label=pos_label)
+def plot_roc_curve(fpr, tpr, roc_auc = 0.0, out: dict = None):
     fig, ax = plt.subplots(figsize=(5, 5))
     ax.plot(fpr, tpr, label=f"AUC = {roc_auc:.3f}", color='blue')
     ax.plot([0, 1], [0, 1], linestyle='--', color='grey')
@@ -132,10 +215,9 @@ def plot_roc_curve(y_true, y_score, pos_label=1, roc_auc = 0.0):
     ax.set_xlabel("False Positive Rate")
     ax.set_ylabel("True Positive Rate")
     ax.legend(loc="lower right")
-    return _save_fig_to_buf(fig)
+    return _save_fig_to_buf(fig, out)
 
-def plot_model_comparison(metrics: dict):
-    print(metrics)
+def plot_model_comparison(metrics: dict, out: dict = None):
     cmap = _apply_random_style()
     names = list(metrics.keys())
     aucs = [metrics[m]["roc_auc"] for m in names]
@@ -152,12 +234,44 @@ def plot_model_comparison(metrics: dict):
     ax.axhline(y=0.5, color='red', linestyle='--', label='Baseline AUC = 0.5')
     ax.legend()
 
-    return _save_fig_to_buf(fig)
+    return _save_fig_to_buf(fig, out)
 
-def plot_shap_summary(shap_values: any, X: pd.DataFrame):
-    fig = shap.summary_plot(shap_values, X, show=False)
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches="tight")
-    buf.seek(0)
-    plt.close(fig)
-    return buf
+# Charts that can be rendered from the session frame alone (used by /graph/batch)
+CHART_RENDERERS = {
+    "histogram": lambda df, spec, out: plot_histogram(df, column=spec.get("column"), bins=spec.get("bins") or 30, out=out),
+    "bar": lambda df, spec, out: plot_bar(df, spec["column"], out=out),
+    "pie": lambda df, spec, out: plot_pie(df, spec["column"], out=out),
+    "boxplot": lambda df, spec, out: plot_boxplot(df, spec.get("column"), out=out),
+    "qq": lambda df, spec, out: plot_qq(df, spec["column"], out=out),
+    "scatter": lambda df, spec, out: plot_scatter(df, spec["x"], spec["y"], out=out),
+    "line": lambda df, spec, out: plot_line(df, spec["x"], spec["y"], out=out),
+    "heatmap": lambda df, spec, out: plot_heatmap(df, out=out),
+}
+
+def render_chart(df: pd.DataFrame, spec: dict):
+    # Runs inside a worker process, so return plain bytes rather than a buffer
+    start = time.perf_counter()
+    out = {k: spec.get(k) for k in ("format", "dpi", "width", "height")}
+    result = CHART_RENDERERS[spec["chart"]](df, spec, out)
+    buf, mode = result if isinstance(result, tuple) else (result, None)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return buf.getvalue(), mode, round(elapsed_ms, 2)
+
+# Charts embedded in the rich PDF report; data is whatever the chart needs
+# (a small frame, the ROC arrays, run metrics) so it pickles cheaply
+REPORT_RENDERERS = {
+    "histogram": lambda data, out: plot_histogram(data, column=data.columns[0], out=out),
+    "heatmap": lambda data, out: plot_heatmap(data, out=out),
+    "roc": lambda data, out: plot_roc_curve(data["fpr"], data["tpr"], roc_auc=data["auc"], out=out),
+    "compare": lambda data, out: plot_model_comparison(data, out=out),
+}
+
+def render_report_chart(kind: str, data, out: dict = None) -> bytes:
+    # runs inside a worker process, like render_chart
+    return REPORT_RENDERERS[kind](data, out).getvalue()
+
+def plot_shap_summary(shap_values: any, X: pd.DataFrame, out: dict = None):
+    import shap
+    # summary_plot draws onto the current figure and returns None
+    shap.summary_plot(shap_values, X, show=False)
+    return _save_fig_to_buf(plt.gcf(), out)
@@ -1,11 +1,25 @@
-import aiohttp, json
+import aiohttp, asyncio, hashlib, json, os, random, re, threading, time
+from collections import OrderedDict
 from typing import AsyncGenerator, Dict, List
 import pandas as pd
 import numpy as np
 
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
 GROQ_MODEL   = "llama3-8b-8192"
 
+# Shared client settings; the URL can point at a local mock server in tests
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))  # streams open at once
+GROQ_CONNECT_TIMEOUT = 5.0    # seconds to open a connection
+GROQ_READ_TIMEOUT    = 30.0   # longest silence allowed between two reads
+GROQ_MAX_RETRIES     = 3
+GROQ_RETRY_BASE      = 0.5    # seconds; doubles per attempt, with jitter
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Answer cache for /groq/suggest; repeat questions on an unchanged pipeline
+# skip the upstream call
+GROQ_CACHE_SIZE = int(os.getenv("GROQ_CACHE_SIZE", "256"))      # answers kept
+GROQ_CACHE_TTL  = float(os.getenv("GROQ_CACHE_TTL", "3600"))    # seconds an answer stays valid
+
 ENCODING_OPS = ["label", "onehot", "ordinal", "binary"]
 SCALING_OPS  = ["standard", "minmax", "robust", "maxabs"]
 SKEW_OPS     = ["log", "sqrt", "boxcox", "yeojohnson"]
@@ -24,8 +38,155 @@ ALL_PARAMS = {
 }
 
 
-def build_prompt(page: str, data: pd.DataFrame, steps: Dict, target_column: str, question: str) -> List[Dict]:
+# Dataset context sent with every question. It is computed once per data
+# version (cached on the session entry) and rendered at the most detailed
+# level that fits the token budget; tokens are estimated at ~4 chars each.
+PROMPT_TOKEN_BUDGET = int(os.getenv("GROQ_PROMPT_TOKENS", "3000"))
+CHARS_PER_TOKEN = 4
+MAX_CONTEXT_COLUMNS = 200       # columns profiled at all
+CORR_SAMPLE_ROWS = 20_000       # rows the correlations are estimated from
+PREVIEW_CELL_CHARS = 24
+# (columns shown, preview rows, correlation pairs, train runs) per detail level
+CONTEXT_LEVELS = [(40, 3, 15, 10), (20, 2, 8, 5), (10, 1, 4, 3), (5, 0, 2, 1)]
+
+def _round(v, digits=3):
     try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return str(v)[:PREVIEW_CELL_CHARS]
+    return None if not np.isfinite(v) else round(v, digits)
+
+def _cell(v):
+    if isinstance(v, (float, np.floating)):
+        return _round(v)
+    if isinstance(v, (int, np.integer, bool, np.bool_)) or v is None:
+        return v.item() if hasattr(v, "item") else v
+    return str(v)[:PREVIEW_CELL_CHARS]
+
+def dataset_context(data: pd.DataFrame, target_column: str) -> dict:
+    # everything the prompt says about the data, already reduced to plain
+    # Python values; ordered so truncating a list drops the least useful items
+    start = time.perf_counter()
+    cols = list(data.columns[:MAX_CONTEXT_COLUMNS])
+    frame = data[cols]
+    dense = [c for c in cols if not isinstance(frame[c].dtype, pd.SparseDtype)]
+    numeric = [c for c in dense if pd.api.types.is_numeric_dtype(frame[c]) and not pd.api.types.is_bool_dtype(frame[c])]
+    categorical = [c for c in dense if c not in numeric]
+    missing = frame.isna().sum()
+
+    stats = {}
+    if numeric:
+        x = frame[numeric]
+        summary = pd.DataFrame({"mean": x.mean(), "std": x.std(), "min": x.min(), "max": x.max(), "skew": x.skew()})
+        stats = {str(c): {k: _round(v) for k, v in row.items()} for c, row in summary.iterrows()}
+
+    pairs = []
+    if 1 < len(numeric) <= MAX_CONTEXT_COLUMNS:
+        # one BLAS pass over a row sample; NaNs take the column mean
+        x = frame[numeric]
+        if len(x) > CORR_SAMPLE_ROWS:
+            x = x.sample(CORR_SAMPLE_ROWS, random_state=0)
+        x = x.to_numpy(dtype=np.float64, na_value=np.nan)
+        x = np.where(np.isnan(x), np.nanmean(x, axis=0), x)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = np.corrcoef(x, rowvar=False)
+        i, j = np.triu_indices(len(numeric), k=1)
+        r = corr[i, j]
+        ok = np.isfinite(r)
+        # pairs with the target first, then the strongest of the rest
+        with_target = np.array([target_column in (numeric[a], numeric[b]) for a, b in zip(i, j)], dtype=bool)
+        order = np.lexsort((-np.abs(np.nan_to_num(r)), ~with_target))
+        pairs = [(str(numeric[i[k]]), str(numeric[j[k]]), _round(r[k], 2)) for k in order if ok[k]]
+
+    target = data[target_column] if target_column in data.columns else None
+    return {
+        "rows": int(len(data)),
+        "columns": int(data.shape[1]),
+        "memory_mb": round(data.memory_usage(deep=False).sum() / 1e6, 2),
+        "target": target_column,
+        "class_counts": {str(k): int(v) for k, v in target.value_counts().head(20).items()} if target is not None else {},
+        "dtypes": {str(c): str(frame[c].dtype) for c in cols},
+        "missing": {str(c): int(n) for c, n in missing.sort_values(ascending=False).items() if n > 0},
+        "unique": {str(c): int(frame[c].nunique()) for c in categorical},
+        "numeric_cols": [str(c) for c in numeric],
+        "cat_cols": [str(c) for c in categorical],
+        # most skewed first
+        "numeric_stats": dict(sorted(stats.items(), key=lambda kv: -abs(kv[1]["skew"] or 0))),
+        "top_correlations": pairs,
+        "preview": [{str(c): _cell(v) for c, v in row.items()} for row in frame.head(3).to_dict(orient="records")],
+        "build_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+def get_dataset_context(cache: dict, version, data: pd.DataFrame, target_column: str):
+    # (context, cache hit); the cache dict lives on the session entry
+    key = (version, target_column, data.shape)
+    if cache is not None and cache.get("key") == key:
+        return cache["context"], True
+    context = dataset_context(data, target_column)
+    if cache is not None:
+        cache.clear()
+        cache.update(key=key, context=context)
+    return context, False
+
+def summarize_steps(steps: Dict, max_runs: int) -> Dict:
+    # run history without curves, sweeps, trial lists or fitted parameters
+    summary = {}
+    if steps.get("clean"):
+        summary["clean"] = steps["clean"]
+    if steps.get("transform"):
+        summary["transform"] = [{k: v for k, v in t.items() if k != "fitted" and v} for t in steps["transform"]]
+    runs = steps.get("train") or []
+    if runs:
+        def _auc(run):
+            return (run.get("metrics") or {}).get("roc_auc") or -1
+        best = max(runs, key=_auc)
+        shown = runs[-max_runs:]
+        if best not in shown:
+            shown = [best] + shown[1:]
+        summary["train"] = {
+            "total_runs": len(runs),
+            "best_run_by_auc": best.get("run_id"),
+            "runs": [{
+                "run_id": run.get("run_id"),
+                "model": run.get("model_key") or run.get("model"),
+                "params": run.get("params"),
+                "metrics": {k: v for k, v in (run.get("metrics") or {}).items()
+                            if k in ("accuracy", "precision", "recall", "f1", "roc_auc", "pr_auc")},
+            } for run in shown],
+        }
+    if steps.get("explain"):
+        summary["feature_importance"] = {
+            str(run_id): list((info.get("importance") or {}).keys())[:5] for run_id, info in steps["explain"].items()
+        }
+    return summary
+
+def _render_context(ctx: dict, level: int) -> str:
+    n_cols, n_rows, n_pairs, _ = CONTEXT_LEVELS[level]
+    def _head(d):
+        items = list(d.items())
+        more = f" (+{len(items) - n_cols} more)" if len(items) > n_cols else ""
+        return f"{dict(items[:n_cols])}{more}"
+    preview = [{k: v for k, v in list(row.items())[:n_cols]} for row in ctx["preview"][:n_rows]]
+    lines = [
+        f" • dtypes: {_head(ctx['dtypes'])}",
+        f" • missing values: {_head(ctx['missing']) if ctx['missing'] else 'none'}",
+        f" • unique values (categorical): {_head(ctx['unique'])}",
+        f" • numeric stats (mean/std/min/max/skew, most skewed first): {_head(ctx['numeric_stats'])}",
+        f" • strongest correlations: {ctx['top_correlations'][:n_pairs]}",
+    ]
+    if preview:
+        lines.append(f" • first rows: {preview}")
+    return "\n".join(lines)
+
+def _tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def build_prompt(page: str, data: pd.DataFrame, steps: Dict, target_column: str, question: str,
+                 cache: dict = None, version=None, token_budget: int = PROMPT_TOKEN_BUDGET):
+    # Returns (messages, info) where info reports the context build time,
+    # whether it came from the cache, the detail level used and prompt size.
+    try:
+        start = time.perf_counter()
         page_names = {
             "eda":       "Exploratory Data Analysis",
             "clean":     "Data Cleaning",
@@ -37,106 +198,250 @@ def build_prompt(page: str, data: pd.DataFrame, steps: Dict, target_column: str,
         # Safe fallback for target column
         if not target_column or target_column not in data.columns:
             target_column = data.columns[-1] if len(data.columns) else 'unknown'
-        target_col_data = data.get(target_column)
-
-        # Safe class count
-        try:
-            class_counts = target_col_data.value_counts(dropna=True).to_dict() if target_col_data is not None else {}
-        except Exception:
-            class_counts = {}
-
-        data_summary = {
-            "head": data.head().to_dict(),
-            "tail": data.tail().to_dict(),
-            "describe": data.describe(include="all").to_dict(),
-            "dtypes": data.dtypes.astype(str).to_dict(),
-            "missing_values": data.isnull().sum().to_dict(),
-            "memory_usage": data.memory_usage(deep=True).to_dict(),
-            "unique_values": {col: data[col].nunique(dropna=True) for col in data.columns},
-            "shape": {"rows": data.shape[0], "columns": data.shape[1]},
-            "sample": data.sample(min(5, len(data))).to_dict(),
-            "correlation": data.select_dtypes(include=[np.number]).corr().fillna(0).to_dict(),
-            "skewness": data.select_dtypes(include=[np.number]).skew().fillna(0).to_dict(),
-            "class_counts": class_counts,
-            "numeric_cols": data.select_dtypes(include=[np.number]).columns.tolist(),
-            "cat_cols": data.select_dtypes(include=["object", "category", "bool"]).columns.tolist()
-        }
+        ctx, cached = get_dataset_context(cache, version, data, target_column)
 
-        system_msg = {
-            "role": "system",
-            "content": (
-                f"You are an ML-pipeline assistant. The user is currently on the **{pg}** page.\n\n"
-                f"**Dataset:** {data_summary['shape']['rows']} rows × {data_summary['shape']['columns']} columns; "
-                f"target = '{target_column}' with distribution {data_summary['class_counts']}\n\n"
-                f"**Data preview:**\n"
-                f" • head: {data_summary['head']}\n"
-                f" • tail: {data_summary['tail']}\n"
-                f" • describe: {data_summary['describe']}\n"
-                f" • dtypes: {data_summary['dtypes']}\n"
-                f" • missing values: {data_summary['missing_values']}\n"
-                f" • memory usage: {data_summary['memory_usage']}\n"
-                f" • unique values: {data_summary['unique_values']}\n"
-                f" • sample: {data_summary['sample']}\n\n"
-                f"**Data types:**\n"
-                f" • numeric: {data_summary['numeric_cols']}\n"
-                f" • categorical: {data_summary['cat_cols']}\n\n"
-                f"**Data distribution:**\n"
-                f" • class counts: {data_summary['class_counts']}\n"
-                f" • correlation: {data_summary['correlation']}\n"
-                f" • skewness: {data_summary['skewness']}\n\n"
-                f"**Cleaning steps:**\n"
-                f" Filling Null with only mean, median, or mode.\n\n"
-                f"**Shipped preprocessing ops:**\n"
-                f" • encoding: {ENCODING_OPS}\n"
-                f" • scaling:  {SCALING_OPS}\n"
-                f" • skew-fix: {SKEW_OPS}\n"
-                f" • balancing: {BALANCE_OPS}\n\n"
-                "**Hyperparameter knobs per model:**\n"
-                + "\n".join(f"  • {m}: {ALL_PARAMS[m]}" for m in ALL_PARAMS)
-                + "\n\n"
-                "When giving advice, only pick from the above options. "
-                "If you don't know, say you don't know.\n\n"
-                "If upload and no steps or dataset, say they are on homepage, say: Let get started with pipline and ask them to upload a dataset.\n\n"
-                "If general questions are asked, answer them in the context of the current page.\n\n"
-                "If on the Training page, compare all runs and tell which performed best (by AUC) and why.\n"
-                "If on the Transform page, suggest the best encoding/scaling/skew-fix/balancing method and/or dropping columns for the data.\n"
-                "If on the eda page, what are the most important features to look at and why?\n"
-                "If on the clean page, for what column to fill its null value what to choose mean, median or mode then make graphs to see.\n"
-                "If on the train page, what is the best model to use and why and what given hyperparameter to choose from and why?\n"
-            )
-        }
+        def _messages(level):
+            dataset_text = _render_context(ctx, level)
+            history = summarize_steps(steps or {}, CONTEXT_LEVELS[level][3])
+            system_msg = {
+                "role": "system",
+                "content": (
+                    f"You are an ML-pipeline assistant. The user is currently on the **{pg}** page.\n\n"
+                    f"**Dataset:** {ctx['rows']} rows × {ctx['columns']} columns ({ctx['memory_mb']} MB); "
+                    f"target = '{target_column}' with distribution {ctx['class_counts']}\n\n"
+                    f"**Data preview:**\n{dataset_text}\n\n"
+                    f"**Data types:**\n"
+                    f" • numeric: {ctx['numeric_cols'][:CONTEXT_LEVELS[level][0]]}\n"
+                    f" • categorical: {ctx['cat_cols'][:CONTEXT_LEVELS[level][0]]}\n\n"
+                    f"**Cleaning steps:**\n"
+                    f" Filling Null with only mean, median, or mode.\n\n"
+                    f"**Shipped preprocessing ops:**\n"
+                    f" • encoding: {ENCODING_OPS}\n"
+                    f" • scaling:  {SCALING_OPS}\n"
+                    f" • skew-fix: {SKEW_OPS}\n"
+                    f" • balancing: {BALANCE_OPS}\n\n"
+                    "**Hyperparameter knobs per model:**\n"
+                    + "\n".join(f"  • {m}: {ALL_PARAMS[m]}" for m in ALL_PARAMS)
+                    + "\n\n"
+                    "When giving advice, only pick from the above options. "
+                    "If you don't know, say you don't know.\n\n"
+                    "If upload and no steps or dataset, say they are on homepage, say: Let get started with pipline and ask them to upload a dataset.\n\n"
+                    "If general questions are asked, answer them in the context of the current page.\n\n"
+                    "If on the Training page, compare all runs and tell which performed best (by AUC) and why.\n"
+                    "If on the Transform page, suggest the best encoding/scaling/skew-fix/balancing method and/or dropping columns for the data.\n"
+                    "If on the eda page, what are the most important features to look at and why?\n"
+                    "If on the clean page, for what column to fill its null value what to choose mean, median or mode then make graphs to see.\n"
+                    "If on the train page, what is the best model to use and why and what given hyperparameter to choose from and why?\n"
+                )
+            }
 
-        user_msg = {
-            "role": "user",
-            "content": (
-                f"Question: *{page}*> {question}*\n\n"
-                f"Please provide a concise, actionable recommendation.\n\n"
-                "Here is the full **pipeline history** so far:\n"
-                + json.dumps(steps, indent=2)
-                + "\n\nPlease reply with concise, actionable recommendations."
-            )
-        }
+            user_msg = {
+                "role": "user",
+                "content": (
+                    f"Question: *{page}*> {question}*\n\n"
+                    f"Please provide a concise, actionable recommendation.\n\n"
+                    "Here is the **pipeline history** so far (summarized):\n"
+                    + json.dumps(history, separators=(",", ":"), default=str)
+                    + "\n\nPlease reply with concise, actionable recommendations."
+                )
+            }
+            return [system_msg, user_msg]
 
-        return [system_msg, user_msg]
+        # most detailed level that fits; the smallest one is used regardless
+        for level in range(len(CONTEXT_LEVELS)):
+            messages = _messages(level)
+            tokens = sum(_tokens(m["content"]) for m in messages)
+            if tokens <= token_budget:
+                break
+
+        info = {
+            "context_cached": cached,
+            "context_build_ms": 0.0 if cached else ctx["build_ms"],
+            "prompt_ms": round((time.perf_counter() - start) * 1000, 2),
+            "detail_level": level,
+            "prompt_chars": sum(len(m["content"]) for m in messages),
+            "prompt_tokens_est": tokens,
+            "token_budget": token_budget,
+            # the fixed instructions alone can exceed a very small budget
+            "over_budget": tokens > token_budget,
+        }
+        return messages, info
     except Exception as e:
         print(f"❌ Error in build_prompt: {e}")
         raise ValueError("Error in build_prompt: " + str(e))
 
 
+class SSEParser:
+    # Incremental Server-Sent Events parser. feed() takes raw bytes as they
+    # arrive, in any split, and returns the data of every event completed by
+    # them; partial lines and events wait for the next read.
+    def __init__(self):
+        self._buffer = b""
+        self._data: List[str] = []
+
+    def feed(self, chunk: bytes) -> List[str]:
+        self._buffer += chunk
+        events = []
+        while True:
+            end = self._buffer.find(b"\n")
+            if end < 0:
+                break
+            line = self._buffer[:end].rstrip(b"\r")
+            self._buffer = self._buffer[end + 1:]
+            if not line:
+                if self._data:
+                    events.append("\n".join(self._data))
+                    self._data = []
+            elif not line.startswith(b":"):
+                field, _, value = line.partition(b":")
+                if field == b"data":
+                    self._data.append(value[1:].decode("utf-8") if value.startswith(b" ") else value.decode("utf-8"))
+        return events
+
+class _Retryable(Exception):
+    def __init__(self, message: str, delay: float = None):
+        super().__init__(message)
+        self.delay = delay
+
+class GroqClient:
+    # One pooled keep-alive session for the whole app, opened in the app
+    # lifespan. At most max_concurrency streams run at once; failures before
+    # the first token are retried with jittered exponential backoff (after
+    # that a retry would repeat text the caller already has).
+    def __init__(self, url: str = GROQ_API_URL, max_concurrency: int = GROQ_MAX_CONCURRENCY,
+                 connect_timeout: float = GROQ_CONNECT_TIMEOUT, read_timeout: float = GROQ_READ_TIMEOUT,
+                 max_retries: int = GROQ_MAX_RETRIES, retry_base: float = GROQ_RETRY_BASE):
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.session = None
+        self._semaphore = None
+
+    async def start(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, ttl_dns_cache=300, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _backoff(self, attempt: int) -> float:
+        return self.retry_base * (2 ** attempt) * (0.5 + random.random())
+
+    async def stream_chat(self, api_key: str, payload: Dict) -> AsyncGenerator[str, None]:
+        await self.start()
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        sent_any = False
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    async with self.session.post(self.url, json=payload, headers=headers) as resp:
+                        if resp.status in RETRY_STATUSES:
+                            retry_after = resp.headers.get("Retry-After")
+                            raise _Retryable(f"Groq returned {resp.status}",
+                                             float(retry_after) if retry_after and retry_after.isdigit() else None)
+                        if resp.status != 200:
+                            raise ValueError(f"Groq returned {resp.status}: {(await resp.text())[:200]}")
+                        parser = SSEParser()
+                        async for chunk in resp.content.iter_any():
+                            for data in parser.feed(chunk):
+                                if data == "[DONE]":
+                                    return
+                                try:
+                                    event = json.loads(data)
+                                except json.JSONDecodeError:
+                                    print(f"Skipping malformed Groq event: {data[:200]}")
+                                    continue
+                                if event.get("error"):
+                                    raise ValueError(f"Groq error: {event['error']}")
+                                choices = event.get("choices") or [{}]
+                                delta = (choices[0].get("delta") or {}).get("content")
+                                if delta:
+                                    sent_any = True
+                                    yield delta
+                        return
+            except (_Retryable, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                if sent_any or attempt == self.max_retries:
+                    raise ValueError(f"Groq request failed after {attempt + 1} attempts: {e!r}")
+                delay = getattr(e, "delay", None) or self._backoff(attempt)
+                print(f"Groq attempt {attempt + 1} failed ({e!r}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+groq_client = GroqClient()
+
 async def stream_groq_response(api_key: str, messages: List[Dict]) -> AsyncGenerator[str, None]:
     try:
-        headers = {"Authorization":f"Bearer {api_key}", "Content-Type":"application/json"}
         payload = {"model":GROQ_MODEL, "messages":messages, "stream":True, "temperature":0.6}
-        async with aiohttp.ClientSession() as sess:
-            async with sess.post(GROQ_API_URL, json=payload, headers=headers) as resp:
-                async for chunk in resp.content:
-                    txt = chunk.decode("utf-8").lstrip("data:").strip()
-                    if not txt or txt=="[DONE]": continue
-                    try:
-                        delta = json.loads(txt)["choices"][0]["delta"].get("content")
-                        if delta: yield delta
-                    except:
-                        continue
+        async for delta in groq_client.stream_chat(api_key, payload):
+            yield delta
     except Exception as e:
         print(f"Error in stream_groq_response: {e}")
-        raise ValueError("Error in stream_groq_response" + str(e))
\ No newline at end of file
+        raise ValueError("Error in stream_groq_response" + str(e))
+
+def normalize_question(question: str) -> str:
+    # "Which model is best?" and "which model is  best" share an entry
+    q = re.sub(r"\s+", " ", question.strip().lower())
+    return q.strip(" ?!.\"'")
+
+class AnswerCache:
+    # Bounded LRU of assistant answers with a TTL. Keys cover everything the
+    # prompt depends on: session, page, data version, a hash of the
+    # (summarized) pipeline history and the normalized question.
+    def __init__(self, max_size: int = GROQ_CACHE_SIZE, ttl: float = GROQ_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items = OrderedDict()   # key -> (stored at, answer)
+        self.hits = self.misses = self.expired = self.evictions = 0
+
+    def key(self, session_id: str, page: str, version, steps: Dict, target_column: str, question: str) -> tuple:
+        history = summarize_steps(steps or {}, CONTEXT_LEVELS[0][3])
+        digest = hashlib.sha1(
+            json.dumps([target_column, history], sort_keys=True, default=str).encode()
+        ).hexdigest()
+        return (session_id, page, version, digest, normalize_question(question))
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and time.monotonic() - item[0] > self.ttl:
+                del self._items[key]
+                self.expired += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, answer: str):
+        if not answer or self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic(), answer)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+answer_cache = AnswerCache()
@@ -1,32 +1,30 @@
-from sklearn.model_selection import cross_val_score
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score
-from sklearn.linear_model import LogisticRegression, LinearRegression
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.naive_bayes import GaussianNB
-from sklearn.svm import SVC
-from sklearn.neighbors import KNeighborsClassifier
-from xgboost import XGBClassifier
-from lightgbm import LGBMClassifier
+import copy, importlib, time
+from functools import lru_cache
 import numpy as np
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import confusion_matrix
-import shap
+import pandas as pd
+from app.utils.evaluation import evaluate_classifier
+from app.utils.explainability import BACKGROUND_ROWS, EXPLAIN_ROWS
+from app.utils.boosting import can_fit_native, fit_native
 
-# Mapping models to constructors
+# Mapping models to constructors. Classes are imported on first use so that
+# xgboost/lightgbm/sklearn stay out of the server's cold start.
 MODEL_MAP = {
-    "logistic": LogisticRegression,
-    "linear": LinearRegression,
-    "random_forest": RandomForestClassifier,
-    "decision_tree": DecisionTreeClassifier,
-    "naive_bayes": GaussianNB,
-    "svm": SVC,
-    "knn": KNeighborsClassifier,
-    "xgboost": XGBClassifier,
-    "lightgbm": LGBMClassifier,
+    "logistic": "sklearn.linear_model.LogisticRegression",
+    "linear": "sklearn.linear_model.LinearRegression",
+    "random_forest": "sklearn.ensemble.RandomForestClassifier",
+    "decision_tree": "sklearn.tree.DecisionTreeClassifier",
+    "naive_bayes": "sklearn.naive_bayes.GaussianNB",
+    "svm": "sklearn.svm.SVC",
+    "knn": "sklearn.neighbors.KNeighborsClassifier",
+    "xgboost": "xgboost.XGBClassifier",
+    "lightgbm": "lightgbm.LGBMClassifier",
 }
 
+@lru_cache(maxsize=None)
+def get_model_class(model_key):
+    module_name, _, class_name = MODEL_MAP[model_key].rpartition(".")
+    return getattr(importlib.import_module(module_name), class_name)
+
 CLASSIFICATION_MODELS = {
     "logistic", "random_forest", "decision_tree",
     "knn", "svm", "naive_bayes", "xgboost", "lightgbm"
@@ -70,48 +68,167 @@ def cast_params(user_params, default_params):
             casted[k] = v
     return casted
 
-def train_and_evaluate(model_key, X, y, user_params=None, test_size=0.2, random_state=42, stratify=True):
+# GaussianNB has no sparse support; every other estimator here takes CSR input
+DENSE_ONLY_MODELS = {"naive_bayes"}
+
+def has_sparse_columns(X) -> bool:
+    return isinstance(X, pd.DataFrame) and any(isinstance(t, pd.SparseDtype) for t in X.dtypes)
+
+def to_model_matrix(X: pd.DataFrame):
+    # frames holding sparse one-hot columns become one CSR matrix, dense
+    # columns first; returns (matrix, feature names in matrix order)
+    from scipy import sparse
+    sparse_cols = [c for c, t in X.dtypes.items() if isinstance(t, pd.SparseDtype)]
+    dense = X.drop(columns=sparse_cols)
+    blocks = [sparse.csr_matrix(dense.to_numpy(dtype=np.float64))] if dense.shape[1] else []
+    blocks.append(X[sparse_cols].sparse.to_coo().astype(np.float64).tocsr())
+    return sparse.hstack(blocks, format="csr"), list(dense.columns) + sparse_cols
+
+def _sparse_sample(matrix, names, n, random_state):
+    # capped rows of a CSR split kept as a sparse frame for SHAP jobs
+    rows = np.arange(matrix.shape[0])
+    if len(rows) > n:
+        rows = np.sort(np.random.default_rng(random_state).choice(rows, n, replace=False))
+    # from_spmatrix would make NaN the fill value of float columns, so the
+    # zero-filled columns are built block by block from the (small) sample
+    matrix = matrix[rows].tocsc()
+    columns = {}
+    for start in range(0, matrix.shape[1], 256):
+        block = matrix[:, start:start + 256].toarray()
+        for j in range(block.shape[1]):
+            columns[names[start + j]] = pd.arrays.SparseArray(block[:, j], fill_value=0.0)
+    return pd.DataFrame(columns)
+
+# Models that can grow an already-fitted ensemble when only n_estimators goes up
+WARM_START_MODELS = {"random_forest", "xgboost", "lightgbm"}
+
+def _n_estimators(model):
+    return int(model.get_params().get("n_estimators") or 100)
+
+def can_warm_start(model_key, previous, params):
+    # previous: warm state from an earlier run on the same data and split
+    if model_key not in WARM_START_MODELS or not previous:
+        return False
+    old, new = dict(previous["params"]), dict(params)
+    old.pop("n_estimators", None)
+    new_n = new.pop("n_estimators", None)
+    try:
+        return old == new and new_n is not None and int(new_n) > _n_estimators(previous["model"])
+    except (TypeError, ValueError):
+        return False
+
+def _warm_fit(model_key, ModelClass, previous_model, params, X_train, y_train):
+    total = int(params["n_estimators"])
+    if model_key == "random_forest":
+        # copy so the earlier run's model is left untouched
+        model = copy.deepcopy(previous_model)
+        model.set_params(warm_start=True, n_estimators=total)
+        model.fit(X_train, y_train)
+        model.set_params(warm_start=False)
+        return model
+
+    extra = total - _n_estimators(previous_model)
+    model = ModelClass(**{**params, "n_estimators": extra})
+    if model_key == "xgboost":
+        model.fit(X_train, y_train, xgb_model=previous_model.get_booster())
+    else:
+        model.fit(X_train, y_train, init_model=previous_model.booster_)
+    model.set_params(n_estimators=total)
+    return model
+
+# dataset_cache: per-session dict of native boosting datasets for this data
+# version and split (see app.utils.boosting); None trains through sklearn only.
+# progress: optional ProgressReporter the fit publishes stages/iterations to.
+def train_and_evaluate(model_key, X, y, user_params=None, test_size=0.2, random_state=42, stratify=True,
+                       warm_from=None, dataset_cache=None, progress=None):
     if model_key not in MODEL_MAP:
         raise ValueError(f"Unsupported model '{model_key}'")
 
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+
+    feature_names = [str(c) for c in X.columns]
+    sparse_input = has_sparse_columns(X)
+    if sparse_input:
+        X, feature_names = to_model_matrix(X)
+        if model_key in DENSE_ONLY_MODELS:
+            X, sparse_input = X.toarray(), False
+
     stratify_col = y if stratify and model_key in CLASSIFICATION_MODELS else None
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=test_size, random_state=random_state, stratify=stratify_col
     )
 
-    ModelClass = MODEL_MAP[model_key]
+    ModelClass = get_model_class(model_key)
     params = DEFAULT_PARAMS.get(model_key, {}).copy()
     if user_params:
         params.update(cast_params(user_params, params))
 
-    model = ModelClass(**params)
-    print(f"Training {model_key} with params: {params}")
-    model.fit(X_train, y_train)
+    native = dataset_cache is not None and can_fit_native(model_key, X_train)
+    dataset = None
+    start = time.perf_counter()
+    if can_warm_start(model_key, warm_from, params):
+        print(f"Warm-starting {model_key} from {_n_estimators(warm_from['model'])} to {params['n_estimators']} estimators")
+        if native:
+            model, dataset = fit_native(model_key, params, X_train, y_train, dataset_cache,
+                                        init_model=warm_from["model"], progress=progress,
+                                        feature_names=feature_names)
+        else:
+            if progress:
+                progress.begin("fit")
+            model = _warm_fit(model_key, ModelClass, warm_from["model"], params, X_train, y_train)
+        mode = "warm"
+    else:
+        print(f"Training {model_key} with params: {params}")
+        if native:
+            model, dataset = fit_native(model_key, params, X_train, y_train, dataset_cache, progress=progress,
+                                        feature_names=feature_names)
+        else:
+            if progress:
+                progress.begin("fit")
+            model = ModelClass(**params)
+            model.fit(X_train, y_train)
+        mode = "cold"
+    fit_ms = (time.perf_counter() - start) * 1000
 
+    fit = {"mode": mode, "fit_ms": round(fit_ms, 2)}
+    if dataset:
+        fit["dataset"] = dataset
+    warm_state = None
+    if model_key in WARM_START_MODELS:
+        n = _n_estimators(model)
+        # per-estimator cost is only learned from cold fits
+        if mode == "cold":
+            baseline = {"estimators": n, "fit_ms": round(fit_ms, 2)}
+            ms_per_estimator = fit_ms / n
+        else:
+            baseline, ms_per_estimator = warm_from["cold_baseline"], warm_from["ms_per_estimator"]
+            # the estimate comes from an earlier cold fit that may have run under
+            # different load (e.g. a SHAP job), so saved_ms is the plain
+            # difference and goes negative when the warm fit was slower
+            fit["reused_estimators"] = _n_estimators(warm_from["model"])
+            fit["estimated_cold_ms"] = round(ms_per_estimator * n, 2)
+            fit["cold_baseline"] = baseline
+            fit["saved_ms"] = round(ms_per_estimator * n - fit_ms, 2)
+        warm_state = {"model": model, "params": params, "ms_per_estimator": ms_per_estimator,
+                      "cold_baseline": baseline}
+
+    if progress:
+        progress.begin("evaluate")
+    evaluation = None
     if model_key in CLASSIFICATION_MODELS:
         preds = model.predict(X_test)
         probs = None
         if hasattr(model, "predict_proba"):
-            probs = model.predict_proba(X_test)[:, 1]
+            probs = model.predict_proba(X_test)
         elif hasattr(model, "decision_function"):
             probs = model.decision_function(X_test)
-        scores = {
-            "accuracy": round(accuracy_score(y_test, preds), 4),
-            "precision": round(precision_score(y_test, preds, zero_division=0), 4),
-            "recall": round(recall_score(y_test, preds, zero_division=0), 4),
-            "f1": round(f1_score(y_test, preds, zero_division=0), 4),
-            "roc_auc": round(roc_auc_score(y_test, preds), 4),
-        }
-        cm = confusion_matrix(y_test, preds)
-        print(f"Model: {model_key}, accuracy: {accuracy_score(y_test, preds)}, precision: {precision_score(y_test, preds, zero_division=0):.4f}, recall: {recall_score(y_test, preds, zero_division=0):.4f}, f1: {f1_score(y_test, preds, zero_division=0):.4f}, roc_auc: {roc_auc_score(y_test, preds):.4f}")
-        
+        # one pass for every metric, curve and threshold sweep
+        scores, cm, evaluation = evaluate_classifier(y_test, preds, probs, getattr(model, "classes_", None))
+        print(f"Model: {model_key}, " + ", ".join(f"{k}: {v}" for k, v in scores.items()))
+
     elif model_key in REGRESSION_MODELS:
         preds = model.predict(X_test)
-        probs = None
-        if hasattr(model, "predict_proba"):
-            probs = model.predict_proba(X_test)[:, 1]
-        elif hasattr(model, "decision_function"):
-            probs = model.decision_function(X_test)
         scores = {
             "rmse": round(np.sqrt(mean_squared_error(y_test, preds)), 4),
             "mae": round(mean_absolute_error(y_test, preds), 4),
@@ -120,20 +237,11 @@ def train_and_evaluate(model_key, X, y, user_params=None, test_size=0.2, random_
     else:
         raise ValueError(f"Model '{model_key}' is not supported.")
 
-    if probs is not None:
-        df_test = X_test.copy()
-        df_test["__y_true"]  = y_test
-        df_test["__y_score"] = probs
-        
-    # try:
-    #     if model_key in ["random_forest", "decision_tree", "xgboost", "lightgbm"]:
-    #         explainer = shap.TreeExplainer(model)
-    #     else:
-    #         explainer = shap.Explainer(model, X_train)
-    #     shap_values = explainer(X_test)
-    #     shap.summary_plot(shap_values, X_test, show=False)
-    #     print("SHAP values computed successfully.")
-    # except Exception as e:
-    #     print(f"Error computing SHAP values: {e}")
-
-    return model.__class__.__name__, params, scores, cm if model_key in CLASSIFICATION_MODELS else None, df_test if df_test is not None else None
+    if sparse_input:
+        X_train = _sparse_sample(X_train, feature_names, BACKGROUND_ROWS, random_state)
+        X_test = _sparse_sample(X_test, feature_names, EXPLAIN_ROWS, random_state)
+    elif not isinstance(X_train, pd.DataFrame):
+        X_train = pd.DataFrame(X_train, columns=feature_names)
+        X_test = pd.DataFrame(X_test, columns=feature_names)
+    artifacts = {"model": model, "X_train": X_train, "X_test": X_test, "fit": fit, "warm_state": warm_state}
+    return ModelClass.__name__, params, scores, cm if model_key in CLASSIFICATION_MODELS else None, evaluation, artifacts
@@ -0,0 +1,296 @@
+import os, shutil, tempfile, time
+import numpy as np
+import pandas as pd
+from app.utils.evaluation import evaluate_classifier
+from app.utils.explainability import BACKGROUND_ROWS, EXPLAIN_ROWS
+
+# Per-session working files (spilled frames, training caches). Nothing is
+# written until out-of-core training asks for the data; the directory goes
+# away with the session (drop_session in routes/upload.py).
+SESSION_DATA_DIR = os.getenv("SESSION_DATA_DIR", os.path.join(tempfile.gettempdir(), "automl-ai-sessions"))
+DEFAULT_CHUNKSIZE = 100_000
+SGD_EPOCHS = 5   # passes over the file for the SGD models; "epochs" param overrides
+
+# Models that can train without the whole frame in memory. Linear models and
+# naive Bayes use partial_fit; the boosters use their own external-memory paths.
+OOC_MODELS = {
+    "logistic": "sgd",
+    "svm": "sgd",
+    "naive_bayes": "partial_fit",
+    "xgboost": "xgboost",
+    "lightgbm": "lightgbm",
+}
+
+OOC_DEFAULT_PARAMS = {
+    "logistic": {"loss": "log_loss", "alpha": 1e-4, "epochs": SGD_EPOCHS},
+    "svm": {"loss": "hinge", "alpha": 1e-4, "epochs": SGD_EPOCHS},
+    "naive_bayes": {},
+    "xgboost": {"n_estimators": 100, "max_depth": 6, "learning_rate": 0.1},
+    "lightgbm": {"n_estimators": 100, "num_leaves": 31, "max_depth": 7, "learning_rate": 0.05},
+}
+
+def session_dir(session_id: str) -> str:
+    path = os.path.join(SESSION_DATA_DIR, session_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def remove_session_dir(session_id: str):
+    shutil.rmtree(os.path.join(SESSION_DATA_DIR, session_id), ignore_errors=True)
+
+def discard_spill(entry: dict):
+    # called when the frame is replaced; only the current version is kept on disk
+    spill = entry.pop("spill", None)
+    if spill:
+        try:
+            os.remove(spill["path"])
+        except OSError:
+            pass
+
+def session_data_path(entry: dict, session_id: str, chunksize: int = DEFAULT_CHUNKSIZE) -> str:
+    # The current version is spilled to disk on first use and reused until
+    # the frame changes
+    version = entry.get("version", 0)
+    spill = entry.get("spill")
+    if spill and spill["version"] == version and os.path.exists(spill["path"]):
+        return spill["path"]
+    discard_spill(entry)
+    path = os.path.join(session_dir(session_id), f"data_v{version}.csv")
+    entry["data"].to_csv(path, index=False, chunksize=chunksize)
+    entry["spill"] = {"version": version, "path": path}
+    return path
+
+def holdout_mask(row_ids: np.ndarray, test_size: float, seed: int = 42) -> np.ndarray:
+    # splitmix64 of (row id, seed) -> uniform [0, 1); a row's side of the
+    # split depends only on its id, so no index ever has to be materialized
+    with np.errstate(over="ignore"):
+        z = row_ids.astype(np.uint64) + np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53)) < test_size
+
+def iter_chunks(path: str, target: str, test_size: float, seed: int, chunksize: int):
+    # yields (X, y, is_holdout) per chunk, with row ids running across chunks
+    offset = 0
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        y = chunk.pop(target)
+        row_ids = np.arange(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield chunk, y.to_numpy(), holdout_mask(row_ids, test_size, seed)
+
+def _scan_target(path: str, target: str, chunksize: int):
+    # one cheap pass over the target column for the class list partial_fit needs
+    classes = set()
+    for chunk in pd.read_csv(path, usecols=[target], chunksize=chunksize):
+        classes.update(chunk[target].dropna().unique().tolist())
+    return np.array(sorted(classes))
+
+class _Reservoir:
+    # first rows seen on each side of the split, kept for SHAP jobs
+    def __init__(self, limit):
+        self.limit, self.parts, self.rows = limit, [], 0
+
+    def add(self, X: pd.DataFrame):
+        if self.rows < self.limit and len(X):
+            part = X.iloc[: self.limit - self.rows]
+            self.parts.append(part)
+            self.rows += len(part)
+
+    def frame(self):
+        return pd.concat(self.parts) if self.parts else pd.DataFrame()
+
+def _check_numeric(X: pd.DataFrame):
+    bad = X.columns[~X.dtypes.map(pd.api.types.is_numeric_dtype)].tolist()
+    if bad:
+        raise ValueError(f"Out-of-core training needs numeric features; encode {bad} first")
+
+def _fit_partial(model_key, params, chunks, classes, background, random_state, progress=None):
+    # partial_fit takes rows in the order given, and resampled data comes
+    # label-sorted, so rows are shuffled (seeded) inside every chunk. SGD also
+    # gets several epochs; naive Bayes only counts, so one pass is exact.
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.naive_bayes import GaussianNB
+    params = dict(params)
+    epochs = max(1, int(params.pop("epochs", 1)))
+    if OOC_MODELS[model_key] == "partial_fit":
+        model, epochs = GaussianNB(**params), 1
+    else:
+        model = SGDClassifier(**{"random_state": random_state, **params})
+    rng = np.random.default_rng(random_state)
+    rows, i = 0, 0
+    for epoch in range(epochs):
+        for X, y, holdout in chunks():
+            _check_numeric(X)
+            train = np.flatnonzero(~holdout)
+            if len(train):
+                if epoch == 0:
+                    background.add(X.iloc[train])
+                train = rng.permutation(train)
+                model.partial_fit(X.iloc[train], y[train], classes=classes)
+            rows += len(X)
+            i += 1
+            if progress:
+                progress.update(i, rows=rows, epoch=epoch + 1)
+    return model
+
+def booster_params(model_key, params, n_classes):
+    params = dict(params)
+    rounds = int(params.pop("n_estimators", 100))
+    if model_key == "xgboost":
+        params.setdefault("tree_method", "hist")
+        params["objective"] = "binary:logistic" if n_classes == 2 else "multi:softprob"
+        if n_classes > 2:
+            params["num_class"] = n_classes
+    else:
+        params["objective"] = "binary" if n_classes == 2 else "multiclass"
+        params["verbose"] = -1
+        if n_classes > 2:
+            params["num_class"] = n_classes
+    return params, rounds
+
+def _fit_xgboost(params, chunks, classes, background, work_dir, progress=None):
+    import xgboost as xgb
+    params, rounds = booster_params("xgboost", params, len(classes))
+
+    class _ChunkIter(xgb.DataIter):
+        # feeds training rows chunk by chunk; xgboost pages them to cache_prefix
+        def __init__(self):
+            self._it = None
+            super().__init__(cache_prefix=os.path.join(work_dir, "xgb-cache"))
+
+        def next(self, input_data):
+            if self._it is None:
+                self._it = chunks()
+            for X, y, holdout in self._it:
+                _check_numeric(X)
+                train = ~holdout
+                if train.any():
+                    background.add(X[train])
+                    input_data(data=X[train], label=np.searchsorted(classes, y[train]))
+                    return True
+            return False
+
+        def reset(self):
+            self._it = None
+
+    dtrain = xgb.DMatrix(_ChunkIter())
+    callbacks = None
+    if progress:
+        from app.utils.progress import xgboost_callback
+        progress.begin("fit", total=rounds, unit="iteration")
+        callbacks = [xgboost_callback(progress)]
+    return xgb.train(params, dtrain, num_boost_round=rounds, callbacks=callbacks)
+
+def _fit_lightgbm(params, chunks, classes, background, work_dir, progress=None):
+    import lightgbm as lgb
+    params, rounds = booster_params("lightgbm", params, len(classes))
+    # stream the training rows into a file LightGBM bins in two passes
+    train_path = os.path.join(work_dir, "lgb-train.csv")
+    header = True
+    for X, y, holdout in chunks():
+        _check_numeric(X)
+        train = ~holdout
+        if train.any():
+            background.add(X[train])
+            # LightGBM's CSV parser rejects True/False (onehot dummies)
+            part = X[train].astype({c: np.uint8 for c, t in X.dtypes.items() if pd.api.types.is_bool_dtype(t)})
+            part.insert(0, "__label__", np.searchsorted(classes, y[train]))
+            part.to_csv(train_path, mode="w" if header else "a", header=header, index=False)
+            header = False
+    dtrain = lgb.Dataset(train_path, params={"header": True, "label_column": "name:__label__", "two_round": True})
+    callbacks = None
+    if progress:
+        from app.utils.progress import lightgbm_callback
+        progress.begin("fit", total=rounds, unit="iteration")
+        callbacks = [lightgbm_callback(progress)]
+    return lgb.train(params, dtrain, num_boost_round=rounds, callbacks=callbacks)
+
+def _predict(model, X, classes):
+    # returns (hard predictions, scores aligned with classes)
+    if hasattr(model, "partial_fit"):
+        preds = model.predict(X)
+        scores = model.predict_proba(X) if hasattr(model, "predict_proba") else model.decision_function(X)
+        return preds, scores
+    if model.__class__.__module__.startswith("xgboost"):
+        import xgboost as xgb
+        X = xgb.DMatrix(X)
+    scores = np.asarray(model.predict(X))
+    if scores.ndim == 1:
+        scores = np.c_[1 - scores, scores]
+    return classes[scores.argmax(axis=1)], scores
+
+def train_out_of_core(session_id, path, target, model_key, user_params=None, test_size=0.2,
+                      random_state=42, chunksize=DEFAULT_CHUNKSIZE, progress=None):
+    if model_key not in OOC_MODELS:
+        raise ValueError(f"Model '{model_key}' has no out-of-core mode; choose from {sorted(OOC_MODELS)}")
+    from app.utils.models import MODEL_MAP, cast_params
+
+    start = time.perf_counter()
+    params = OOC_DEFAULT_PARAMS[model_key].copy()
+    if user_params:
+        params.update(cast_params(user_params, params))
+
+    work_dir = tempfile.mkdtemp(dir=session_dir(session_id))
+    try:
+        # the file is read once per pass; a link keeps this run's copy alive
+        # if the frame changes and the spill is deleted mid-run
+        data_path = os.path.join(work_dir, "data.csv")
+        try:
+            os.link(path, data_path)
+        except OSError:
+            data_path = path
+        classes = _scan_target(data_path, target, chunksize)
+        if len(classes) < 2:
+            raise ValueError("Target needs at least two classes")
+
+        def chunks():
+            return iter_chunks(data_path, target, test_size, random_state, chunksize)
+
+        background = _Reservoir(BACKGROUND_ROWS)
+        kind = OOC_MODELS[model_key]
+        if progress:
+            # boosters first stream the data into their own caches; the chunk
+            # count is unknown up front, so this stage reports no total
+            progress.begin("stream" if kind in ("xgboost", "lightgbm") else "fit", unit="chunk")
+        if kind == "xgboost":
+            model = _fit_xgboost(params, chunks, classes, background, work_dir, progress)
+        elif kind == "lightgbm":
+            model = _fit_lightgbm(params, chunks, classes, background, work_dir, progress)
+        else:
+            model = _fit_partial(model_key, params, chunks, classes, background, random_state, progress)
+        fit_ms = (time.perf_counter() - start) * 1000
+        if progress:
+            progress.begin("evaluate", unit="chunk")
+
+        # second streaming pass: score the holdout rows only
+        y_true, y_pred, y_score = [], [], []
+        explain = _Reservoir(EXPLAIN_ROWS)
+        for i, (X, y, holdout) in enumerate(chunks(), 1):
+            if holdout.any():
+                preds, scores = _predict(model, X[holdout], classes)
+                y_true.append(y[holdout])
+                y_pred.append(preds)
+                y_score.append(scores)
+                explain.add(X[holdout])
+            if progress:
+                progress.update(i)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if not y_true:
+        raise ValueError("Holdout split is empty; increase test_size")
+    scores, cm, evaluation = evaluate_classifier(
+        np.concatenate(y_true), np.concatenate(y_pred), np.concatenate(y_score), classes
+    )
+    total_ms = (time.perf_counter() - start) * 1000
+    print(f"Out-of-core {model_key} (fit {fit_ms:.0f} ms, total {total_ms:.0f} ms): " + ", ".join(f"{k}: {v}" for k, v in scores.items()))
+
+    artifacts = {
+        "model": model,
+        "X_train": background.frame(),
+        "X_test": explain.frame(),
+        "timings": {"fit_ms": round(fit_ms, 2), "total_ms": round(total_ms, 2)},
+    }
+    # boosters are recorded under their sklearn names, like the in-memory runs
+    name = MODEL_MAP[model_key].rpartition(".")[2] if kind in ("xgboost", "lightgbm") else model.__class__.__name__
+    return name, params, scores, cm, evaluation, artifacts
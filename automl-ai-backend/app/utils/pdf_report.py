@@ -1,3 +1,4 @@
+import io
 from reportlab.lib.pagesizes import LETTER
 from reportlab.lib.units import inch
 from reportlab.lib import colors
@@ -9,7 +10,8 @@ from reportlab.platypus import (
 
 
 class PDFReport:
-    def __init__(self, filename: str, title: str = "AutoML-AI Report"):
+    def __init__(self, filename, title: str = "AutoML-AI Report"):
+        # filename can be a path or a file-like object (e.g. BytesIO)
         self.filename = filename
         self.doc = SimpleDocTemplate(
             filename, pagesize=LETTER,
@@ -59,6 +61,13 @@ class PDFReport:
         self.elements.append(tbl)
         self.elements.append(Spacer(1, 0.2 * inch))
 
+    def add_image(self, data: bytes, width: float = 5.5 * inch):
+        from reportlab.lib.utils import ImageReader
+        from reportlab.platypus import Image
+        w, h = ImageReader(io.BytesIO(data)).getSize()
+        self.elements.append(Image(io.BytesIO(data), width=width, height=width * h / w))
+        self.elements.append(Spacer(1, 0.2 * inch))
+
     def build(self):
         def _footer(canvas, doc):
             canvas.saveState()
@@ -0,0 +1,268 @@
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from app.utils.balancing import balance
+from app.utils.preprocessing import apply_encoding, map_column_blocks, scale_column, skew_column
+
+# Deferred clean/transform: requests append ops to a per-session plan instead
+# of rewriting the frame. optimize() turns the recorded ops into the stages
+# that actually run; execute() runs them on a sample for previews and on the
+# full frame when training or exporting needs the data.
+#
+# op shapes:
+#   {"op": "fill", "columns": [c], "strategy": "mean"|"median"|"mode"}
+#   {"op": "dropna", "columns": [c]}
+#   {"op": "drop", "columns": [...]}
+#   {"op": "encode", "method": m, "columns": [...]}
+#   {"op": "skew", "method": m, "columns": [...]}
+#   {"op": "scale", "method": m, "columns": [...]}
+#   {"op": "balance", "method": m}
+#   {"op": "target_last"}
+
+PREVIEW_ROWS = 5_000
+MAX_PREVIEW_ROWS = 100_000  # largest sample a dry run may ask for
+
+FUSABLE_OPS = {"fill", "skew", "scale"}
+# encodings that map one column to itself; onehot replaces the column
+COLUMNWISE_ENCODINGS = {"label", "ordinal", "binary"}
+
+def clean_ops(fill_strategies: dict) -> list:
+    # drops first, like impute(): fill values are computed on the kept rows
+    drops = [c for c, strategy in fill_strategies.items() if strategy == "drop"]
+    ops = [{"op": "dropna", "columns": drops}] if drops else []
+    for col, strategy in fill_strategies.items():
+        if strategy != "drop":
+            ops.append({"op": "fill", "columns": [col], "strategy": strategy})
+    return ops
+
+def transform_ops(payload, target) -> list:
+    # same order transform_data applies them in
+    ops = []
+    drop = [c for c in payload.drop_columns or [] if c != target]
+    if drop:
+        ops.append({"op": "drop", "columns": drop})
+    if payload.encoding and payload.encoding != "none":
+        ops.append({"op": "encode", "method": payload.encoding, "columns": list(payload.encoding_columns or [])})
+    if payload.skewness and payload.skewness != "none":
+        ops.append({"op": "skew", "method": payload.skewness, "columns": list(payload.skewness_columns or [])})
+    if payload.scaling and payload.scaling != "none":
+        ops.append({"op": "scale", "method": payload.scaling, "columns": list(payload.scaling_columns or [])})
+    if payload.balancing and payload.balancing != "none":
+        ops.append({"op": "balance", "method": payload.balancing})
+    ops.append({"op": "target_last"})
+    return ops
+
+def _needs_column(op, col):
+    # ops a drop of `col` cannot move above: row filters on it, resampling
+    # (uses every feature) and encoders that add columns. A onehot may be what
+    # creates `col` (e.g. "c_y"), so a drop never moves past one.
+    if op["op"] == "balance":
+        return True
+    if op["op"] == "dropna":
+        return col in op["columns"]
+    if op["op"] == "encode" and op["method"] not in COLUMNWISE_ENCODINGS:
+        return True
+    return False
+
+def _is_columnwise(op):
+    return op["op"] in FUSABLE_OPS or (op["op"] == "encode" and op["method"] in COLUMNWISE_ENCODINGS)
+
+def optimize(ops: list) -> list:
+    ops = [{**op, "columns": list(op["columns"])} if "columns" in op else dict(op) for op in ops]
+
+    # 1. column pruning: every dropped column moves up to just after the last op
+    # that still needs it, and column-wise ops on it in between are dead
+    hoisted = {}   # insert position -> columns dropped there
+    for i, op in enumerate(ops):
+        if op["op"] != "drop":
+            continue
+        for col in op["columns"]:
+            j = i - 1
+            while j >= 0 and not _needs_column(ops[j], col):
+                if _is_columnwise(ops[j]) and col in ops[j]["columns"]:
+                    ops[j]["columns"].remove(col)
+                j -= 1
+            hoisted.setdefault(j + 1, []).append(col)
+    pruned = []
+    for i, op in enumerate(ops):
+        if i in hoisted:
+            pruned.append({"op": "drop", "columns": hoisted[i]})
+        if op["op"] == "drop" or ("columns" in op and op["op"] != "drop" and not op["columns"]):
+            continue
+        pruned.append(op)
+
+    # 2. fusion: runs of fill/skew/scale become one per-column chain, executed
+    # as a single in-place pass over each column. Moving the target last only
+    # affects column order, so it is done once at the end instead.
+    stages = []
+    reorder = False
+    for op in pruned:
+        if op["op"] == "target_last":
+            reorder = True
+        elif op["op"] in FUSABLE_OPS:
+            if not stages or stages[-1]["op"] != "fused":
+                stages.append({"op": "fused", "chains": {}})
+            step = op.get("strategy") if op["op"] == "fill" else op["method"]
+            for col in op["columns"]:
+                stages[-1]["chains"].setdefault(col, []).append((op["op"], step))
+        elif op["op"] == "drop" and stages and stages[-1]["op"] == "drop":
+            stages[-1]["columns"] += op["columns"]
+        else:
+            stages.append(op)
+    if reorder:
+        stages.append({"op": "target_last"})
+    return stages
+
+def _fill_value(x: np.ndarray, strategy: str):
+    if strategy == "mean":
+        return np.nanmean(x)
+    if strategy == "median":
+        return np.nanmedian(x)
+    if strategy == "mode":
+        mode = pd.Series(x).mode()
+        return mode.iloc[0] if len(mode) else np.nan
+    raise ValueError(f"Unknown strategy '{strategy}'")
+
+def _run_chain(series: pd.Series, steps: list):
+    # returns (column, fitted params of its skew/scale steps)
+    if not pd.api.types.is_numeric_dtype(series):
+        # only fills make sense on non-numeric columns; pandas handles those
+        if any(kind != "fill" for kind, _ in steps):
+            raise ValueError(f"Column '{series.name}' is not numeric")
+        for _, strategy in steps:
+            if strategy == "mode":
+                mode = series.mode()
+                series = series.fillna(mode.iloc[0]) if len(mode) else series
+            else:
+                series = series.fillna(getattr(series, strategy)())
+        return series, []
+    if all(kind == "fill" for kind, _ in steps) and not series.isna().any():
+        return series, []
+    x = series.to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    fitted = []
+    for kind, step in steps:
+        if kind == "fill":
+            missing = np.isnan(x)
+            if missing.any():
+                x[missing] = _fill_value(x, step)
+            continue
+        x, params = (skew_column if kind == "skew" else scale_column)(x, step)
+        fitted.append({"step": f"{kind}:{step}", **params})
+    return x, fitted
+
+def execute(df: pd.DataFrame, stages: list, target: str = None):
+    # returns (frame, per-stage report); the input frame is never modified
+    report = []
+    df = df.copy(deep=False)
+    for stage in stages:
+        start = time.perf_counter()
+        kind = stage["op"]
+        if kind == "drop":
+            df = df.drop(columns=stage["columns"], errors="ignore")
+        elif kind == "dropna":
+            df = df.dropna(subset=stage["columns"])
+        elif kind == "fused":
+            def _chains(cols, frame=df):
+                return [(col, *_run_chain(frame[col], stage["chains"][col])) for col in cols]
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                blocks = map_column_blocks(_chains, list(stage["chains"]))
+            fitted = {}
+            for block in blocks:
+                for col, values, params in block:
+                    df[col] = values
+                    if params:
+                        fitted[col] = params
+        elif kind == "encode":
+            df = apply_encoding(df, stage["method"], stage["columns"])
+        elif kind == "balance":
+            X, y, balancing = balance(df.drop(columns=[target]), df[target], stage["method"])
+            df = pd.concat([X, y], axis=1)
+        elif kind == "target_last":
+            if target in df.columns:
+                df = df[[c for c in df.columns if c != target] + [target]]
+        report.append({
+            "stage": kind,
+            "columns": len(stage["chains"]) if kind == "fused" else len(stage.get("columns", [])),
+            "rows": int(len(df)),
+            "ms": round((time.perf_counter() - start) * 1000, 2),
+        })
+        if kind == "fused" and fitted:
+            report[-1]["fitted"] = fitted
+        elif kind == "balance":
+            report[-1]["balancing"] = balancing
+    return df, report
+
+def describe(stages: list) -> list:
+    # JSON-friendly view of an optimized plan
+    out = []
+    for stage in stages:
+        if stage["op"] == "fused":
+            out.append({"op": "fused", "chains": {c: [f"{k}:{s}" for k, s in steps] for c, steps in stage["chains"].items()}})
+        else:
+            out.append(stage)
+    return out
+
+def stratified_sample(df: pd.DataFrame, target: str = None, n: int = PREVIEW_ROWS, random_state: int = 42):
+    # n rows keeping the class mix of `target` (plain random rows when there is
+    # no usable target); original row order is kept
+    if len(df) <= n:
+        return df
+    if target in df.columns and df[target].nunique(dropna=False) <= n // 2:
+        sample = df.groupby(target, group_keys=False, dropna=False).sample(frac=n / len(df), random_state=random_state)
+    else:
+        sample = df.sample(n, random_state=random_state)
+    return sample.sort_index()
+
+def profile(df: pd.DataFrame) -> dict:
+    columns = {}
+    for col in df.columns:
+        s = df[col]
+        info = {"dtype": str(s.dtype), "nulls": int(s.isna().sum()), "unique": int(s.nunique())}
+        if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s) and not isinstance(s.dtype, pd.SparseDtype):
+            x = s.to_numpy(dtype=np.float64, na_value=np.nan)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                stats = {"mean": np.nanmean(x), "std": np.nanstd(x), "min": np.nanmin(x), "max": np.nanmax(x)} if len(x) else {}
+            info.update({k: None if not np.isfinite(v) else round(float(v), 4) for k, v in stats.items()})
+        columns[str(col)] = info
+    return {
+        "rows": int(len(df)),
+        "columns": int(df.shape[1]),
+        "memory_bytes": int(df.memory_usage(deep=True).sum()),
+        "nulls": int(sum(c["nulls"] for c in columns.values())),
+        "column_profiles": columns,
+    }
+
+def dry_run(df: pd.DataFrame, pending: list, ops: list, target: str = None,
+            sample_size: int = PREVIEW_ROWS, random_state: int = 42) -> dict:
+    # Runs `ops` on top of the pending plan over a stratified sample and scales
+    # what was measured up to the full frame. Nothing in the session changes.
+    # Projections are linear in rows, which slightly flatters SMOTE.
+    sample = stratified_sample(df, target, sample_size, random_state)
+    before = execute(sample, optimize(pending), target)[0] if pending else sample
+    stages = optimize(ops)
+    start = time.perf_counter()
+    after, report = execute(before, stages, target)
+    ms = (time.perf_counter() - start) * 1000
+    before_profile, after_profile = profile(before), profile(after)
+    scale = len(df) / max(len(sample), 1)
+    return {
+        "sample_rows": int(len(sample)),
+        "full_rows": int(len(df)),
+        "stratified_on": target if target in df.columns else None,
+        "before": before_profile,
+        "after": after_profile,
+        "plan": describe(stages),
+        "report": report,
+        "sample_ms": round(ms, 2),
+        "projected": {
+            "rows": int(round(len(after) * scale)),
+            "runtime_ms": round(ms * scale, 1),
+            "memory_bytes": int(after_profile["memory_bytes"] * scale),
+            # input and output frames are both alive while the step runs
+            "peak_bytes": int((before_profile["memory_bytes"] + after_profile["memory_bytes"]) * scale),
+        },
+        "preview": after.head(5),
+    }
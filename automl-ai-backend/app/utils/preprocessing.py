@@ -1,100 +1,244 @@
+import os
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from sklearn.preprocessing import StandardScaler, MinMaxScaler, LabelEncoder, OrdinalEncoder, RobustScaler, MaxAbsScaler, PowerTransformer, QuantileTransformer
-from scipy.stats import boxcox, yeojohnson
 import numpy as np
-from imblearn.over_sampling import SMOTE
-from imblearn.under_sampling import RandomUnderSampler
 
-def apply_encoding(df: pd.DataFrame, method: str, cat_columns: list) -> pd.DataFrame:
+# sklearn and scipy are imported inside each function so the
+# server can start answering before they are loaded
+
+# one-hot blocks wider than this are stored as sparse columns instead of dense dummies
+SPARSE_ONEHOT_MIN_COLUMNS = 256
+
+# skew/scaling passes hand columns to worker threads in blocks of this many;
+# numpy and scipy release the GIL for the heavy parts
+COLUMN_BLOCK = 16
+_column_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="columns")
+
+def _ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+def impute(df: pd.DataFrame, fill_strategies: dict):
+    # One pass per phase: a single null scan, every "drop" column folded into
+    # one row mask, fill values computed per strategy over all its columns at
+    # once, then a single fillna on the new frame. Drops happen before the fill
+    # statistics are computed, whatever order the strategies were given in.
+    # Returns (new frame, report with null counts and per-phase timings).
+    timings = {}
+    start = time.perf_counter()
+    missing = [c for c in fill_strategies if c not in df.columns]
+    if missing:
+        raise ValueError(f"Columns not found: {missing}")
+    by_strategy = {}
+    for col, strategy in fill_strategies.items():
+        if strategy not in ("mean", "median", "mode", "drop"):
+            raise ValueError(f"Unknown strategy '{strategy}'")
+        by_strategy.setdefault(strategy, []).append(col)
+
+    t = time.perf_counter()
+    nulls = df.isna().to_numpy()
+    before = nulls.sum(axis=0)
+    timings["scan_ms"] = _ms(t)
+
+    t = time.perf_counter()
+    drop_cols = [df.columns.get_loc(c) for c in by_strategy.get("drop", [])]
+    keep = ~nulls[:, drop_cols].any(axis=1) if drop_cols else None
+    out = df[keep] if keep is not None and not keep.all() else df.copy(deep=False)
+    timings["drop_ms"] = _ms(t)
+
+    t = time.perf_counter()
+    values = {}
+    for strategy in ("mean", "median"):
+        cols = [c for c in by_strategy.get(strategy, []) if out[c].isna().any()]
+        if cols:
+            try:
+                values.update(getattr(out[cols], strategy)().to_dict())
+            except TypeError:
+                raise ValueError(f"{strategy} needs numeric columns: {cols}")
+    for col in by_strategy.get("mode", []):
+        if out[col].isna().any():
+            mode = out[col].mode()
+            if len(mode):
+                values[col] = mode.iloc[0]
+    values = {c: v for c, v in values.items() if not pd.isna(v)}
+    timings["stats_ms"] = _ms(t)
+
+    t = time.perf_counter()
+    if values:
+        # a new frame, never an in-place fill: `df` is the session's previous
+        # version (under copy-on-write only the filled columns are copied)
+        out = out.fillna(value=values)
+    timings["fill_ms"] = _ms(t)
+
+    # nulls left afterwards follow from the scan: rows kept, filled columns cleared
+    after = nulls[keep].sum(axis=0) if keep is not None else before.copy()
+    for col in values:
+        after[df.columns.get_loc(col)] = 0
+    timings["total_ms"] = _ms(start)
+    report = {
+        "before_nulls": {str(c): int(n) for c, n in zip(df.columns, before)},
+        "after_nulls": {str(c): int(n) for c, n in zip(df.columns, after)},
+        "dropped_rows": int(len(df) - len(out)),
+        "fill_values": values,
+        "timings": timings,
+    }
+    print(f"Imputed {len(values)} columns, dropped {report['dropped_rows']} rows in {timings['total_ms']} ms")
+    return out, report
+
+def label_codes(s: pd.Series) -> np.ndarray:
+    # LabelEncoder-compatible codes (sorted string categories) without fitting an encoder
+    if isinstance(s.dtype, pd.CategoricalDtype) and not s.isna().any():
+        cats = s.cat.categories
+        if cats.inferred_type == "string" and cats.is_monotonic_increasing:
+            return s.cat.codes.to_numpy()
+    return pd.factorize(s.astype(str), sort=True, use_na_sentinel=False)[0]
+
+def onehot_csr(s: pd.Series, drop_first: bool = True):
+    # (CSR matrix, column names) matching pd.get_dummies(drop_first=...); NaN rows stay all-zero
+    from scipy import sparse
+    codes, uniques = pd.factorize(s, sort=True)
+    first = 1 if drop_first else 0
+    keep = codes >= first
+    matrix = sparse.csr_matrix(
+        (np.ones(int(keep.sum()), dtype=np.uint8), (np.flatnonzero(keep), codes[keep] - first)),
+        shape=(len(s), max(len(uniques) - first, 0)),
+    )
+    return matrix, [f"{s.name}_{u}" for u in uniques[first:]]
+
+def apply_encoding(df: pd.DataFrame, method: str, cat_columns: list, sparse: bool = None) -> pd.DataFrame:
+    # sparse: one-hot as pandas sparse columns; None picks sparse for wide outputs
     print(f"Applying {method} encoding to columns: {cat_columns}")
     if not cat_columns:
         print("No categorical columns provided for encoding.")
         return df
     try:
-        df = df.copy()
+        df = df.copy(deep=False)
         if method == "label":
             for col in cat_columns:
-                df[col] = LabelEncoder().fit_transform(df[col].astype(str))
+                df[col] = label_codes(df[col])
         elif method == "onehot":
-            df = pd.get_dummies(df, columns=cat_columns, drop_first=True)
+            width = sum(int(df[col].nunique()) for col in cat_columns)
+            if sparse is None:
+                sparse = width > SPARSE_ONEHOT_MIN_COLUMNS
+            if not sparse:
+                df = pd.get_dummies(df, columns=cat_columns, drop_first=True)
+            else:
+                blocks = []
+                for col in cat_columns:
+                    matrix, names = onehot_csr(df[col])
+                    blocks.append(pd.DataFrame.sparse.from_spmatrix(matrix, index=df.index, columns=names))
+                df = pd.concat([df.drop(columns=cat_columns)] + blocks, axis=1)
+                print(f"One-hot encoded {width} categories into sparse columns")
         elif method == "ordinal":
             for col in cat_columns:
-                df[col] = OrdinalEncoder().fit_transform(df[[col]])
+                # OrdinalEncoder order; missing values stay NaN
+                codes = pd.factorize(df[col], sort=True)[0].astype(np.float64)
+                codes[codes < 0] = np.nan
+                df[col] = codes
         elif method == "binary":
             for col in cat_columns:
-                df[col] = df[col].apply(lambda x: 1 if x == 'yes' else 0)
+                df[col] = (df[col] == 'yes').astype(np.int64)
         print(f"Applied {method} encoding to columns: {cat_columns}")
         return df
     except Exception as e:
         print(f"Error during encoding: {e} - {method} encoding failed.")
         raise ValueError(f"Unknown encoding method: {method}")
 
-def apply_scaling(df: pd.DataFrame, method: str, columns: list) -> pd.DataFrame:
-    try:    
-        df = df.copy()
-        if method == "standard":
-            scaler = StandardScaler()
-        elif method == "minmax":
-            scaler = MinMaxScaler()
-        elif method == "robust":
-            scaler = RobustScaler()
-        elif method == "maxabs":
-            scaler = MaxAbsScaler()
-        df[columns] = scaler.fit_transform(df[columns])
-        print(f"Applied {method} scaling to columns: {columns}")
-        return df
-    except Exception as e:
-        print(f"Error during scaling: {e} - {method} scaling failed.")
+def scale_column(x: np.ndarray, method: str, fitted: dict = None):
+    # scales x in place with the sklearn scaler statistics (NaNs ignored, zero
+    # ranges left unscaled); returns (x, {"center", "scale"}) for replaying
+    if fitted:
+        center, scale = fitted["center"], fitted["scale"]
+    elif method == "standard":
+        center, scale = np.nanmean(x), np.nanstd(x)
+    elif method == "minmax":
+        center, scale = np.nanmin(x), np.nanmax(x) - np.nanmin(x)
+    elif method == "robust":
+        q25, center, q75 = np.nanpercentile(x, [25, 50, 75])
+        scale = q75 - q25
+    elif method == "maxabs":
+        center, scale = 0.0, np.nanmax(np.abs(x))
+    else:
         raise ValueError(f"Unknown scaling method: {method}")
+    scale = float(scale) if scale and np.isfinite(scale) else 1.0
+    x -= center
+    x /= scale
+    return x, {"center": float(center), "scale": scale}
 
-def apply_balancing(X: pd.DataFrame, y: pd.Series, method: str):
-    try:
-        counts = y.value_counts()
-        min_class = counts.idxmin()
-        min_count = counts[min_class]
-        print(f"Class distribution before balancing: {counts.to_dict()}")
-        print(f"Minority class: {min_class} with {min_count} samples.")
-        print(f"Balancing method: {method}")
-
-        if method == "smote":
-            if min_count < 2:
-                raise ValueError("Not enough samples in minority class to apply SMOTE.")
-            k = max(1, min(min_count - 1, 5))  # Adjust k_neighbors to available samples
-            sm = SMOTE(random_state=42, k_neighbors=k)
-            X, y = sm.fit_resample(X, y)
-            print(f"Applied SMOTE with k_neighbors={k}.")
-            print(f"Class distribution after balancing: {y.value_counts().to_dict()}")
-            return sm.fit_resample(X, y)
-
-        elif method == "undersample":
-            rus = RandomUnderSampler(random_state=42)
-            X, y = rus.fit_resample(X, y)
-            print(f"Applied RandomUnderSampler.")
-            print(f"Class distribution after balancing: {y.value_counts().to_dict()}")
-            return rus.fit_resample(X, y)
+def skew_column(x: np.ndarray, method: str, fitted: dict = None):
+    # log/sqrt work in place; boxcox/yeojohnson return a new array and the
+    # fitted lambda, which `fitted` replays instead of refitting
+    if method == "log":
+        np.clip(x, 0, None, out=x)
+        return np.log1p(x, out=x), {}
+    if method == "sqrt":
+        np.clip(x, 0, None, out=x)
+        return np.sqrt(x, out=x), {}
+    from scipy.stats import boxcox, yeojohnson
+    lmbda = fitted.get("lambda") if fitted else None
+    if method == "boxcox":
+        x = np.clip(x, 1e-5, None)
+        if lmbda is None:
+            x, lmbda = boxcox(x)
+        else:
+            x = boxcox(x, lmbda)
+    elif method == "yeojohnson":
+        if lmbda is None:
+            x, lmbda = yeojohnson(x)
+        else:
+            x = yeojohnson(x, lmbda)
+    else:
+        raise ValueError(f"Unknown skewness correction method: {method}")
+    return x, {"lambda": float(lmbda)}
 
-    except Exception as e:
-        print(f"Error during balancing: {e} - {method} balancing failed.")
-        raise ValueError(f"Unknown balancing method: {method}")
-
-def apply_skewness_fix(df: pd.DataFrame, method: str, columns: list) -> pd.DataFrame:
-    df = df.copy()
-    print(f"Applying skewness fix using {method} on columns: {columns}")
-    print(f"Before skewness fix, columns: {df[columns].skew()}")
-    for col in columns:
-        try:
-            if method == "log":
-                df[col] = np.log1p(df[col].clip(lower=0))
-            elif method == "boxcox":
-                df[col], _ = boxcox(df[col].clip(lower=1e-5)) 
-            elif method == "yeojohnson":
-                df[col], _ = yeojohnson(df[col])
-            elif method == "sqrt":
-                df[col] = np.sqrt(df[col].clip(lower=0))
-            print(f"Applied {method} skewness correction to {col}.")
-        except Exception as e:
-            print(f"Skewness fix failed for {col}: {e}")
-            raise ValueError(f"Unknown skewness correction method: {method}")
-    print(f"Applied {method} skewness correction to: {columns}")
-    print(f"After skewness fix, columns: {df[columns].skew()}")
-    return df
\ No newline at end of file
+def map_column_blocks(fn, items: list) -> list:
+    # fn(block of items) for every COLUMN_BLOCK-sized block, on the column pool
+    blocks = [items[i:i + COLUMN_BLOCK] for i in range(0, len(items), COLUMN_BLOCK)]
+    if len(blocks) <= 1:
+        return [fn(b) for b in blocks]
+    return list(_column_pool.map(fn, blocks))
+
+def transform_columns(df: pd.DataFrame, columns: list, column_fn, method: str, fitted: dict = None):
+    # Runs column_fn over each column of a preallocated float64 array (Fortran
+    # order, so every column is contiguous), block by block on the column pool.
+    # Returns (new frame, {column: fitted params}).
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Columns not found: {missing}")
+    fitted = fitted or {}
+    out = np.empty((len(df), len(columns)), dtype=np.float64, order="F")
+
+    def _block(indices):
+        params = {}
+        for j in indices:
+            col = columns[j]
+            x = out[:, j]
+            x[:] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            try:
+                result, params[col] = column_fn(x, method, fitted.get(col))
+            except Exception as e:
+                raise ValueError(f"{method} failed for column '{col}': {e}")
+            if result is not x:
+                x[:] = result
+        return params
+
+    params = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for block_params in map_column_blocks(_block, list(range(len(columns)))):
+            params.update(block_params)
+    df = df.copy(deep=False)
+    for j, col in enumerate(columns):
+        df[col] = out[:, j]
+    return df, params
+
+def fit_scaling(df: pd.DataFrame, method: str, columns: list, fitted: dict = None):
+    df, params = transform_columns(df, columns, scale_column, method, fitted)
+    print(f"Applied {method} scaling to {len(columns)} columns")
+    return df, params
+
+def fit_skewness(df: pd.DataFrame, method: str, columns: list, fitted: dict = None):
+    df, params = transform_columns(df, columns, skew_column, method, fitted)
+    print(f"Applied {method} skewness correction to {len(columns)} columns")
+    return df, params
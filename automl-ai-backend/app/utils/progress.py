@@ -0,0 +1,117 @@
+import asyncio, itertools, threading, time
+from collections import defaultdict
+
+PROGRESS_MIN_INTERVAL = 0.1   # seconds between throttled progress events of one job
+QUEUE_SIZE = 1000             # events buffered per subscriber before new ones are dropped
+
+def _offer(queue: asyncio.Queue, event: dict):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
+
+class ProgressBus:
+    # In-process pub/sub keyed by channel (the session id). Training threads
+    # publish; SSE handlers subscribe with an asyncio queue on the server loop.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(list)   # channel -> [(loop, queue)]
+        self._active = defaultdict(dict)        # channel -> {job: last event}
+
+    def publish(self, channel: str, event: dict):
+        with self._lock:
+            if event["type"] in ("done", "error"):
+                self._active[channel].pop(event["job"], None)
+            else:
+                self._active[channel][event["job"]] = event
+            subscribers = list(self._subscribers[channel])
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # loop already closed
+                pass
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        queue = asyncio.Queue(QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[channel].append((asyncio.get_running_loop(), queue))
+            # a late subscriber starts from the latest state of running jobs
+            for event in self._active[channel].values():
+                _offer(queue, event)
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers[channel] = [s for s in self._subscribers[channel] if s[1] is not queue]
+            if not self._subscribers[channel]:
+                del self._subscribers[channel]
+
+progress_bus = ProgressBus()
+_job_ids = itertools.count(1)
+
+class ProgressReporter:
+    # One training job's view of the bus. A job moves through stages
+    # (dataset, fit, cv, trial, evaluate, ...); each stage can have a total
+    # and a unit (iteration, fold, trial, chunk) that ETA and throughput use.
+    def __init__(self, channel: str, model_key: str, bus: ProgressBus = None):
+        self.bus = bus or progress_bus
+        self.channel = channel
+        self.model_key = model_key
+        self.job = next(_job_ids)
+        self.started = time.perf_counter()
+        self.stage, self.total, self.unit = None, None, None
+        self._stage_start = self.started
+        self._last_emit = 0.0
+
+    def _emit(self, type_: str, **data):
+        self.bus.publish(self.channel, {
+            "type": type_,
+            "job": self.job,
+            "model_key": self.model_key,
+            "stage": self.stage,
+            "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            **data,
+        })
+
+    def begin(self, stage: str, total: int = None, unit: str = "iteration"):
+        self.stage, self.total, self.unit = stage, total, unit
+        self._stage_start = time.perf_counter()
+        self._last_emit = 0.0
+        self._emit("stage", total=total, unit=unit)
+
+    def update(self, done: int, force: bool = False, **extra):
+        now = time.perf_counter()
+        last = self.total is not None and done >= self.total
+        if not (force or last) and now - self._last_emit < PROGRESS_MIN_INTERVAL:
+            return
+        self._last_emit = now
+        elapsed = now - self._stage_start
+        rate = done / elapsed if elapsed > 0 and done else None
+        eta_ms = None
+        if rate and self.total is not None:
+            eta_ms = round(max(self.total - done, 0) / rate * 1000, 1)
+        self._emit("progress", done=done, total=self.total, unit=self.unit,
+                   rate_per_sec=round(rate, 2) if rate else None, eta_ms=eta_ms, **extra)
+
+    def done(self, **result):
+        self.stage = "done"
+        self._emit("done", **result)
+
+    def error(self, message: str):
+        self._emit("error", error=message)
+
+def xgboost_callback(reporter: ProgressReporter):
+    import xgboost as xgb
+
+    class _Progress(xgb.callback.TrainingCallback):
+        def after_iteration(self, model, epoch, evals_log):
+            reporter.update(epoch + 1)
+            return False
+
+    return _Progress()
+
+def lightgbm_callback(reporter: ProgressReporter):
+    def _progress(env):
+        reporter.update(env.iteration - env.begin_iteration + 1)
+    return _progress
@@ -1,18 +1,26 @@
-from supabase import create_client
 from dotenv import load_dotenv
 load_dotenv()
 import os
+from functools import lru_cache
 from app.utils.sanitize_np import sanitize_numpy
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SERVICE_ROLE = os.getenv("SUPABASE_KEY")
 ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 
-client = create_client(SUPABASE_URL, SERVICE_ROLE)
-anon_client = create_client(SUPABASE_URL, ANON_KEY)
+# Clients are created on first use rather than at import time
+@lru_cache(maxsize=None)
+def get_client():
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SERVICE_ROLE)
+
+@lru_cache(maxsize=None)
+def get_anon_client():
+    from supabase import create_client
+    return create_client(SUPABASE_URL, ANON_KEY)
 
 def save_job_record(session_id, user_id, filename, df_shape, pipeline_steps, model_config, metrics):
-    return client.table("ml_jobs").upsert({
+    return get_client().table("ml_jobs").upsert({
         "id": str(session_id),
         "user_id": str(user_id),
         "filename": str(filename),
@@ -24,4 +32,4 @@ def save_job_record(session_id, user_id, filename, df_shape, pipeline_steps, mod
     }).execute()
 
 def get_user_jobs(user_id: str):
-    return client.table("ml_jobs").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
\ No newline at end of file
+    return get_client().table("ml_jobs").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
\ No newline at end of file
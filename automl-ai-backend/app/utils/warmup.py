@@ -0,0 +1,56 @@
+import importlib, os, threading, time
+
+# Heavy libraries the routes import on first use. They are loaded in a
+# background thread once the server is up, so /ping answers immediately and
+# the first real request usually finds them already imported.
+WARM_MODULES = [
+    "sklearn.model_selection",
+    "sklearn.metrics",
+    "sklearn.ensemble",
+    "sklearn.preprocessing",
+    "scipy.stats",
+    "matplotlib.pyplot",
+    "seaborn",
+    "sklearn.neighbors",
+    "xgboost",
+    "lightgbm",
+    "reportlab.platypus",
+    "nbformat",
+    "supabase",
+    "shap",
+]
+
+startup_timings = {
+    "app_import_ms": None,
+    "warmup_ms": {},
+    "warmup_total_ms": None,
+    "warmup_done": False,
+}
+
+def _prime_matplotlib():
+    # matplotlib looks at sys.modules["IPython"] once, on the first canvas it
+    # creates; do that before shap starts importing IPython on this thread
+    import matplotlib.pyplot as plt
+    plt.close(plt.figure())
+
+def warm_imports(modules=WARM_MODULES):
+    start = time.perf_counter()
+    for name in modules:
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            if name == "matplotlib.pyplot":
+                _prime_matplotlib()
+        except Exception as e:
+            print(f"[WARN] Warm-up import of {name} failed: {e}")
+            continue
+        startup_timings["warmup_ms"][name] = round((time.perf_counter() - t0) * 1000, 1)
+    startup_timings["warmup_total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    startup_timings["warmup_done"] = True
+    print(f"Warm-up imports finished in {startup_timings['warmup_total_ms']} ms")
+
+def start_background_warmup():
+    # WARM_IMPORTS=0 keeps everything lazy (e.g. for short-lived workers)
+    if os.getenv("WARM_IMPORTS", "1") == "0":
+        return
+    threading.Thread(target=warm_imports, name="import-warmup", daemon=True).start()
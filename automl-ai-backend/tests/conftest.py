@@ -0,0 +1,50 @@
+import os, sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# app.main needs these at import; the tests never talk to Supabase or Groq
+for key, value in {
+    "SUPABASE_URL": "https://example.supabase.co",
+    "SUPABASE_KEY": "test",
+    "SUPABASE_ANON_KEY": "test",
+    "GROQ_API_KEY": "test",
+    "MPLBACKEND": "Agg",
+    "WARM_IMPORTS": "0",
+}.items():
+    os.environ.setdefault(key, value)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as c:
+        yield c
+
+
+def make_frame(n=600, seed=0, ordered=False):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "a": rng.normal(size=n),
+        "b": rng.exponential(size=n),
+        "cat": rng.choice(["yes", "no"], n),
+        "col": rng.choice(list("pqr"), n),
+    })
+    df["target"] = (df["b"] + rng.normal(size=n) > 1).astype(int)
+    if ordered:
+        # label-sorted rows, like resampled output
+        df = df.sort_values("target", kind="stable").reset_index(drop=True)
+    return df
+
+
+def upload(client, df, target="target"):
+    r = client.post("/upload/file", files={"file": ("d.csv", df.to_csv(index=False).encode(), "text/csv")})
+    assert r.status_code == 200, r.text
+    sid = r.json()["session_id"]
+    r = client.post("/pipeline/clean", json={"session_id": sid, "target_column": target, "fill_strategies": {}})
+    assert r.status_code == 200, r.text
+    return sid
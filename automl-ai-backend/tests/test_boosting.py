@@ -0,0 +1,24 @@
+from conftest import make_frame
+from app.utils.boosting import MAX_CACHED_DATASETS, get_dataset
+
+
+def _xy():
+    df = make_frame().drop(columns=["cat", "col"])
+    return df.drop(columns=["target"]), df["target"]
+
+
+def test_dataset_cache_keeps_one_matrix_copy_and_is_bounded():
+    X, y = _xy()
+    cache = {}
+    xgb_entry, _ = get_dataset("xgboost", X, y, {}, cache)
+    assert "X" not in xgb_entry
+    lgb_entry, _ = get_dataset("lightgbm", X, y, {}, cache)
+    # the float32 matrix is kept once, for warm starts, not inside the Dataset too
+    assert lgb_entry["X"] is not None and lgb_entry["data"].data is None
+
+    for max_bin in (16, 32, 64):
+        get_dataset("xgboost", X, y, {"max_bin": max_bin}, cache)
+    assert len(cache) == MAX_CACHED_DATASETS
+    # most recently used entries survive
+    assert get_dataset("xgboost", X, y, {"max_bin": 64}, cache)[1]["cached"]
+    assert not get_dataset("lightgbm", X, y, {}, cache)[1]["cached"]
@@ -0,0 +1,15 @@
+from conftest import make_frame, upload
+from app.main import EXPOSE_HEADERS
+
+ORIGIN = {"Origin": "http://localhost:3000"}
+
+
+def test_custom_headers_are_exposed_explicitly(client):
+    sid = upload(client, make_frame())
+    r = client.post("/pipeline/data", json={"session_id": sid, "limit": 10, "format": "csv"}, headers=ORIGIN)
+    assert r.status_code == 200, r.text
+    exposed = {h.strip().lower() for h in r.headers["access-control-expose-headers"].split(",")}
+    assert "*" not in exposed
+    assert exposed == {h.lower() for h in EXPOSE_HEADERS}
+    sent = {h for h in r.headers if h.startswith("x-") or h == "content-disposition"}
+    assert sent and sent <= exposed
@@ -0,0 +1,59 @@
+import asyncio, time
+import pytest
+from conftest import make_frame, upload
+import app.routes.pipeline as pipeline
+
+
+def test_explanations_are_started_off_the_event_loop(client, monkeypatch):
+    submit = pipeline.submit_explanation
+    calls = []
+
+    def _submit(*args, **kwargs):
+        # submit_explanation may import shap; that must not block the loop
+        with pytest.raises(RuntimeError):
+            asyncio.get_running_loop()
+        calls.append(args[1])
+        return submit(*args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "submit_explanation", _submit)
+    sid = upload(client, make_frame().drop(columns=["cat", "col"]))
+    r = client.post("/pipeline/train", json={"session_id": sid, "model_key": "logistic"})
+    assert r.status_code == 200, r.text
+    r = client.post("/pipeline/explain", json={"session_id": sid})
+    assert r.status_code == 200, r.text
+    assert len(calls) == 2
+
+
+def _wait_for_explanation(client, sid, run_id):
+    for _ in range(200):
+        r = client.post("/pipeline/explain", json={"session_id": sid, "run_id": run_id})
+        if r.status_code != 200 or r.json()["status"] != "pending":
+            return r
+        time.sleep(0.05)
+    raise AssertionError("SHAP job did not finish")
+
+
+def test_only_recent_and_best_runs_keep_their_models(client):
+    from app.routes.upload import session_store
+    sid = upload(client, make_frame().drop(columns=["cat", "col"]))
+    n_runs = pipeline.KEPT_RUNS + 2
+    for depth in range(1, n_runs + 1):
+        r = client.post("/pipeline/train", json={"session_id": sid, "model_key": "decision_tree",
+                                                 "hyperparameters": {"max_depth": depth * 4}})
+        assert r.status_code == 200, r.text
+        _wait_for_explanation(client, sid, r.json()["run_id"])
+
+    entry = session_store[sid]
+    scores = {run["run_id"]: pipeline._run_score(run) for run in entry["meta"]["steps"]["train"]}
+    # the shallowest tree is the best run and is kept beside the latest ones
+    assert max(scores, key=scores.get) == 0
+    kept = {0, *range(n_runs - pipeline.KEPT_RUNS, n_runs)}
+    assert set(entry["explain"]) == kept
+    # every explanation finished, so no fitted model is held anymore
+    assert entry["models"] == {}
+    # finished explanations are still served; pruned runs are gone
+    for run_id in range(n_runs):
+        r = client.post("/pipeline/explain", json={"session_id": sid, "run_id": run_id})
+        assert r.status_code == (200 if run_id in kept else 404)
+        if run_id in kept:
+            assert r.json()["status"] == "done"
@@ -0,0 +1,54 @@
+import json, time
+from conftest import make_frame, upload
+from app.utils.export_utils import render_charts
+
+
+def test_rich_pdf_returns_its_chart_stats(client):
+    sid = upload(client, make_frame().drop(columns=["cat", "col"]))
+    r = client.post("/pipeline/train", json={"session_id": sid, "model_key": "logistic"})
+    assert r.status_code == 200, r.text
+    # the finished SHAP summary is part of the report, so wait for it first
+    for _ in range(100):
+        if client.post("/pipeline/explain", json={"session_id": sid}).json()["status"] != "pending":
+            break
+        time.sleep(0.1)
+
+    r = client.post("/export/pdf", json={"session_id": sid, "rich": True})
+    assert r.status_code == 200, r.text
+    assert r.headers["X-Export-Cache"] == "miss"
+    stats = json.loads(r.headers["X-Report-Stats"])
+    assert stats["rich"] is True
+    assert stats["charts"]["charts"] > 0
+    assert stats["charts"]["failed"] == {}
+
+    # a cached export reports the build that produced it
+    r = client.post("/export/pdf", json={"session_id": sid, "rich": True})
+    assert r.headers["X-Export-Cache"] == "hit"
+    assert json.loads(r.headers["X-Report-Stats"]) == stats
+
+
+def test_failed_charts_are_returned_not_printed(capsys):
+    entry = {"version": 1}
+    images, stats = render_charts(entry, {"bad": ("bad-key", "no-such-chart", None)})
+    assert images == {}
+    assert list(stats["failed"]) == ["bad"]
+    assert "failed" not in capsys.readouterr().out
+
+
+def test_slow_report_charts_time_out_on_their_own_pool(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    import app.utils.export_utils as export_utils
+    import app.utils.graph_utils as graph_utils
+    from app.routes.export import REPORT_WORKERS, _get_report_pool
+    from app.routes.graph import _get_render_pool
+
+    pool = _get_report_pool()
+    assert pool is not _get_render_pool()
+    assert pool._max_workers == REPORT_WORKERS
+
+    monkeypatch.setattr(export_utils, "RICH_CHART_TIMEOUT", 0.2)
+    monkeypatch.setitem(graph_utils.REPORT_RENDERERS, "slow", lambda data, out: time.sleep(1))
+    with ThreadPoolExecutor(1) as executor:
+        images, stats = render_charts({"version": 1}, {"slow": ("slow-key", "slow", None)}, executor)
+    assert images == {}
+    assert stats["failed"] == {"slow": "timed out"}
@@ -0,0 +1,72 @@
+import asyncio, json
+from aiohttp import web
+from app.utils.groq_assistant import GroqClient, SSEParser
+
+
+def _event(content):
+    return f"data: {json.dumps({'choices': [{'delta': {'content': content}}]})}\n\n".encode()
+
+
+def test_sse_parser_joins_frames_split_across_reads():
+    stream = _event("Hello") + b": keep-alive\n\n" + _event(" world") + b"data: [DONE]\n\n"
+    mid_json = stream.index(b"Hello") + 2
+    mid_blank = stream.index(b"\n\n", mid_json) + 1
+    parser = SSEParser()
+    events = []
+    for piece in (stream[:mid_json], stream[mid_json:mid_blank], stream[mid_blank:]):
+        events += parser.feed(piece)
+    assert [json.loads(e)["choices"][0]["delta"]["content"] for e in events[:2]] == ["Hello", " world"]
+    assert events[2:] == ["[DONE]"]
+
+    # one byte at a time, with CRLF line endings
+    parser = SSEParser()
+    events = []
+    for byte in stream.replace(b"\n", b"\r\n"):
+        events += parser.feed(bytes([byte]))
+    assert len(events) == 3 and events[-1] == "[DONE]"
+
+
+async def _mock_groq(pieces):
+    calls = []
+
+    async def handler(request):
+        calls.append(await request.json())
+        if len(calls) == 1:
+            return web.Response(status=503, text="busy")
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        for piece in pieces:
+            await resp.write(piece)
+            await asyncio.sleep(0.01)
+        return resp
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}/v1/chat/completions", calls
+
+
+def test_client_retries_then_streams_tokens_from_a_local_server():
+    stream = _event("Hel") + _event("lo") + b"data: [DONE]\n\n"
+    # frames split mid-JSON and between the two newlines
+    cut_a, cut_b = stream.index(b"Hel") + 1, stream.index(b"\n\n") + 1
+    pieces = [stream[:cut_a], stream[cut_a:cut_b], stream[cut_b:]]
+
+    async def run():
+        runner, url, calls = await _mock_groq(pieces)
+        client = GroqClient(url=url, retry_base=0.01)
+        try:
+            tokens = [t async for t in client.stream_chat("key", {"messages": [], "stream": True})]
+        finally:
+            await client.close()
+            await runner.cleanup()
+        return tokens, calls
+
+    tokens, calls = asyncio.run(run())
+    assert tokens == ["Hel", "lo"]
+    # the 503 was retried with the same payload
+    assert len(calls) == 2 and calls[0] == calls[1]
@@ -0,0 +1,57 @@
+import os
+import pytest
+from conftest import make_frame, upload
+from app.utils.out_of_core import SESSION_DATA_DIR
+
+
+def _train(client, sid, model_key, **fields):
+    r = client.post("/pipeline/train", json={"session_id": sid, "model_key": model_key, "out_of_core": True, **fields})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+@pytest.mark.parametrize("model_key, name", [("lightgbm", "LGBMClassifier"), ("xgboost", "XGBClassifier")])
+def test_boosters_after_onehot(client, model_key, name):
+    sid = upload(client, make_frame(2000))
+    r = client.post("/pipeline/transform", json={"session_id": sid, "encoding": "onehot", "encoding_columns": ["cat", "col"]})
+    assert r.status_code == 200, r.text
+    _train(client, sid, model_key, chunksize=500)
+    metrics = client.get(f"/pipeline/metrics?session_id={sid}").json()["metrics"]
+    assert name in metrics
+    assert metrics[name]["roc_auc"] > 0.6
+
+
+@pytest.mark.parametrize("model_key", ["logistic", "svm"])
+def test_sgd_on_label_sorted_rows(client, model_key):
+    # every chunk is label-sorted; without shuffling SGD ends up predicting one class
+    sid = upload(client, make_frame(4000, ordered=True))
+    r = client.post("/pipeline/transform", json={"session_id": sid, "encoding": "label", "encoding_columns": ["cat", "col"]})
+    assert r.status_code == 200, r.text
+    runs = [_train(client, sid, model_key, chunksize=4000)["evaluation"] for _ in range(2)]
+    assert runs[0]["accuracy"] > 0.65
+    assert runs[0]["recall"] < 0.99
+    assert runs[0]["roc_auc"] == runs[1]["roc_auc"]
+
+
+def test_session_files_only_exist_while_needed(client):
+    sid = upload(client, make_frame())
+    path = os.path.join(SESSION_DATA_DIR, sid)
+    # nothing is written unless out-of-core training asks for it
+    assert not os.path.exists(path)
+
+    r = client.post("/pipeline/transform", json={"session_id": sid, "encoding": "label", "encoding_columns": ["cat", "col"]})
+    assert r.status_code == 200, r.text
+    _train(client, sid, "naive_bayes")
+    first = os.listdir(path)
+    assert len(first) == 1
+
+    r = client.post("/pipeline/transform", json={"session_id": sid, "scaling": "minmax", "scaling_columns": ["a"]})
+    assert r.status_code == 200, r.text
+    # a new version drops the old spill
+    assert os.listdir(path) == []
+    _train(client, sid, "naive_bayes")
+    assert len(os.listdir(path)) == 1 and os.listdir(path) != first
+
+    assert client.delete(f"/upload/session/{sid}").status_code == 200
+    assert not os.path.exists(path)
+    assert client.delete(f"/upload/session/{sid}").status_code == 404
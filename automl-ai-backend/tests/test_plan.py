@@ -0,0 +1,65 @@
+import pandas as pd
+from conftest import make_frame, upload
+from app.routes.upload import session_store
+from app.utils.plan import execute, optimize
+
+
+def _transform(client, sid, deferred, **fields):
+    r = client.post("/pipeline/transform", json={"session_id": sid, "deferred": deferred, **fields})
+    assert r.status_code == 200, r.text
+
+
+def test_drop_of_onehot_output_is_not_hoisted_above_the_encode():
+    ops = [
+        {"op": "encode", "method": "onehot", "columns": ["col"]},
+        {"op": "target_last"},
+        {"op": "drop", "columns": ["col_q"]},
+        {"op": "target_last"},
+    ]
+    out, _ = execute(make_frame(), optimize(ops), "target")
+    assert "col_q" not in out.columns
+    assert "col_r" in out.columns
+
+
+def test_deferred_onehot_then_drop_matches_eager(client):
+    df = make_frame()
+    results = []
+    for deferred in (False, True):
+        sid = upload(client, df)
+        _transform(client, sid, deferred, encoding="onehot", encoding_columns=["col"])
+        _transform(client, sid, deferred, drop_columns=["col_q"])
+        # reading the data materializes a deferred plan
+        r = client.post("/pipeline/data", json={"session_id": sid, "format": "csv"})
+        assert r.status_code == 200
+        results.append(session_store[sid]["data"])
+    eager, deferred = results
+    assert "col_q" not in deferred.columns
+    assert list(eager.columns) == list(deferred.columns)
+    pd.testing.assert_frame_equal(eager.reset_index(drop=True), deferred.reset_index(drop=True), check_dtype=False)
+
+
+def test_graphs_and_assistant_see_deferred_transforms(client, monkeypatch):
+    import app.routes.groq as groq
+    sid = upload(client, make_frame())
+    _transform(client, sid, True, encoding="onehot", encoding_columns=["cat"])
+    assert session_store[sid]["plan"]
+
+    r = client.get("/graph/bar", params={"session_id": sid, "column": "cat_yes"})
+    assert r.status_code == 200, r.text
+    assert not session_store[sid]["plan"]
+    r = client.get("/graph/bar", params={"session_id": sid, "column": "cat"})
+    assert r.status_code == 400
+
+    prompts = []
+
+    async def _answer(api_key, messages):
+        prompts.append(" ".join(m["content"] for m in messages))
+        yield "ok"
+
+    monkeypatch.setattr(groq, "stream_groq_response", _answer)
+    _transform(client, sid, True, scaling="minmax", scaling_columns=["a"])
+    r = client.post("/groq/suggest", json={"session_id": sid, "question": "what changed?", "page": "transform"})
+    assert r.status_code == 200, r.text
+    assert not session_store[sid]["plan"]
+    assert session_store[sid]["data"]["a"].max() <= 1.0
+    assert "cat_yes" in prompts[0]
@@ -0,0 +1,12 @@
+import numpy as np
+import pandas as pd
+from app.utils.preprocessing import impute
+
+
+def test_impute_leaves_the_input_frame_alone():
+    df = pd.DataFrame({"a": [1.0, np.nan, 3.0], "b": ["x", None, "x"], "c": [1.0, 2.0, np.nan]})
+    before = df.copy()
+    out, report = impute(df, {"a": "mean", "b": "mode", "c": "median"})
+    pd.testing.assert_frame_equal(df, before)
+    assert out.isna().sum().sum() == 0
+    assert report["fill_values"] == {"a": 2.0, "c": 1.5, "b": "x"}
@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+from conftest import make_frame
+from app.routes.graph import _spec_columns
+from app.utils.balancing import balance
+from app.utils.preprocessing import apply_encoding
+
+
+def _encoded():
+    df = apply_encoding(make_frame(), "onehot", ["col"], sparse=True)
+    indicators = [c for c, t in df.dtypes.items() if isinstance(t, pd.SparseDtype)]
+    assert indicators
+    return df, indicators
+
+
+def test_charts_without_columns_skip_sparse_indicators():
+    df, indicators = _encoded()
+    cols = _spec_columns(df, {"type": "heatmap"}).columns
+    assert "a" in cols
+    assert not set(indicators) & set(cols)
+
+
+@pytest.mark.parametrize("method", ["smote", "undersample"])
+def test_balancing_keeps_indicators_sparse(method):
+    df, indicators = _encoded()
+    X, y = df.drop(columns=["target", "cat"]), df["target"]
+    X_out, y_out, _ = balance(X, y, method)
+    assert (X_out.dtypes[indicators] == X.dtypes[indicators]).all()
+    assert y_out.value_counts().nunique() == 1
+
+    # same rows as balancing the dense frame
+    dense = {c: X[c].dtype.subtype for c in indicators}
+    expected, _, _ = balance(X.astype(dense), y, method)
+    pd.testing.assert_frame_equal(X_out.astype(dense), expected)
@@ -0,0 +1,31 @@
+import json, os, subprocess, sys
+from conftest import BACKEND_DIR
+
+IMPORT_BUDGET_S = 5.0    # pandas alone is ~1 s; eager ML imports took well over this
+LAZY_MODULES = ["xgboost", "lightgbm", "shap", "matplotlib", "sklearn.ensemble"]
+
+# runs in a fresh interpreter so nothing the other tests imported leaks in
+SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+lazy = {LAZY_MODULES!r}
+before = [m for m in lazy if m in sys.modules]
+from app.utils.warmup import warm_imports
+warm_imports(lazy)
+after = [m for m in lazy if m in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "before": before, "after": after}}))
+"""
+
+
+def test_app_import_is_fast_and_lazy():
+    env = {**os.environ, "WARM_IMPORTS": "0"}
+    out = subprocess.run([sys.executable, "-c", SCRIPT], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, timeout=300)
+    assert out.returncode == 0, out.stderr
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    assert result["before"] == []
+    assert result["elapsed"] < IMPORT_BUDGET_S
+    # the warm-up (or the first request that needs them) loads them
+    assert result["after"] == LAZY_MODULES
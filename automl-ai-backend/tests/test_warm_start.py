@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from conftest import make_frame, upload
+from app.routes.upload import session_store
+
+
+def _train(client, sid, model_key, n_estimators):
+    r = client.post("/pipeline/train", json={
+        "session_id": sid, "model_key": model_key, "hyperparameters": {"n_estimators": n_estimators},
+    })
+    assert r.status_code == 200, r.text
+    return r.json()["fit"], session_store[sid]["warm"][model_key]["model"]
+
+
+def _trees(model_key, model):
+    if model_key == "random_forest":
+        return [tuple(np.round(t.tree_.threshold, 6)) for t in model.estimators_]
+    if model_key == "xgboost":
+        return model.get_booster().get_dump()
+    return [str(t["tree_structure"]) for t in model.booster_.dump_model()["tree_info"]]
+
+
+@pytest.mark.parametrize("model_key", ["random_forest", "xgboost", "lightgbm"])
+def test_warm_refit_grows_the_previous_model(client, model_key):
+    sid = upload(client, make_frame().drop(columns=["cat", "col"]))
+    cold_fit, cold = _train(client, sid, model_key, 10)
+    assert cold_fit["mode"] == "cold"
+    before = _trees(model_key, cold)
+
+    fit, warm = _train(client, sid, model_key, 25)
+    assert fit["mode"] == "warm"
+    assert fit["reused_estimators"] == 10
+    assert fit["cold_baseline"] == {"estimators": 10, "fit_ms": cold_fit["fit_ms"]}
+    assert fit["saved_ms"] == pytest.approx(fit["estimated_cold_ms"] - fit["fit_ms"], abs=0.02)
+
+    after = _trees(model_key, warm)
+    assert len(after) == 25
+    # the first 10 trees are the earlier run's, not refitted ones
+    assert after[:10] == before
+    # and the earlier run's model is left as it was
+    assert _trees(model_key, cold) == before